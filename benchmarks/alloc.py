@@ -0,0 +1,72 @@
+# alloc.py Measure RAM allocation per update of the fusion kernels.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Run under MicroPython (Unix port or target) or CPython from any directory:
+# micropython benchmarks/alloc.py
+# Under MicroPython the gc is disabled and gc.mem_alloc() measures the bytes
+# allocated by N updates. Under CPython tracemalloc reports the peak transient
+# allocation of an update and the net change over N updates.
+
+import gc
+import testdata  # Sets up sys.path
+from fusion import Fusion
+from fusion_fixed import FixedFusion
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+N = 1000
+accel = (0.1608887, -0.02099609, -0.9699707)
+gyro = (-1.381679, 0.8778625, -0.7557252)
+mag = (-6.367969, 0.3398438, 34.44258)
+iaccel = (659, -86, -3973)  # Integer readings for fusion_fixed
+igyro = (-181, 115, -99)
+imag = (-637, 34, 3444)
+timediff = testdata.timediff
+
+# Return (net, peak) bytes per call. func is called n times with an int arg.
+# peak is None under MicroPython where net is the total allocated per call.
+def measure(func, n=N):
+    func(0)  # Warm up: 1st pass initialises DeltaT
+    if tracemalloc is None:
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        for x in range(n):
+            func(x)
+        res = (gc.mem_alloc() - start) / n
+        gc.enable()
+        return res, None
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    peak = 0
+    for x in range(n):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func(x)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    net = (tracemalloc.get_traced_memory()[0] - start) / n
+    tracemalloc.stop()
+    return net, peak
+
+def run():
+    fuse = Fusion(timediff)
+    res = {}
+    res['update'] = measure(lambda n: fuse.update(accel, gyro, mag, n * 20000))
+    fuse = Fusion(timediff)
+    res['update_nomag'] = measure(lambda n: fuse.update_nomag(accel, gyro, n * 20000))
+    fuse = FixedFusion(timediff, gscale=1 / 131)
+    res['fixed_update'] = measure(lambda n: fuse.update(iaccel, igyro, imag, n * 20000))
+    fuse = FixedFusion(timediff, gscale=1 / 131)
+    res['fixed_nomag'] = measure(lambda n: fuse.update_nomag(iaccel, igyro, n * 20000))
+    return res
+
+if __name__ == '__main__':
+    for name, (net, peak) in run().items():
+        if peak is None:
+            print('{:14s} {:8.1f} bytes/update'.format(name, net))
+        else:
+            print('{:14s} {:8.1f} bytes/update net {:6d} bytes peak'.format(name, net, peak))
@@ -0,0 +1,247 @@
+# bench.py Benchmark suite for the fusion library.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs unchanged under CPython and MicroPython (Unix port or target):
+# python3 benchmarks/bench.py [-n samples] [-f capture] [-j results.json] [case ...]
+# micropython benchmarks/bench.py -n 5000
+# Replays remote/mpudata (or with -n a longer synthetic stream derived from it)
+# through each benchmark case. -f specifies another capture file in JSON lines
+# or binary (.bin) format. Reports updates/s, per-update latency
+# percentiles, allocation per update and total wall time. With -j the results
+# are written as JSON for comparison across commits with compare.py.
+
+import sys
+import gc
+import testdata  # Sets up sys.path
+from alloc import measure
+from fusion import Fusion
+try:
+    import utime as time
+except ImportError:
+    import time
+try:
+    import ujson as json
+except ImportError:
+    import json
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# Portable microsecond timer
+if hasattr(time, 'ticks_us'):
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+else:
+    ticks_us = lambda : time.perf_counter_ns() // 1000
+    ticks_diff = lambda end, start : end - start
+
+# Timing results from a list of per-item durations (μs) and the wall time.
+def result(name, durations, wall):
+    d = sorted(durations)
+    n = len(d)
+    pc = lambda p : d[min(n - 1, (n * p) // 100)]
+    return {'name': name, 'n': n, 'wall_s': wall / 1000000, 'ups': n * 1000000 / wall if wall else 0,
+            'p50_us': pc(50), 'p90_us': pc(90), 'p99_us': pc(99), 'max_us': d[-1]}
+
+# Call func(record) for each record, timing each call.
+def timed(name, func, records):
+    durations = [0] * len(records)
+    gc.collect()
+    start = ticks_us()
+    for i in range(len(records)):
+        t = ticks_us()
+        func(records[i])
+        durations[i] = ticks_diff(ticks_us(), t)
+    return result(name, durations, ticks_diff(ticks_us(), start))
+
+# Allocation per call of func(record) cycling through records.
+def allocs(func, records):
+    n = min(len(records), 1000)
+    return measure(lambda x : func(records[x % n]), n)
+
+def bench_update(cal, data):
+    fuse = Fusion(testdata.timediff)
+    func = lambda r : fuse.update(r[0], r[1], r[2], r[3])
+    res = timed('update', func, data)
+    fuse = Fusion(testdata.timediff)
+    res['alloc'] = allocs(func, data)
+    return res
+
+def bench_update_nomag(cal, data):
+    fuse = Fusion(testdata.timediff)
+    func = lambda r : fuse.update_nomag(r[0], r[1], r[3])
+    res = timed('update_nomag', func, data)
+    fuse = Fusion(testdata.timediff)
+    res['alloc'] = allocs(func, data)
+    return res
+
+# Axis remapping: orientate() before each update compared with an attached
+# Orientation. The remap swaps x and y and inverts z.
+_T = (1, 0, 2)
+_I = (False, False, True)
+
+def bench_orientate(cal, data):
+    from orientate import orientate
+    fuse = Fusion(testdata.timediff)
+    func = lambda r : fuse.update(*orientate(_T, _I, r[0], r[1], r[2]), ts=r[3])
+    res = timed('orientate', func, data)
+    fuse = Fusion(testdata.timediff)
+    res['alloc'] = allocs(func, data)
+    return res
+
+def bench_orientation(cal, data):
+    from orientate import Orientation
+    fuse = Fusion(testdata.timediff)
+    fuse.orientation = Orientation(_T, _I)
+    func = lambda r : fuse.update(r[0], r[1], r[2], r[3])
+    res = timed('orientation', func, data)
+    fuse = Fusion(testdata.timediff)
+    fuse.orientation = Orientation(_T, _I)
+    res['alloc'] = allocs(func, data)
+    return res
+
+def bench_update_batch(cal, data):
+    fuse = Fusion(testdata.timediff)
+    accel = [r[0] for r in data]
+    gyro = [r[1] for r in data]
+    mag = [r[2] for r in data]
+    ts = [r[3] for r in data]
+    Fusion(testdata.timediff).update_batch(accel[:1], gyro[:1], mag[:1], ts[:1])  # Import numpy if present
+    gc.collect()
+    start = ticks_us()
+    fuse.update_batch(accel, gyro, mag, ts)
+    wall = ticks_diff(ticks_us(), start)
+    return result('update_batch', [wall // len(data)] * len(data), wall)
+
+# Each calibration sample is timed, including the stopfunc call.
+def bench_calibrate(cal, data):
+    fuse = Fusion(testdata.timediff)
+    records = cal if len(cal) >= len(data) else testdata.synthetic(cal, len(data))
+    n = len(records)
+    durations = [0] * n
+    state = [0, ticks_us()]  # Index, time of last sample
+    def getxyz():
+        i = state[0]
+        t = ticks_us()
+        if i:
+            durations[i - 1] = ticks_diff(t, state[1])
+        state[0] = i + 1
+        state[1] = t
+        return records[i][2]
+    gc.collect()
+    start = ticks_us()
+    fuse.calibrate(getxyz, lambda : state[0] >= n)
+    return result('calibrate', durations[:n - 1], ticks_diff(ticks_us(), start))
+
+# The fusion_async update task fed by a read_coro which does not wait on
+# hardware. durations are the intervals between successive reads divided by
+# the number of samples returned by each read.
+def run_async(name, data, batch=1, bufsize=0):
+    from fusion_async import Fusion as AFusion
+    n = len(data) // batch
+    durations = [0] * (n * batch)
+    state = [0, ticks_us()]
+    done = asyncio.Event()
+    async def read_coro():
+        await asyncio.sleep(0)
+        i = state[0]
+        t = ticks_us()
+        if i:
+            d = ticks_diff(t, state[1]) // batch
+            for j in range((i - 1) * batch, i * batch):
+                durations[j] = d
+        state[1] = t
+        if i >= n:
+            done.set()
+            i = n - 1  # Task keeps running until the event loop stops
+        state[0] = i + 1
+        if batch == 1:
+            return data[i]
+        return data[i * batch: (i + 1) * batch]
+    fuse = AFusion(read_coro, testdata.timediff)
+    async def main():
+        await fuse.start(bufsize=bufsize)
+        state[0] = 0  # start() consumed a record
+        state[1] = ticks_us()
+        start = state[1]
+        await done.wait()
+        return ticks_diff(ticks_us(), start)
+    gc.collect()
+    wall = asyncio.run(main())
+    return result(name, durations, wall)
+
+def bench_async(cal, data):
+    return run_async('async', data)
+
+# read_coro returns batches of 16 samples queued in a ring buffer.
+def bench_async_batch(cal, data):
+    return run_async('async_batch', data, 16, 64)
+
+CASES = {
+    'update': bench_update,
+    'update_nomag': bench_update_nomag,
+    'update_batch': bench_update_batch,
+    'orientate': bench_orientate,
+    'orientation': bench_orientation,
+    'calibrate': bench_calibrate,
+    'async': bench_async,
+    'async_batch': bench_async_batch,
+}
+
+def platform():
+    res = {'impl': sys.implementation.name, 'platform': sys.platform,
+           'version': '.'.join(str(x) for x in sys.implementation.version[:3])}
+    try:
+        import subprocess
+        res['commit'] = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=testdata.ROOT,
+                                                stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        pass
+    return res
+
+def run(names=None, n=None, fn=testdata.MPUDATA):
+    cal, data = testdata.load(fn)
+    if n:
+        data = testdata.synthetic(data, n)
+    results = []
+    for name in (names or CASES):
+        results.append(CASES[name](cal, data))
+    return {'platform': platform(), 'samples': len(data), 'results': results}
+
+def show(report):
+    fs = '{:14s} {:>7s} {:>10s} {:>8s} {:>8s} {:>8s} {:>8s} {:>9s} {:>8s}'
+    print(fs.format('case', 'n', 'updates/s', 'p50 μs', 'p90 μs', 'p99 μs', 'max μs', 'bytes/upd', 'wall s'))
+    fs = '{:14s} {:7d} {:10.0f} {:8d} {:8d} {:8d} {:8d} {:>9s} {:8.3f}'
+    for r in report['results']:
+        a = '{:.1f}'.format(r['alloc'][0]) if 'alloc' in r else '-'
+        print(fs.format(r['name'], r['n'], r['ups'], r['p50_us'], r['p90_us'], r['p99_us'], r['max_us'], a, r['wall_s']))
+
+def main(args):
+    n = None
+    fn = None
+    capture = testdata.MPUDATA
+    names = []
+    while args:
+        arg = args.pop(0)
+        if arg == '-n':
+            n = int(args.pop(0))
+        elif arg == '-j':
+            fn = args.pop(0)
+        elif arg == '-f':
+            capture = args.pop(0)
+        elif arg in CASES:
+            names.append(arg)
+        else:
+            print('Usage: bench.py [-n samples] [-f capture] [-j results.json] [case ...]')
+            print('Cases:', ' '.join(CASES))
+            return
+    report = run(names, n, capture)
+    show(report)
+    if fn is not None:
+        with open(fn, 'w') as f:
+            json.dump(report, f)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
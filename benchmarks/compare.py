@@ -0,0 +1,34 @@
+# compare.py Compare two sets of results saved by bench.py -j
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# python3 benchmarks/compare.py old.json new.json
+# Prints the change in throughput and median latency for each case.
+
+import sys
+import json
+
+def main(old, new):
+    with open(old) as f:
+        a = json.load(f)
+    with open(new) as f:
+        b = json.load(f)
+    print('{} ({}) -> {} ({})'.format(old, a['platform'].get('commit', '?'), new, b['platform'].get('commit', '?')))
+    prev = {r['name']: r for r in a['results']}
+    fs = '{:14s} {:>10s} {:>10s} {:>8s} {:>8s} {:>8s} {:>8s}'
+    print(fs.format('case', 'updates/s', 'updates/s', 'change', 'p50 μs', 'p50 μs', 'change'))
+    fs = '{:14s} {:10.0f} {:10.0f} {:+7.1f}% {:8d} {:8d} {:+7.1f}%'
+    for r in b['results']:
+        p = prev.get(r['name'])
+        if p is None:
+            print('{:14s} (new)'.format(r['name']))
+            continue
+        dups = (r['ups'] / p['ups'] - 1) * 100 if p['ups'] else 0
+        dlat = (r['p50_us'] / p['p50_us'] - 1) * 100 if p['p50_us'] else 0
+        print(fs.format(r['name'], p['ups'], r['ups'], dups, p['p50_us'], r['p50_us'], dlat))
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: compare.py old.json new.json')
+    else:
+        main(sys.argv[1], sys.argv[2])
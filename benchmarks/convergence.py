@@ -0,0 +1,87 @@
+# convergence.py Time to convergence of the fusion filter from a cold start.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython or MicroPython:
+# python3 benchmarks/convergence.py [-f capture] [-t tol,...] [-w factor]
+# A reference filter is calibrated and run over the calibration samples so that
+# it has converged by the start of the data. Fresh filters are then run over
+# the data from each start condition: the identity quaternion (the default),
+# Fusion.initialise() and, if -w is given, initialise() with a warm-up at
+# factor * beta. For each the time (s) after which its attitude remains within
+# each tolerance (degrees) of the reference is reported.
+
+import sys
+from math import acos, degrees
+import testdata  # Sets up sys.path
+from fusion import Fusion
+
+def angle(q, r):  # Rotation (degrees) between two unit quaternions
+    d = abs(q[0] * r[0] + q[1] * r[1] + q[2] * r[2] + q[3] * r[3])
+    return degrees(2 * acos(min(d, 1.0)))
+
+def reference(cal, data):
+    fuse = Fusion(testdata.timediff)
+    state = [0]
+    def getxyz():
+        state[0] += 1
+        return cal[state[0] - 1][2]
+    fuse.calibrate(getxyz, lambda : state[0] >= len(cal))
+    for r in cal:
+        fuse.update(r[0], r[1], r[2], r[3])
+    res = []
+    for r in data:
+        fuse.update(r[0], r[1], r[2], r[3])
+        res.append(tuple(fuse.q))
+    return fuse.magbias, res
+
+# Times (s) from the first sample until the filter stays within each of
+# tols (degrees) of ref. None if it does not.
+def converge(fuse, data, ref, tols):
+    t0 = data[0][3]
+    last = [0] * len(tols)  # Index of first sample after the last excursion
+    for n in range(len(data)):
+        r = data[n]
+        fuse.update(r[0], r[1], r[2], r[3])
+        a = angle(fuse.q, ref[n])
+        for i in range(len(tols)):
+            if a > tols[i]:
+                last[i] = n + 1
+    return [None if l >= len(data) else testdata.timediff(data[l][3], t0) for l in last]
+
+STARTS = (('identity', None), ('initialise', False), ('init + warm-up', True))
+
+def run(fn=testdata.MPUDATA, tols=(20, 10, 5, 2), warm=None):
+    cal, data = testdata.load(fn)
+    bias, ref = reference(cal, data)
+    res = []
+    for name, w in STARTS[:2] if warm is None else STARTS:
+        fuse = Fusion(testdata.timediff)
+        fuse.magbias = bias
+        if w is not None:
+            fuse.initialise(beta=fuse.beta * warm if w else None)
+        res.append((name, converge(fuse, data, ref, tols)))
+    return res
+
+def main(args):
+    fn = testdata.MPUDATA
+    tols = (20, 10, 5, 2)
+    warm = None
+    while args:
+        arg = args.pop(0)
+        if arg == '-f':
+            fn = args.pop(0)
+        elif arg == '-t':
+            tols = [float(x) for x in args.pop(0).split(',')]
+        elif arg == '-w':
+            warm = float(args.pop(0))
+        else:
+            print('Usage: convergence.py [-f capture] [-t tol,...] [-w factor]')
+            return
+    print('Time (s) to remain within tolerance (degrees) of the converged reference')
+    print('{:16s}'.format('start') + ''.join('{:>8}'.format(t) for t in tols))
+    for name, times in run(fn, tols, warm):
+        print('{:16s}'.format(name) + ''.join('{:>8s}'.format('-' if t is None else '{:.2f}'.format(t)) for t in times))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,122 @@
+# engines.py Cost and accuracy of the fusion engines compared with Madgwick.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython or MicroPython:
+# python3 benchmarks/engines.py [-f capture] [-s settle]
+# Magnetometer bias is calibrated from the calibration samples. Each engine is
+# initialised from the first sample (Fusion.initialise()) and run over the
+# calibration samples, so that it has converged, then over the data. Its cost
+# is the mean time per update on the data. Its accuracy is the difference from
+# the attitude and angles of the Madgwick filter over the data, ignoring the first settle seconds (default 0). 9DOF and 6DOF updates
+# are reported separately. In 6DOF mode heading is arbitrary: attitude errors
+# are the angle between the estimated directions of gravity and heading is
+# excluded.
+
+import sys
+import gc
+from math import sqrt, acos, degrees
+import testdata  # Sets up sys.path
+from convergence import angle
+from bench import ticks_us, ticks_diff
+from fusion import Fusion
+from fusion_engines import Mahony, Complementary
+
+ENGINES = (('madgwick', Fusion), ('mahony', Mahony), ('complementary', Complementary))
+
+def magbias(cal):
+    fuse = Fusion(testdata.timediff)
+    state = [0]
+    def getxyz():
+        state[0] += 1
+        return cal[state[0] - 1][2]
+    fuse.calibrate(getxyz, lambda : state[0] >= len(cal))
+    return fuse.magbias
+
+def tilt(q, r):  # Angle (degrees) between the directions of gravity of two quaternions
+    u = (2 * (q[1] * q[3] - q[0] * q[2]), 2 * (q[2] * q[3] + q[0] * q[1]), q[0] * q[0] - q[1] * q[1] - q[2] * q[2] + q[3] * q[3])
+    v = (2 * (r[1] * r[3] - r[0] * r[2]), 2 * (r[2] * r[3] + r[0] * r[1]), r[0] * r[0] - r[1] * r[1] - r[2] * r[2] + r[3] * r[3])
+    return degrees(acos(max(-1.0, min(u[0] * v[0] + u[1] * v[1] + u[2] * v[2], 1.0))))
+
+def angdiff(a, b):  # Difference between two angles (degrees) in range ±180
+    return (a - b + 180) % 360 - 180
+
+# Returns the mean update time (μs) and a list of (quaternion, (heading,
+# pitch, roll)) for each data sample.
+def replay(cls, bias, cal, data, ninedof):
+    def start():
+        fuse = cls(testdata.timediff)
+        fuse.magbias = bias
+        fuse.initialise()
+        if ninedof:
+            func = lambda r : fuse.update(r[0], r[1], r[2], r[3])
+        else:
+            func = lambda r : fuse.update_nomag(r[0], r[1], r[3])
+        for r in cal:
+            func(r)
+        return fuse, func
+    fuse, func = start()
+    gc.collect()
+    t = ticks_us()
+    for r in data:
+        func(r)
+    us = ticks_diff(ticks_us(), t) / len(data)
+    fuse, func = start()
+    res = []
+    for r in data:
+        func(r)
+        res.append((tuple(fuse.q), (fuse.heading, fuse.pitch, fuse.roll)))
+    return us, res
+
+# Per engine: name, mean μs, RMS and max attitude error, RMS heading, pitch
+# and roll errors (degrees).
+def run(fn=testdata.MPUDATA, settle=0, ninedof=True):
+    cal, data = testdata.load(fn)
+    bias = magbias(cal)
+    t0 = data[0][3]
+    first = 0
+    while first < len(data) and testdata.timediff(data[first][3], t0) < settle:
+        first += 1
+    ref = None
+    diff = angle if ninedof else tilt
+    results = []
+    for name, cls in ENGINES:
+        us, res = replay(cls, bias, cal, data, ninedof)
+        if ref is None:
+            ref = res
+        n = len(data) - first
+        sq = 0
+        amax = 0
+        se = [0, 0, 0]
+        for i in range(first, len(data)):
+            a = diff(res[i][0], ref[i][0])
+            sq += a * a
+            amax = max(amax, a)
+            for j in range(3):
+                e = angdiff(res[i][1][j], ref[i][1][j])
+                se[j] += e * e
+        results.append((name, us, sqrt(sq / n), amax) + tuple(sqrt(x / n) for x in se))
+    return results
+
+def main(args):
+    fn = testdata.MPUDATA
+    settle = 0
+    while args:
+        arg = args.pop(0)
+        if arg == '-f':
+            fn = args.pop(0)
+        elif arg == '-s':
+            settle = float(args.pop(0))
+        else:
+            print('Usage: engines.py [-f capture] [-s settle]')
+            return
+    for ninedof in (True, False):
+        print('9DOF' if ninedof else '6DOF')
+        print('{:14s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s}'.format('engine', 'μs/upd', 'rms °', 'max °',
+                                                                      'heading', 'pitch', 'roll'))
+        for r in run(fn, settle, ninedof):
+            h = '{:8.2f}'.format(r[4]) if ninedof else '{:>8s}'.format('-')
+            print('{:14s} {:8.1f} {:8.2f} {:8.2f} {} {:8.2f} {:8.2f}'.format(r[0], r[1], r[2], r[3], h, r[5], r[6]))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
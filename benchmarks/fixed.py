@@ -0,0 +1,119 @@
+# fixed.py Accuracy and cost of the fixed point kernel compared with floating point.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython or MicroPython:
+# python3 benchmarks/fixed.py [-f capture] [-a scale] [-g scale] [-m scale]
+# Samples are converted to integers as from the sensor registers: accel in
+# units of 1/4096 g, gyro in units of 1/131 deg/s (both exact for
+# remote/mpudata) and mag in units of 0.01. The scales may be changed with
+# -a, -g and -m (counts per unit). fusion.Fusion is run on the same integers
+# converted back to floats so that differences arise from the arithmetic, not
+# from the resolution of the data. Each filter is calibrated, then run from
+# the identity quaternion over the calibration samples, so that it has
+# converged, and over the data. Errors are measured over the data: the
+# rotation between the quaternions (9DOF) or the angle between the estimated
+# directions of gravity (6DOF), and the differences in heading, pitch and
+# roll. Cost is the mean time per update over the data.
+
+import sys
+import gc
+from math import sqrt
+import testdata  # Sets up sys.path
+from convergence import angle
+from engines import tilt, angdiff
+from bench import ticks_us, ticks_diff
+from fusion import Fusion
+from fusion_fixed import FixedFusion
+
+# Integer and float versions of the records.
+def convert(records, ka, kg, km):
+    ints = []
+    floats = []
+    for r in records:
+        a = [int(round(x * ka)) for x in r[0]]
+        g = [int(round(x * kg)) for x in r[1]]
+        m = [int(round(x * km)) for x in r[2]]
+        ints.append((a, g, m, r[3]))
+        floats.append(([x / ka for x in a], [x / kg for x in g], [x / km for x in m], r[3]))
+    return ints, floats
+
+def calibrate(fuse, cal):
+    state = [0]
+    def getxyz():
+        state[0] += 1
+        return cal[state[0] - 1][2]
+    fuse.calibrate(getxyz, lambda : state[0] >= len(cal))
+    return fuse
+
+# make() returns a calibrated instance. Returns the mean update time (μs) and
+# a list of (quaternion, (heading, pitch, roll)) for each data sample.
+def replay(make, cal, data, ninedof):
+    def start():
+        fuse = make()
+        if ninedof:
+            func = lambda r : fuse.update(r[0], r[1], r[2], r[3])
+        else:
+            func = lambda r : fuse.update_nomag(r[0], r[1], r[3])
+        for r in cal:
+            func(r)
+        return fuse, func
+    fuse, func = start()
+    gc.collect()
+    t = ticks_us()
+    for r in data:
+        func(r)
+    us = ticks_diff(ticks_us(), t) / len(data)
+    fuse, func = start()
+    res = []
+    for r in data:
+        func(r)
+        res.append((tuple(fuse.q), (fuse.heading, fuse.pitch, fuse.roll)))
+    return us, res
+
+# Returns (float μs, fixed μs, RMS and max attitude error, RMS heading, pitch
+# and roll errors (degrees)).
+def run(fn=testdata.MPUDATA, ka=4096, kg=131, km=100, ninedof=True):
+    cal, data = testdata.load(fn)
+    icl, fcl = convert(cal, ka, kg, km)
+    idt, fdt = convert(data, ka, kg, km)
+    fus, rres = replay(lambda : calibrate(Fusion(testdata.timediff), fcl), fcl, fdt, ninedof)
+    xus, xres = replay(lambda : calibrate(FixedFusion(testdata.timediff, gscale=1 / kg), icl), icl, idt, ninedof)
+    diff = angle if ninedof else tilt
+    n = len(data)
+    sq = 0
+    amax = 0
+    se = [0, 0, 0]
+    for i in range(n):
+        q = xres[i][0]
+        k = 1 / sqrt(q[0] * q[0] + q[1] * q[1] + q[2] * q[2] + q[3] * q[3])  # Fixed point q is approximately unit
+        a = diff([x * k for x in q], rres[i][0])
+        sq += a * a
+        amax = max(amax, a)
+        for j in range(3):
+            e = angdiff(xres[i][1][j], rres[i][1][j])
+            se[j] += e * e
+    return (fus, xus, sqrt(sq / n), amax) + tuple(sqrt(x / n) for x in se)
+
+def main(args):
+    fn = testdata.MPUDATA
+    scales = [4096, 131, 100]
+    while args:
+        arg = args.pop(0)
+        if arg == '-f':
+            fn = args.pop(0)
+        elif arg in ('-a', '-g', '-m'):
+            scales['-a-g-m'.index(arg) // 2] = float(args.pop(0))
+        else:
+            print('Usage: fixed.py [-f capture] [-a scale] [-g scale] [-m scale]')
+            return
+    print('{:6s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s}'.format('', 'float μs', 'fixed μs', 'rms °',
+                                                                       'max °', 'heading', 'pitch', 'roll'))
+    for ninedof in (True, False):
+        r = run(fn, scales[0], scales[1], scales[2], ninedof)
+        h = '{:8.3f}'.format(r[4]) if ninedof else '{:>8s}'.format('-')
+        print('{:6s} {:8.1f} {:8.1f} {:8.3f} {:8.3f} {} {:8.3f} {:8.3f}'.format('9DOF' if ninedof else '6DOF',
+              r[0], r[1], r[2], r[3], h, r[5], r[6]))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,167 @@
+# loadgen.py Load generator for the ingestion server ingest.py.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython 3.8 or later:
+# python3 benchmarks/loadgen.py [-d devices] [-r rate] [-b batch] [-s seconds] [-p udp|tcp]
+#                               [-q frames] [-f] [-H host -P port]
+# Simulates devices replaying the samples of remote/mpudata at rate samples/s
+# each, sending frames of batch samples to the server. Samples are timestamped
+# with ticks_us() when sent so that the server can measure the latency from
+# sending until fusion is complete. By default a server is run in a separate
+# process on this machine and its statistics are reported at the end: with
+# -f it uses a FusionFleet, otherwise a fusion_async.Fusion per device. With
+# -H and -P load is sent to an external server, which reports its own
+# statistics.
+
+import sys
+import struct
+import asyncio
+import time
+import multiprocessing
+import testdata  # Sets up sys.path
+import ingest
+
+PORT = 8123
+
+# Server process. Sends its statistics on conn after seconds.
+def serve(conn, proto, queue, fleet, seconds):
+    async def main():
+        if fleet:
+            from fusion_fleet import FusionFleet
+            router = ingest.Router(fleet=FusionFleet(fleet, ingest.TimeDiff), queue=queue)
+        else:
+            from fusion_async import Fusion
+            router = ingest.Router(lambda read_coro : Fusion(read_coro, ingest.TimeDiff), queue=queue)
+        server = ingest.Server(router)
+        if proto == 'udp':
+            await server.start('127.0.0.1', udp_port=PORT)
+        else:
+            await server.start('127.0.0.1', tcp_port=PORT)
+        conn.send('ready')
+        conn.recv()  # Load has started
+        router.stats.reset()
+        await asyncio.sleep(seconds)
+        conn.send(router.stats.snapshot())
+        server.close()
+    asyncio.run(main())
+
+# Packed records of the capture. Timestamps are patched when sent.
+def templates():
+    cal, data = testdata.load()
+    res = []
+    for rec in cal + data:
+        buf = bytearray(ingest.RECORD_SIZE)
+        ingest.capfile.pack_into(buf, 0, rec)
+        res.append(bytes(buf))
+    return res
+
+# Send load for seconds. Returns (samples sent, elapsed s, ticks late).
+async def load(host, port, proto, devices, rate, batch, seconds):
+    recs = templates()
+    loop = asyncio.get_running_loop()
+    if proto == 'udp':
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+        writers = None
+    else:
+        writers = []
+        for _ in range(devices):
+            writers.append((await asyncio.open_connection(host, port))[1])
+    hdrs = [struct.pack(ingest._FRAME, ingest.MAGIC, ingest.VERSION, batch, d) for d in range(devices)]
+    period = batch / rate
+    ts_offs = 40  # Offset of timestamp in a record
+    sent = 0
+    late = 0
+    n = 0  # Index into recs
+    start = time.monotonic()
+    deadline = start
+    while True:
+        now = time.monotonic()
+        if now - start >= seconds:
+            break
+        if deadline > now:
+            await asyncio.sleep(deadline - now)
+        else:
+            late += 1
+            await asyncio.sleep(0)
+        deadline += period
+        body = bytearray(b''.join(recs[(n + i) % len(recs)] for i in range(batch)))
+        n += batch
+        ts = ingest.ticks_us()
+        for i in range(batch):
+            struct.pack_into('<I', body, i * ingest.RECORD_SIZE + ts_offs, ts)
+        for d in range(devices):
+            if writers is None:
+                transport.sendto(hdrs[d] + body)
+            else:
+                writers[d].write(hdrs[d] + body)
+        if writers is not None:
+            for w in writers:
+                await w.drain()  # Backpressure
+        sent += devices * batch
+    elapsed = time.monotonic() - start
+    if writers is None:
+        transport.close()
+    else:
+        for w in writers:
+            w.close()
+    return sent, elapsed, late
+
+def main(args):
+    devices = 10
+    rate = 100
+    batch = 1
+    seconds = 5
+    proto = 'udp'
+    queue = 64
+    fleet = False
+    host = None
+    port = PORT
+    usage = ('Usage: loadgen.py [-d devices] [-r rate] [-b batch] [-s seconds] [-p udp|tcp] [-q frames] [-f] '
+             '[-H host -P port]')
+    while args:
+        arg = args.pop(0)
+        if arg == '-d':
+            devices = int(args.pop(0))
+        elif arg == '-r':
+            rate = float(args.pop(0))
+        elif arg == '-b':
+            batch = int(args.pop(0))
+        elif arg == '-s':
+            seconds = float(args.pop(0))
+        elif arg == '-p':
+            proto = args.pop(0)
+        elif arg == '-q':
+            queue = int(args.pop(0))
+        elif arg == '-f':
+            fleet = True
+        elif arg == '-H':
+            host = args.pop(0)
+        elif arg == '-P':
+            port = int(args.pop(0))
+        else:
+            print(usage)
+            return
+    if proto not in ('udp', 'tcp') or not 0 < batch <= ingest.MAX_RECORDS:
+        print(usage)
+        return
+    conn = None
+    if host is None:
+        host = '127.0.0.1'
+        port = PORT
+        conn, child = multiprocessing.Pipe()
+        p = multiprocessing.Process(target=serve, args=(child, proto, queue, devices if fleet else 0, seconds + 1))
+        p.start()
+        conn.recv()  # Server is listening
+        conn.send('start')
+    sent, elapsed, late = asyncio.run(load(host, port, proto, devices, rate, batch, seconds))
+    print('{} devices at {:g} samples/s in frames of {} over {}'.format(devices, rate, batch, proto.upper()))
+    print('Sent {} samples in {:.2f}s: {:.0f} samples/s. {} late sends.'.format(sent, elapsed, sent / elapsed, late))
+    if conn is not None:
+        s = conn.recv()
+        p.join()
+        print('Server ({}):'.format('FusionFleet' if fleet else 'Fusion per device'), end=' ')
+        ingest.show(s)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,114 @@
+# shmread.py Read latency of attitude published in shared memory.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython 3.8 or later:
+# python3 benchmarks/shmread.py [-r rate] [-s seconds] [-i interval]
+# A separate process runs the filter on remote/mpudata at rate updates/s
+# (0: as fast as possible), publishing each result with publish.Publisher.
+# Samples are timestamped with time.monotonic() in μs, a clock shared by all
+# processes. This process reads with publish.Reader for seconds, pausing for
+# interval μs between reads (default 0: continuous). It reports the time
+# taken by each read, the proportion of reads which were retried because a
+# write was in progress, and the age of new snapshots when first read. The
+# publisher reports the time taken by its updates and by publication.
+
+import sys
+import time
+import multiprocessing
+import testdata  # Sets up sys.path
+from fusion import Fusion
+from publish import Publisher, Reader
+
+def now_us():
+    return time.monotonic_ns() // 1000
+
+def pc(d, p):
+    return d[min(len(d) - 1, (len(d) * p) // 100)] if d else 0
+
+# Publisher process. Sends the block name on conn, runs until told to stop,
+# then sends its statistics.
+def publisher(conn, rate):
+    cal, data = testdata.load()
+    fuse = Fusion(testdata.timediff)
+    pub = Publisher(fuse)
+    conn.send(pub.name)
+    conn.recv()  # Start
+    period = 1 / rate if rate else 0
+    deadline = time.perf_counter()
+    n = 0
+    t_update = 0
+    t_publish = 0
+    update = Fusion.update
+    while not conn.poll():
+        if period:
+            deadline += period
+            while time.perf_counter() < deadline:
+                pass
+        rec = data[n % len(data)]
+        t = time.perf_counter_ns()
+        update(fuse, rec[0], rec[1], rec[2], now_us())
+        t1 = time.perf_counter_ns()
+        pub.publish(now_us())
+        t_publish += time.perf_counter_ns() - t1
+        t_update += t1 - t
+        n += 1
+    conn.recv()
+    conn.send((n, t_update / n / 1000, t_publish / n / 1000))
+    pub.close()
+
+def main(args):
+    rate = 1000
+    seconds = 5
+    interval = 0
+    while args:
+        arg = args.pop(0)
+        if arg == '-r':
+            rate = float(args.pop(0))
+        elif arg == '-s':
+            seconds = float(args.pop(0))
+        elif arg == '-i':
+            interval = float(args.pop(0)) / 1000000
+        else:
+            print('Usage: shmread.py [-r rate] [-s seconds] [-i interval]')
+            return
+    conn, child = multiprocessing.Pipe()
+    p = multiprocessing.Process(target=publisher, args=(child, rate))
+    p.start()
+    reader = Reader(conn.recv())
+    conn.send('start')
+    times = []  # ns per read
+    ages = []  # μs
+    reads = 0
+    seq = 0
+    clock = time.perf_counter_ns
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        t = clock()
+        data = reader.read()
+        t = clock() - t
+        if len(times) < 1000000:
+            times.append(t)
+        reads += 1
+        if data is not None and data[0] != seq:
+            ages.append(now_us() - data[1])
+            seq = data[0]
+        if interval:
+            time.sleep(interval)
+    conn.send('stop')
+    updates, t_update, t_publish = conn.recv()
+    p.join()
+    reader.close()
+    times.sort()
+    ages.sort()
+    print('Publisher: {} updates at {} updates/s. Update {:.1f}μs, publish {:.1f}μs.'.format(
+          updates, '{:g}'.format(rate) if rate else 'maximum', t_update, t_publish))
+    print('Reader: {} reads, {} snapshots, {:.3f}% retried.'.format(reads, len(ages), 100 * reader.retries / reads))
+    print('Read μs: mean {:.2f} p50 {:.2f} p99 {:.2f} max {:.2f}'.format(
+          sum(times) / len(times) / 1000, pc(times, 50) / 1000, pc(times, 99) / 1000, times[-1] / 1000))
+    if ages:
+        print('Age μs: mean {:.0f} p50 {:.0f} p99 {:.0f} max {:.0f}'.format(
+              sum(ages) / len(ages), pc(ages, 50), pc(ages, 99), ages[-1]))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,59 @@
+# testdata.py Test data for benchmarks: remote/mpudata and synthetic streams.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under MicroPython or CPython.
+
+import sys
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+_dir = __file__.rpartition('/')[0] or '.'
+ROOT = _dir + '/..'
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+MPUDATA = ROOT + '/remote/mpudata'
+
+from deltat import TimeDiff, TICKS_PERIOD
+# Timestamps are ticks_us() values, differenced with rollover as in an
+# application.
+timediff = TimeDiff
+
+# Read a capture in remote/mpudata format, or in binary format if the name
+# ends in .bin. Returns (cal, data): lists of
+# [[ax, ay, az], [gx, gy, gz], [mx, my, mz], timestamp] records before and
+# after the cal_end marker.
+def load(fn=MPUDATA):
+    cal = []
+    data = cal
+    if fn.endswith('.bin'):
+        import capfile
+        with capfile.Reader(fn) as r:
+            for rec in r:
+                if rec == 'cal_end':
+                    data = []
+                else:
+                    data.append(rec)
+        return cal, data
+    with open(fn, 'r') as f:
+        for line in f:
+            if line.strip() == 'cal_end':
+                data = []
+            elif line.strip():
+                data.append(json.loads(line))
+    return cal, data
+
+# Return a list of n records produced by repeating the records of data with
+# timestamps (μs) advancing by the mean sample period. Timestamps roll over as
+# ticks_us() values do.
+def synthetic(data, n):
+    t0 = data[0][3]
+    period = (data[-1][3] - t0) // (len(data) - 1)
+    span = data[-1][3] - t0 + period
+    res = []
+    for i in range(n):
+        rec = data[i % len(data)]
+        res.append([rec[0], rec[1], rec[2], (rec[3] + (i // len(data)) * span) % TICKS_PERIOD])
+    return res
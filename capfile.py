@@ -0,0 +1,199 @@
+# capfile.py Compact binary format for captured IMU data.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# A file comprises an 8 byte header followed by fixed size 44 byte records,
+# all little-endian:
+# Header: b'IMUC', version (uint16), record size (uint16).
+# Record: kind (uint8), 3 pad bytes, accel, gyro, mag (9 x float32),
+# timestamp (uint32).
+# Timestamps must be integers in range 0 to 2**32 - 1, e.g. ticks_us() values.
+# Others, such as float seconds or negative offsets, raise ValueError.
+# kind is SAMPLE for 9DOF data, SAMPLE_NOMAG for 6DOF data (mag is zero).
+# Values >= MARKER are markers recording events such as the end of
+# calibration: their vectors and timestamp are zero. Vectors are 4-byte
+# aligned in the file so may be viewed as float32 arrays in place.
+
+# The Writer runs under MicroPython and is intended for use in a read_coro.
+# The Reader uses mmap where available (CPython) so records are accessed
+# without copying the file. Under MicroPython the file is read into RAM.
+
+# Converting a capture in JSON lines format (as in remote/mpudata):
+# python3 capfile.py mpudata mpudata.bin
+
+import struct
+
+MAGIC = b'IMUC'
+VERSION = 1
+_HEADER = '<4sHH'
+HEADER_SIZE = struct.calcsize(_HEADER)
+_RECORD = '<B3x9fI'
+RECORD_SIZE = struct.calcsize(_RECORD)  # 44
+_VECTORS = '<9f'
+
+SAMPLE = 0
+SAMPLE_NOMAG = 1
+MARKER = 16
+CAL_END = 16
+MARKERS = {'cal_end': CAL_END}  # Marker names as used in JSON lines files
+_NAMES = {v: k for k, v in MARKERS.items()}
+
+def _ts(ts):
+    if isinstance(ts, float) or not 0 <= ts <= 0xffffffff:
+        raise ValueError('Timestamp must be an integer in range 0 to 2**32 - 1: {!r}'.format(ts))
+    return ts
+
+class Writer:
+    # f is a file opened in binary write mode. The header is written at once.
+    def __init__(self, f):
+        self.f = f
+        self.buf = bytearray(RECORD_SIZE)  # Record buffer is reused
+        f.write(struct.pack(_HEADER, MAGIC, VERSION, RECORD_SIZE))
+
+    # 3-tuples (x, y, z) for accel, gyro and mag. For 6DOF data mag is None.
+    def sample(self, accel, gyro, mag, ts):
+        kind = SAMPLE
+        if mag is None:
+            kind = SAMPLE_NOMAG
+            mag = (0, 0, 0)
+        struct.pack_into(_RECORD, self.buf, 0, kind, accel[0], accel[1], accel[2],
+                         gyro[0], gyro[1], gyro[2], mag[0], mag[1], mag[2], _ts(ts))
+        self.f.write(self.buf)
+
+    def marker(self, kind=CAL_END):
+        struct.pack_into(_RECORD, self.buf, 0, kind, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        self.f.write(self.buf)
+
+    def close(self):
+        self.f.close()
+
+class Reader:
+    def __init__(self, fn):
+        self._f = open(fn, 'rb')
+        try:
+            import mmap
+            self.buf = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ImportError:
+            self.buf = self._f.read()
+        self.mv = memoryview(self.buf)
+        magic, version, size = struct.unpack_from(_HEADER, self.buf, 0)
+        if magic != MAGIC or version != VERSION or size != RECORD_SIZE:
+            self.close()
+            raise ValueError('Not a capture file: {}'.format(fn))
+        self.n = (len(self.buf) - HEADER_SIZE) // RECORD_SIZE
+
+    def __len__(self):
+        return self.n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Any views obtained from the Reader must be released before closing.
+    def close(self):
+        if self.mv is not None:
+            self.mv = None
+            if hasattr(self.buf, 'close'):  # mmap
+                self.buf.close()
+            self._f.close()
+
+    def kind(self, i):
+        return self.buf[HEADER_SIZE + i * RECORD_SIZE]
+
+    # Zero-copy view of record i.
+    def view(self, i):
+        offs = HEADER_SIZE + i * RECORD_SIZE
+        return self.mv[offs: offs + RECORD_SIZE]
+
+    # Zero-copy view of the 9 floats of record i (CPython only). Elements are
+    # ax, ay, az, gx, gy, gz, mx, my, mz.
+    def floats(self, i):
+        offs = HEADER_SIZE + i * RECORD_SIZE + 4
+        return self.mv[offs: offs + 36].cast('f')
+
+    # All records as a numpy structured array sharing the file's memory.
+    # Fields are kind, accel, gyro, mag and ts.
+    def array(self):
+        import numpy as np
+        dt = np.dtype([('kind', 'u1'), ('pad', 'V3'), ('accel', '<f4', 3), ('gyro', '<f4', 3),
+                       ('mag', '<f4', 3), ('ts', '<u4')])
+        return np.frombuffer(self.buf, dtype=dt, count=self.n, offset=HEADER_SIZE)
+
+    # Record i in the format returned by unpack_from().
+    def record(self, i):
+        return unpack_from(self.buf, HEADER_SIZE + i * RECORD_SIZE)
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self.record(i)
+
+    # Index of the first record of a given kind, None if absent.
+    def find(self, kind=CAL_END):
+        for i in range(self.n):
+            if self.kind(i) == kind:
+                return i
+        return None
+
+# Pack a record into buf at offs. rec is in the format accepted by
+# Fusion.update, [[ax, ay, az], [gx, gy, gz], [mx, my, mz], timestamp], or for
+# 6DOF data [[ax, ay, az], [gx, gy, gz], timestamp], or is a marker name or
+# kind. Used for records in network frames.
+def pack_into(buf, offs, rec):
+    if isinstance(rec, (str, int)):
+        struct.pack_into(_RECORD, buf, offs, MARKERS.get(rec, rec), 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        return
+    a = rec[0]
+    g = rec[1]
+    if len(rec) == 3:
+        kind = SAMPLE_NOMAG
+        m = (0, 0, 0)
+    else:
+        kind = SAMPLE
+        m = rec[2]
+    struct.pack_into(_RECORD, buf, offs, kind, a[0], a[1], a[2], g[0], g[1], g[2], m[0], m[1], m[2], _ts(rec[-1]))
+
+# The record at offs in buf, in the format accepted by pack_into. A marker is
+# returned as its name as used in JSON lines files, e.g. 'cal_end', or as an
+# int if it has no name.
+def unpack_from(buf, offs):
+    kind = buf[offs]
+    if kind >= MARKER:
+        return _NAMES.get(kind, kind)
+    v = struct.unpack_from(_VECTORS, buf, offs + 4)
+    ts = struct.unpack_from('<I', buf, offs + 40)[0]
+    if kind == SAMPLE_NOMAG:
+        return [[v[0], v[1], v[2]], [v[3], v[4], v[5]], ts]
+    return [[v[0], v[1], v[2]], [v[3], v[4], v[5]], [v[6], v[7], v[8]], ts]
+
+# Convert a capture in JSON lines format to binary.
+def convert(src, dst):
+    try:
+        import ujson as json
+    except ImportError:
+        import json
+    n = 0
+    with open(src, 'r') as fi, open(dst, 'wb') as fo:
+        w = Writer(fo)
+        for line in fi:
+            line = line.strip()
+            if not line:
+                continue
+            if line in MARKERS:
+                w.marker(MARKERS[line])
+            else:
+                d = json.loads(line)
+                if len(d) == 3:  # 6DOF: accel, gyro, timestamp
+                    w.sample(d[0], d[1], None, d[2])
+                else:
+                    w.sample(d[0], d[1], d[2], d[3])
+            n += 1
+    return n
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 3:
+        print('Usage: capfile.py infile.json outfile.bin')
+    else:
+        print('Converted {} records.'.format(convert(sys.argv[1], sys.argv[2])))
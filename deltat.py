@@ -20,10 +20,21 @@
 # implementation of ticks_diff which accounts for MicroPython rollover and
 # must supply the returned ticks_us() values as a timestamp.
 
-# Under MicroPython TimeDiff(start, end) uses time.ticks_diff.
+# TimeDiff(start, end) differences timestamps from MicroPython's
+# time.ticks_us(), returning seconds. Under MicroPython it uses time.ticks_diff.
+# Elsewhere the rollover of ticks_us is emulated by ticks_diff() below, so a
+# replay of data captured on a MicroPython device is correct if the capture
+# spans a rollover. TICKS_PERIOD is that of most MicroPython ports. The
+# emulation also accepts numpy integer arrays, so TimeDiff may be passed to
+# fusion_fleet.FusionFleet.
+
+# If the sensor is clocked by its output data rate the interval is constant.
+# Passing a number rather than a function to the Fusion constructor sets the
+# interval in seconds: no clock is read and no timestamps are expected.
 
 # A DeltaT instance, called with function call syntax, returns a time
-# difference from the previous call as a float value. Units seconds.
+# difference from the previous call as a float value. Units seconds. The most
+# recent value is retained in the dt bound variable.
 
 # If running under MicroPython and no time differencing function is supplied
 # to the Fusion constructor it uses time.ticks_us as its time source and a
@@ -36,6 +47,10 @@
 # On 1st pass dt evidently can't be computed. A notional value of 100μs is
 # returned. The Madgwick algorithm takes seconds to stabilise.
 
+# DeltaT.bulk(ts) returns the intervals for a sequence of timestamps in one
+# pass, continuing from the previous call. If ts is a numpy array and TimeDiff
+# is in use the calculation is vectorised.
+
 try:
     import utime as time
 except ImportError:
@@ -43,20 +58,43 @@ except ImportError:
 
 is_micropython = hasattr(time, 'ticks_diff')
 
+TICKS_PERIOD = 1 << 30
+_TICKS_MASK = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+if is_micropython:
+    ticks_diff = time.ticks_diff
+else:
+    def ticks_diff(ticks1, ticks2):  # Emulate MicroPython
+        return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MASK) - _TICKS_HALF
+
+def TimeDiff(start, end):
+    return ticks_diff(start, end)/1000000
+
 class DeltaT():
     def __init__(self, timediff):
+        self.fixed = 0
         if timediff is None:
             self.expect_ts = False
             if is_micropython:
-                self.timediff = lambda start, end : time.ticks_diff(start, end)/1000000
+                self.timediff = TimeDiff
             else:
                 raise ValueError('You must define a timediff function')
+        elif isinstance(timediff, (int, float)):
+            if timediff <= 0:
+                raise ValueError('Fixed interval must be > 0')
+            self.expect_ts = False
+            self.timediff = None
+            self.fixed = timediff
         else:
             self.expect_ts = True
             self.timediff = timediff
         self.start_time = None
+        self.dt = self.fixed
 
     def __call__(self, ts):
+        if self.fixed:
+            return self.fixed
         if self.expect_ts:
             if ts is None:
                 raise ValueError('Timestamp expected but not supplied.')
@@ -68,8 +106,48 @@ class DeltaT():
         # ts is now valid
         if self.start_time is None:  # 1st call: self.start_time is invalid
             self.start_time = ts
-            return 0.0001  # 100μs notional delay. 1st reading is invalid in any case
+            self.dt = 0.0001  # 100μs notional delay. 1st reading is invalid in any case
+            return self.dt
 
         dt = self.timediff(ts, self.start_time)
         self.start_time = ts
+        self.dt = dt
         return dt
+
+    def bulk(self, ts):
+        n = len(ts)
+        if self.fixed:
+            return [self.fixed] * n
+        if not self.expect_ts:
+            raise ValueError('Timestamps and a timediff function are required.')
+        if not n:
+            return []
+        if self.timediff is TimeDiff and hasattr(ts, 'dtype'):  # numpy array
+            import numpy as np
+            t = ts.astype(np.int64)
+            d = np.empty(n)
+            d[1:] = ((t[1:] - t[:-1] + _TICKS_HALF) & _TICKS_MASK) - _TICKS_HALF
+            if self.start_time is None:
+                d[0] = 0.0001 * 1000000
+            else:
+                d[0] = ticks_diff(int(t[0]), self.start_time)
+            d /= 1000000
+            self.start_time = int(t[-1])
+            self.dt = float(d[-1])
+            return d
+        timediff = self.timediff
+        res = [0] * n
+        start = self.start_time
+        i = 0
+        if start is None:
+            res[0] = 0.0001
+            start = ts[0]
+            i = 1
+        while i < n:
+            t = ts[i]
+            res[i] = timediff(t, start)
+            start = t
+            i += 1
+        self.start_time = start
+        self.dt = res[-1]
+        return res
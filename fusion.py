@@ -3,6 +3,18 @@
 # Released under the MIT License (MIT)
 # Copyright (c) 2017, 2018 Peter Hinch
 
+# V0.21 Read only properties ninedof and skipped.
+# V0.20 Optional attitude history with interpolated queries.
+# V0.19 Multi-rate sensors: update accepts samples without a fresh mag reading.
+# V0.18 Fast start: attitude initialised from the first sample.
+# V0.17 Calibration may end automatically on sufficient coverage.
+# V0.16 Optional background magnetometer bias tracking.
+# V0.15 Optional ellipsoid magnetometer calibration.
+# V0.14 Optional axis remapping in the update path.
+# V0.13 Optional runtime statistics.
+# V0.12 Angles, quaternion snapshot and rotation matrix computed on demand.
+# V0.11 State held in preallocated arrays. Update path minimises allocation.
+# V0.10 Batch update methods for offline replay.
 # V0.9 Time calculations devolved to deltat.py
 # V0.8 Calibrate wait argument can be a function or an integer in ms.
 # V0.7 Yaw replaced with heading
@@ -21,8 +33,24 @@ try:
 except ImportError:
     import time
 
-from math import sqrt, atan2, asin, degrees, radians
-from deltat import DeltaT
+from array import array
+from math import sqrt, atan2, asin, degrees, radians, pi, cos
+from deltat import DeltaT, TimeDiff
+
+_DEG2RAD = pi / 180  # Multiplication avoids a function call per value
+# Arrays hold state: use the precision of the platform's floats.
+_FLOAT = 'f' if 1.0 + 1e-9 == 1.0 else 'd'
+# Values derived from the quaternion are computed on first access after an
+# update. Bits in ._cached flag those which are valid.
+_EULER = 1
+_ROTATION = 2
+_QUATERNION = 4
+# Fast start: values of ._warm
+_INIT = 1  # Set the attitude from the next valid sample
+_WARMUP = 2  # Raised beta in use until converged
+# Causes of skipped samples: indices into ._skipped
+SKIP_ACCEL = 0  # Zero accelerometer vector
+SKIP_MAG = 1  # Zero magnetometer vector (after bias removal)
 
 class Fusion(object):
     '''
@@ -31,18 +59,112 @@ class Fusion(object):
     '''
     declination = 0                         # Optional offset for true north. A +ve value adds to heading
     def __init__(self, timediff=None):
-        self.magbias = (0, 0, 0)            # local magnetic bias factors: set from calibration
+        self.magbias = array(_FLOAT, (0, 0, 0))  # local magnetic bias factors: set from calibration
         self.deltat = DeltaT(timediff)      # Time between updates
-        self.q = [1.0, 0.0, 0.0, 0.0]       # vector to hold quaternion
+        self.q = array(_FLOAT, (1.0, 0.0, 0.0, 0.0))  # vector to hold quaternion: updated in place
         GyroMeasError = radians(40)         # Original code indicates this leads to a 2 sec response time
         self.beta = sqrt(3.0 / 4.0) * GyroMeasError  # compute beta (see README)
-        self.pitch = 0
-        self.heading = 0
-        self.roll = 0
+        self._angles = array(_FLOAT, (0, 0, 0))  # heading, pitch, roll
+        self._rotation = (array(_FLOAT, (1, 0, 0)), array(_FLOAT, (0, 1, 0)), array(_FLOAT, (0, 0, 1)))
+        self._quaternion = (1.0, 0.0, 0.0, 0.0)
+        self._ninedof = False               # Type of last update
+        self._cached = _EULER | _ROTATION | _QUATERNION
+        self._skipped = [0, 0]              # Count of skipped samples by cause
+        self._warm = 0                      # Fast start state
+        self._qm = array(_FLOAT, (1, 0, 0, 0))  # Attitude measured from a sample
+        self.stats = None
+        self.orientation = None             # Optional orientate.Orientation
+        self.magcorr = None                 # Optional soft iron correction: 3 rows
+        self._mag = array(_FLOAT, (0, 0, 0))
+        self.magtrack = None                # Optional magcal.Tracker
+        self.mag_ts = None                  # Timestamp of last fresh mag reading
+        self.magdt = 0                      # Interval between fresh mag readings (s)
+        self.history = None                 # Optional history.History
+
+    # Runtime statistics. When enabled, update and update_nomag are replaced
+    # by instrumented versions: when disabled there is no overhead.
+    def enable_stats(self, on=True):
+        if on:
+            from fusion_stats import Stats
+            self.stats = Stats(self)
+            self.update = self.stats.update
+            self.update_nomag = self.stats.update_nomag
+        elif self.stats is not None:
+            del self.update
+            del self.update_nomag
+            self.stats = None
+
+    @property
+    def heading(self):
+        if not self._cached & _EULER:
+            self._euler()
+        return self._angles[0]
+
+    @property
+    def pitch(self):
+        if not self._cached & _EULER:
+            self._euler()
+        return self._angles[1]
+
+    @property
+    def roll(self):
+        if not self._cached & _EULER:
+            self._euler()
+        return self._angles[2]
+
+    @property
+    def ninedof(self):  # True if the last update used a magnetometer reading
+        return self._ninedof
 
-    def calibrate(self, getxyz, stopfunc, wait=0):
+    @property
+    def skipped(self):  # Number of samples ignored because of a zero vector
+        return self._skipped[SKIP_ACCEL] + self._skipped[SKIP_MAG]
+
+    @property
+    def quaternion(self):  # Snapshot of q as a (w, x, y, z) tuple
+        if not self._cached & _QUATERNION:
+            self._quaternion = tuple(self.q)
+            self._cached |= _QUATERNION
+        return self._quaternion
+
+    # Rotation matrix as 3 rows. Transforms a vector in the Earth frame to the
+    # sensor frame. Its transpose performs the reverse transformation.
+    @property
+    def rotation(self):
+        if not self._cached & _ROTATION:
+            q = self.q
+            q0 = q[0]
+            q1 = q[1]
+            q2 = q[2]
+            q3 = q[3]
+            r = self._rotation[0]
+            r[0] = q0 * q0 + q1 * q1 - q2 * q2 - q3 * q3
+            r[1] = 2.0 * (q1 * q2 + q0 * q3)
+            r[2] = 2.0 * (q1 * q3 - q0 * q2)
+            r = self._rotation[1]
+            r[0] = 2.0 * (q1 * q2 - q0 * q3)
+            r[1] = q0 * q0 - q1 * q1 + q2 * q2 - q3 * q3
+            r[2] = 2.0 * (q2 * q3 + q0 * q1)
+            r = self._rotation[2]
+            r[0] = 2.0 * (q1 * q3 + q0 * q2)
+            r[1] = 2.0 * (q2 * q3 - q0 * q1)
+            r[2] = q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3
+            self._cached |= _ROTATION
+        return self._rotation
+
+    # fit, if supplied, is a magcal.Ellipsoid which is fed each reading. On
+    # completion magbias and magcorr are set from the fit. If the fit fails
+    # magbias is set from the maxima and minima, magcorr is None and False is
+    # returned. If fit has a done method (magcal.Coverage) calibration also
+    # ends when that returns True: stopfunc may then be None.
+    def calibrate(self, getxyz, stopfunc, wait=0, fit=None):
+        if fit is not None:
+            fit.reset()
+        stopfunc = _stopfunc(stopfunc, fit)
         magmax = list(getxyz())             # Initialise max and min lists with current values
         magmin = magmax[:]
+        if fit is not None:
+            fit.add(magmax)
         while not stopfunc():
             if wait != 0:
                 if callable(wait):
@@ -53,12 +175,313 @@ class Fusion(object):
             for x in range(3):
                 magmax[x] = max(magmax[x], magxyz[x])
                 magmin[x] = min(magmin[x], magxyz[x])
-        self.magbias = tuple(map(lambda a, b: (a +b)/2, magmin, magmax))
+            if fit is not None:
+                fit.add(magxyz)
+        return self._calibrated(magmin, magmax, fit)
+
+    def _calibrated(self, magmin, magmax, fit):
+        ok = fit is not None and fit.solve()
+        if ok:
+            self.magbias = array(_FLOAT, fit.bias)
+            self.magcorr = fit.matrix
+        else:
+            self.magbias = array(_FLOAT, ((magmin[x] + magmax[x]) / 2 for x in range(3)))
+            self.magcorr = None
+        if self.magtrack is not None:
+            self.magtrack.reset()
+        return ok or fit is None
 
     def update_nomag(self, accel, gyro, ts=None):    # 3-tuples (x, y, z) for accel, gyro
-        ax, ay, az = accel                  # Units G (but later normalised)
-        gx, gy, gz = (radians(x) for x in gyro) # Units deg/s
-        q1, q2, q3, q4 = (self.q[x] for x in range(4))   # short name local variable for readability
+        o = self.orientation
+        if o is None:
+            ax, ay, az = accel              # Units G (but later normalised)
+            gx, gy, gz = gyro               # Units deg/s
+        else:                               # Remap axes (see orientate.py)
+            t0, t1, t2 = o.t
+            s0, s1, s2 = o.s
+            ax = s0 * accel[t0]
+            ay = s1 * accel[t1]
+            az = s2 * accel[t2]
+            gx = s0 * gyro[t0]
+            gy = s1 * gyro[t1]
+            gz = s2 * gyro[t2]
+        # Normalise accelerometer measurement
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if (norm == 0):
+            self._skipped[SKIP_ACCEL] += 1
+            return # handle NaN
+        norm = 1 / norm        # use reciprocal for division
+        ax *= norm
+        ay *= norm
+        az *= norm
+        dt = self.deltat.fixed or self.deltat(ts)
+        if self._warm:
+            self._warmup(ax, ay, az, None, 0, 0, dt)
+        self._fuse_nomag(ax, ay, az, gx * _DEG2RAD, gy * _DEG2RAD, gz * _DEG2RAD, dt)
+        if self.history is not None:
+            self.history.add(self, ts)
+
+    # Multi-rate sensors. mag may be None, or (if mts is passed) a reading with
+    # the same timestamp as the last one. The accel/gyro step is then performed
+    # with heading retained from previous updates. ts is the accel/gyro
+    # timestamp, mts that of the mag reading.
+    def update(self, accel, gyro, mag, ts=None, mts=None):     # 3-tuples (x, y, z) for accel, gyro and mag data
+        if mag is None or (mts is not None and not self._fresh(mts)):
+            warm = self._warm
+            if warm == _INIT:  # Wait for a mag reading to set heading
+                self._warm = 0
+            ninedof = self._ninedof
+            Fusion.update_nomag(self, accel, gyro, ts)
+            self._ninedof = ninedof
+            if warm == _INIT:
+                self._warm = _INIT
+            return
+        if self.magtrack is not None:
+            self.magtrack.add(self, mag)
+        magbias = self.magbias              # Calibration is in the sensor's frame
+        mx = mag[0] - magbias[0]            # Units irrelevant (normalised)
+        my = mag[1] - magbias[1]
+        mz = mag[2] - magbias[2]
+        w = self.magcorr                    # Soft iron correction
+        if w is not None:
+            r = w[0]
+            x = r[0] * mx + r[1] * my + r[2] * mz
+            r = w[1]
+            y = r[0] * mx + r[1] * my + r[2] * mz
+            r = w[2]
+            mz = r[0] * mx + r[1] * my + r[2] * mz
+            mx = x
+            my = y
+        o = self.orientation
+        if o is None:
+            ax, ay, az = accel              # Units irrelevant (normalised)
+            gx, gy, gz = gyro               # Units deg/s
+        else:                               # Remap axes (see orientate.py)
+            t0, t1, t2 = o.t
+            s0, s1, s2 = o.s
+            m = self._mag                   # Enables scalars to be indexed
+            m[0] = mx
+            m[1] = my
+            m[2] = mz
+            mx = s0 * m[t0]
+            my = s1 * m[t1]
+            mz = s2 * m[t2]
+            ax = s0 * accel[t0]
+            ay = s1 * accel[t1]
+            az = s2 * accel[t2]
+            gx = s0 * gyro[t0]
+            gy = s1 * gyro[t1]
+            gz = s2 * gyro[t2]
+        # Normalise accelerometer measurement
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if (norm == 0):
+            self._skipped[SKIP_ACCEL] += 1
+            return # handle NaN
+        norm = 1 / norm                     # use reciprocal for division
+        ax *= norm
+        ay *= norm
+        az *= norm
+
+        # Normalise magnetometer measurement
+        norm = sqrt(mx * mx + my * my + mz * mz)
+        if (norm == 0):
+            self._skipped[SKIP_MAG] += 1
+            return                          # handle NaN
+        norm = 1 / norm                     # use reciprocal for division
+        mx *= norm
+        my *= norm
+        mz *= norm
+        dt = self.deltat.fixed or self.deltat(ts)
+        if self._warm:
+            self._warmup(ax, ay, az, mx, my, mz, dt)
+        self._fuse(ax, ay, az, gx * _DEG2RAD, gy * _DEG2RAD, gz * _DEG2RAD, mx, my, mz, dt)
+        if self.history is not None:
+            self.history.add(self, ts)
+
+    def _fresh(self, mts):  # Record the timestamp of a mag reading. False if stale.
+        last = self.mag_ts
+        if last is not None:
+            if mts == last:
+                return False
+            timediff = self.deltat.timediff
+            if timediff is not None:
+                self.magdt = timediff(mts, last)
+        self.mag_ts = mts
+        return True
+
+    # Batch updates for offline replay of recorded data. accel, gyro and mag
+    # are sequences of N (x, y, z) vectors (lists or N x 3 arrays), ts is a
+    # sequence of N timestamps. The Madgwick step is inherently sequential but
+    # normalisation, bias subtraction, conversion to radians and timestamp
+    # differencing are done in whole-batch passes ahead of the loop, and the
+    # Euler angles in a single pass after it. If numpy is available these
+    # passes are vectorised and the results are an N x 4 array of quaternions
+    # and an N x 3 array of (heading, pitch, roll). Otherwise they are lists of
+    # tuples. Results match those of N calls to update() or update_nomag().
+    # If mag is None the 6DOF update is performed.
+    def update_batch(self, accel, gyro, mag, ts):
+        if mag is None:
+            return self.update_nomag_batch(accel, gyro, ts)
+        np = _numpy()
+        if np is not None:
+            return self._np_batch(np, accel, gyro, mag, ts)
+        o = self.orientation
+        accel, ok = _normalise(accel, o=o)
+        mag, okm = _normalise(mag, self.magbias, o, self.magcorr)
+        for n in range(len(ok)):
+            ok[n] = ok[n] and okm[n]
+        return self._batch(accel, _radians(gyro, o), mag, ok, ts)
+
+    def update_nomag_batch(self, accel, gyro, ts):
+        np = _numpy()
+        if np is not None:
+            return self._np_batch(np, accel, gyro, None, ts)
+        o = self.orientation
+        accel, ok = _normalise(accel, o=o)
+        return self._batch(accel, _radians(gyro, o), None, ok, ts)
+
+    def _batch(self, accel, gyro, mag, ok, ts):
+        prior = self._ninedof
+        quats, first = self._replay(accel, gyro, mag, ok, self.deltat.bulk(ts), ts)
+        ninedof = mag is not None
+        declination = self.declination
+        qs = []
+        angles = []
+        for n in range(0, len(quats), 4):
+            q = (quats[n], quats[n + 1], quats[n + 2], quats[n + 3])
+            qs.append(q)
+            angles.append(_angles(q, ninedof if n >= first * 4 else prior, declination))
+        return qs, angles
+
+    # numpy version: the passes over the batch are vectorised. The loop runs
+    # on flat lists of Python floats, which are faster to index than arrays.
+    def _np_batch(self, np, accel, gyro, mag, ts):
+        o = self.orientation
+        accel, ok = _np_normalise(np, accel, None, o, None)
+        if mag is not None:
+            mag, okm = _np_normalise(np, mag, self.magbias, o, self.magcorr)
+            ok &= okm
+            mag = mag.ravel().tolist()
+        gyro = np.asarray(gyro, dtype=float).reshape(-1, 3) * _DEG2RAD
+        if o is not None:
+            gyro = gyro[:, list(o.t)] * np.array(o.s)
+        if hasattr(ts, 'tolist') and (self.history is not None or self.deltat.timediff is not TimeDiff):
+            ts = ts.tolist()  # Used per sample: avoid numpy scalars
+        dts = np.asarray(self.deltat.bulk(ts), dtype=float).tolist()
+        prior = self._ninedof
+        quats, first = self._replay(accel.ravel().tolist(), gyro.ravel().tolist(), mag, ok.tolist(), dts, ts)
+        n = len(dts)
+        quats = np.array(quats, dtype=float).reshape(n, 4)
+        ninedof = np.empty(n, dtype=bool)
+        ninedof[:first] = prior
+        ninedof[first:] = mag is not None
+        return quats, _np_angles(np, quats, ninedof, self.declination)
+
+    # Run the filter over preprocessed samples. accel, gyro and mag are flat
+    # lists of 3N values, ok is False where a sample is to be skipped. Returns
+    # a flat list of the quaternion after each sample and the index of the
+    # first sample processed.
+    def _replay(self, accel, gyro, mag, ok, dts, ts):
+        ninedof = mag is not None
+        fuse = self._fuse if ninedof else self._fuse_nomag
+        history = self.history
+        q = self.q
+        quats = []
+        extend = quats.extend
+        first = len(dts)
+        carry = 0  # Time from skipped samples is added to the next valid one
+        for n in range(len(dts)):
+            if ok[n]:
+                i = 3 * n
+                ax = accel[i]
+                ay = accel[i + 1]
+                az = accel[i + 2]
+                gx = gyro[i]
+                gy = gyro[i + 1]
+                gz = gyro[i + 2]
+                dt = dts[n] + carry
+                if ninedof:
+                    mx = mag[i]
+                    my = mag[i + 1]
+                    mz = mag[i + 2]
+                    if self._warm:
+                        self._warmup(ax, ay, az, mx, my, mz, dt)
+                    fuse(ax, ay, az, gx, gy, gz, mx, my, mz, dt)
+                else:
+                    if self._warm:
+                        self._warmup(ax, ay, az, None, 0, 0, dt)
+                    fuse(ax, ay, az, gx, gy, gz, dt)
+                carry = 0
+                if first > n:
+                    first = n
+                if history is not None:
+                    history.add(self, ts[n])
+            else:
+                carry += dts[n]
+            extend(q)
+        return quats, first
+
+    # Fast start. By default the filter starts from the identity quaternion
+    # and takes seconds to converge. After initialise() the attitude is set
+    # directly from the next valid sample: tilt from the accelerometer and
+    # (9DOF) heading from the magnetometer. If beta is given it is used until
+    # the filter has agreed with the attitude measured from each sample to
+    # within tolerance degrees for settle seconds, or for timeout seconds, when
+    # the prior value of beta is restored.
+    def initialise(self, beta=None, timeout=2.0, tolerance=2.0, settle=0.2):
+        if self._warm == _WARMUP:
+            self.beta = self._beta
+        self._warm = _INIT
+        self._beta = self.beta              # Nominal value
+        self._warm_beta = beta
+        self._timeout = timeout
+        self._tolerance = radians(tolerance)
+        self._settle = settle
+
+    def _warmup(self, ax, ay, az, mx, my, mz, dt):
+        qm = self._qm
+        if mx is None:  # 6DOF: heading is arbitrary
+            ok = _attitude(qm, ax, ay, az, 1.0, 0.0, 0.0) or _attitude(qm, ax, ay, az, 0.0, 1.0, 0.0)
+        else:
+            ok = _attitude(qm, ax, ay, az, mx, my, mz)
+        q = self.q
+        if self._warm == _INIT:
+            if ok:
+                for i in range(4):
+                    q[i] = qm[i]
+                self._cached = 0
+                self._warm = 0
+                if self._warm_beta is not None:
+                    self.beta = self._warm_beta
+                    self._warm = _WARMUP
+                    self._elapsed = 0
+                    self._inside = 0            # Time within tolerance
+            return
+        self._elapsed += dt
+        if mx is None:  # Angle between measured and estimated gravity
+            c = (2.0 * (q[1] * q[3] - q[0] * q[2]) * ax + 2.0 * (q[2] * q[3] + q[0] * q[1]) * ay
+                 + (q[0] * q[0] - q[1] * q[1] - q[2] * q[2] + q[3] * q[3]) * az)
+            converged = c >= cos(self._tolerance)
+        else:  # Rotation between measured and estimated attitude
+            c = abs(q[0] * qm[0] + q[1] * qm[1] + q[2] * qm[2] + q[3] * qm[3])
+            converged = c >= cos(self._tolerance / 2)
+        self._inside = self._inside + dt if ok and converged else 0
+        if self._inside >= self._settle or self._elapsed >= self._timeout:
+            self.beta = self._beta
+            self._warm = 0
+
+    # Madgwick kernels. Args are a normalised accel vector, gyro rates in
+    # radians/s, (9DOF) a normalised mag vector, and the integration interval
+    # in seconds. The quaternion is updated in place and derived values are
+    # flagged as stale. Indexing rather than unpacking arrays, and local rather
+    # than bound variables, avoid allocation under MicroPython.
+    def _fuse_nomag(self, ax, ay, az, gx, gy, gz, deltat):
+        q = self.q
+        q1 = q[0]                           # short name local variable for readability
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        beta = self.beta
         # Auxiliary variables to avoid repeated arithmetic
         _2q1 = 2 * q1
         _2q2 = 2 * q2
@@ -74,15 +497,6 @@ class Fusion(object):
         q3q3 = q3 * q3
         q4q4 = q4 * q4
 
-        # Normalise accelerometer measurement
-        norm = sqrt(ax * ax + ay * ay + az * az)
-        if (norm == 0):
-            return # handle NaN
-        norm = 1 / norm        # use reciprocal for division
-        ax *= norm
-        ay *= norm
-        az *= norm
-
         # Gradient decent algorithm corrective step
         s1 = _4q1 * q3q3 + _2q3 * ax + _4q1 * q2q2 - _2q2 * ay
         s2 = _4q2 * q4q4 - _2q4 * ax + 4 * q1q1 * q2 - _2q1 * ay - _4q2 + _8q2 * q2q2 + _8q2 * q3q3 + _4q2 * az
@@ -95,29 +509,31 @@ class Fusion(object):
         s4 *= norm
 
         # Compute rate of change of quaternion
-        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - self.beta * s1
-        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - self.beta * s2
-        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - self.beta * s3
-        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
+        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - beta * s1
+        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - beta * s2
+        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - beta * s3
+        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - beta * s4
 
         # Integrate to yield quaternion
-        deltat = self.deltat(ts)
         q1 += qDot1 * deltat
         q2 += qDot2 * deltat
         q3 += qDot3 * deltat
         q4 += qDot4 * deltat
         norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
-        self.q = q1 * norm, q2 * norm, q3 * norm, q4 * norm
-        self.heading = 0
-        self.pitch = degrees(-asin(2.0 * (self.q[1] * self.q[3] - self.q[0] * self.q[2])))
-        self.roll = degrees(atan2(2.0 * (self.q[0] * self.q[1] + self.q[2] * self.q[3]),
-            self.q[0] * self.q[0] - self.q[1] * self.q[1] - self.q[2] * self.q[2] + self.q[3] * self.q[3]))
-
-    def update(self, accel, gyro, mag, ts=None):     # 3-tuples (x, y, z) for accel, gyro and mag data
-        mx, my, mz = (mag[x] - self.magbias[x] for x in range(3)) # Units irrelevant (normalised)
-        ax, ay, az = accel                  # Units irrelevant (normalised)
-        gx, gy, gz = (radians(x) for x in gyro)  # Units deg/s
-        q1, q2, q3, q4 = (self.q[x] for x in range(4))   # short name local variable for readability
+        q[0] = q1 * norm
+        q[1] = q2 * norm
+        q[2] = q3 * norm
+        q[3] = q4 * norm
+        self._ninedof = False
+        self._cached = 0
+
+    def _fuse(self, ax, ay, az, gx, gy, gz, mx, my, mz, deltat):
+        q = self.q
+        q1 = q[0]                           # short name local variable for readability
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        beta = self.beta
         # Auxiliary variables to avoid repeated arithmetic
         _2q1 = 2 * q1
         _2q2 = 2 * q2
@@ -136,24 +552,6 @@ class Fusion(object):
         q3q4 = q3 * q4
         q4q4 = q4 * q4
 
-        # Normalise accelerometer measurement
-        norm = sqrt(ax * ax + ay * ay + az * az)
-        if (norm == 0):
-            return # handle NaN
-        norm = 1 / norm                     # use reciprocal for division
-        ax *= norm
-        ay *= norm
-        az *= norm
-
-        # Normalise magnetometer measurement
-        norm = sqrt(mx * mx + my * my + mz * mz)
-        if (norm == 0):
-            return                          # handle NaN
-        norm = 1 / norm                     # use reciprocal for division
-        mx *= norm
-        my *= norm
-        mz *= norm
-
         # Reference direction of Earth's magnetic field
         _2q1mx = 2 * q1 * mx
         _2q1my = 2 * q1 * my
@@ -191,21 +589,178 @@ class Fusion(object):
         s4 *= norm
 
         # Compute rate of change of quaternion
-        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - self.beta * s1
-        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - self.beta * s2
-        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - self.beta * s3
-        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
+        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - beta * s1
+        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - beta * s2
+        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - beta * s3
+        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - beta * s4
 
         # Integrate to yield quaternion
-        deltat = self.deltat(ts)
         q1 += qDot1 * deltat
         q2 += qDot2 * deltat
         q3 += qDot3 * deltat
         q4 += qDot4 * deltat
         norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
-        self.q = q1 * norm, q2 * norm, q3 * norm, q4 * norm
-        self.heading = self.declination + degrees(atan2(2.0 * (self.q[1] * self.q[2] + self.q[0] * self.q[3]),
-            self.q[0] * self.q[0] + self.q[1] * self.q[1] - self.q[2] * self.q[2] - self.q[3] * self.q[3]))
-        self.pitch = degrees(-asin(2.0 * (self.q[1] * self.q[3] - self.q[0] * self.q[2])))
-        self.roll = degrees(atan2(2.0 * (self.q[0] * self.q[1] + self.q[2] * self.q[3]),
-            self.q[0] * self.q[0] - self.q[1] * self.q[1] - self.q[2] * self.q[2] + self.q[3] * self.q[3]))
+        q[0] = q1 * norm
+        q[1] = q2 * norm
+        q[2] = q3 * norm
+        q[3] = q4 * norm
+        self._ninedof = True
+        self._cached = 0
+
+    def _euler(self):  # Compute angles from quaternion
+        q = self.q
+        angles = self._angles
+        if self._ninedof:
+            angles[0] = self.declination + degrees(atan2(2.0 * (q[1] * q[2] + q[0] * q[3]),
+                q[0] * q[0] + q[1] * q[1] - q[2] * q[2] - q[3] * q[3]))
+        else:
+            angles[0] = 0  # Meaningless without a magnetometer
+        angles[1] = degrees(-asin(2.0 * (q[1] * q[3] - q[0] * q[2])))
+        angles[2] = degrees(atan2(2.0 * (q[0] * q[1] + q[2] * q[3]),
+            q[0] * q[0] - q[1] * q[1] - q[2] * q[2] + q[3] * q[3]))
+        self._cached |= _EULER
+
+# Set quaternion q to the attitude defined by a normalised accelerometer vector
+# and a normalised magnetometer (or other reference) vector. Returns False if
+# the vectors are parallel. The columns of the rotation matrix (see .rotation)
+# are the Earth axes in the sensor frame: z along gravity, x the horizontal
+# component of the field and y = z × x.
+def _attitude(q, ax, ay, az, mx, my, mz):
+    d = mx * ax + my * ay + mz * az
+    xx = mx - d * ax
+    xy = my - d * ay
+    xz = mz - d * az
+    norm = sqrt(xx * xx + xy * xy + xz * xz)
+    if norm < 1e-6:
+        return False
+    norm = 1 / norm
+    xx *= norm
+    xy *= norm
+    xz *= norm
+    yx = ay * xz - az * xy
+    yy = az * xx - ax * xz
+    yz = ax * xy - ay * xx
+    # Matrix rows are (xx, yx, ax), (xy, yy, ay), (xz, yz, az)
+    t = xx + yy + az
+    if t > 0:
+        s = 2 * sqrt(1 + t)
+        q[0] = s / 4
+        q[1] = (ay - yz) / s
+        q[2] = (xz - ax) / s
+        q[3] = (yx - xy) / s
+    elif xx >= yy and xx >= az:
+        s = 2 * sqrt(1 + xx - yy - az)
+        q[0] = (ay - yz) / s
+        q[1] = s / 4
+        q[2] = (yx + xy) / s
+        q[3] = (ax + xz) / s
+    elif yy >= az:
+        s = 2 * sqrt(1 + yy - xx - az)
+        q[0] = (xz - ax) / s
+        q[1] = (yx + xy) / s
+        q[2] = s / 4
+        q[3] = (ay + yz) / s
+    else:
+        s = 2 * sqrt(1 + az - xx - yy)
+        q[0] = (yx - xy) / s
+        q[1] = (ax + xz) / s
+        q[2] = (ay + yz) / s
+        q[3] = s / 4
+    return True
+
+# Combine a calibration stopfunc with the completion test of a fit.
+def _stopfunc(stopfunc, fit):
+    done = getattr(fit, 'done', None)
+    if done is None:
+        return stopfunc
+    if stopfunc is None:
+        return done
+    return lambda : stopfunc() or done()
+
+# Batch helpers. o is an optional orientate.Orientation and w an optional
+# correction matrix, both applied after bias subtraction.
+_np = False  # numpy module, None if unavailable, False if not yet imported
+
+def _numpy():
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
+
+def _angles(q, ninedof, declination):  # (heading, pitch, roll) as in _euler
+    q0, q1, q2, q3 = q
+    heading = declination + degrees(atan2(2.0 * (q1 * q2 + q0 * q3),
+        q0 * q0 + q1 * q1 - q2 * q2 - q3 * q3)) if ninedof else 0
+    return (heading, degrees(-asin(2.0 * (q1 * q3 - q0 * q2))),
+            degrees(atan2(2.0 * (q0 * q1 + q2 * q3), q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3)))
+
+def _np_angles(np, q, ninedof, declination):  # N x 3 array from N x 4 quaternions
+    q0 = q[:, 0]
+    q1 = q[:, 1]
+    q2 = q[:, 2]
+    q3 = q[:, 3]
+    res = np.empty((len(q), 3))
+    h = declination + np.degrees(np.arctan2(2.0 * (q1 * q2 + q0 * q3), q0 * q0 + q1 * q1 - q2 * q2 - q3 * q3))
+    res[:, 0] = np.where(ninedof, h, 0)
+    res[:, 1] = np.degrees(-np.arcsin(np.clip(2.0 * (q1 * q3 - q0 * q2), -1, 1)))
+    res[:, 2] = np.degrees(np.arctan2(2.0 * (q0 * q1 + q2 * q3), q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3))
+    return res
+
+# Returns an N x 3 array of unit vectors and a boolean array which is False
+# where the magnitude is zero.
+def _np_normalise(np, vecs, bias, o, w):
+    v = np.array(vecs, dtype=float).reshape(-1, 3)
+    if bias is not None:
+        v -= np.asarray(bias, dtype=float)
+    if w is not None:
+        v = v @ np.array([list(r) for r in w], dtype=float).T
+    if o is not None:
+        v = v[:, list(o.t)] * np.array(o.s)
+    norm = np.sqrt((v * v).sum(axis=1))
+    ok = norm != 0
+    v /= np.where(ok, norm, 1.0)[:, None]
+    return v, ok
+
+# Flat lists of unit vector components and of flags, False where the magnitude
+# is zero.
+def _normalise(vecs, bias=(0, 0, 0), o=None, w=None):
+    bx, by, bz = bias
+    res = []
+    ok = []
+    append = res.append
+    for v in vecs:
+        x, y, z = v
+        x -= bx
+        y -= by
+        z -= bz
+        if w is not None:
+            x, y, z = (r[0] * x + r[1] * y + r[2] * z for r in w)
+        if o is not None:
+            x, y, z = o.remap((x, y, z))
+        norm = sqrt(x * x + y * y + z * z)
+        if norm == 0:  # handle NaN
+            ok.append(False)
+        else:
+            norm = 1 / norm
+            x *= norm
+            y *= norm
+            z *= norm
+            ok.append(True)
+        append(x)
+        append(y)
+        append(z)
+    return res, ok
+
+def _radians(vecs, o=None):  # Convert gyro rates from deg/s. Returns a flat list.
+    res = []
+    append = res.append
+    for v in vecs:
+        x, y, z = v if o is None else o.remap(v)
+        append(x * _DEG2RAD)
+        append(y * _DEG2RAD)
+        append(z * _DEG2RAD)
+    return res
@@ -5,6 +5,7 @@
 
 # Requires:
 # uasyncio V3 (Included in daily builds and release builds later than V1.12).
+# From this repo: fusion.py deltat.py
 # Uses the uasyncio library to enable updating to run as a background coroutine.
 
 # Supports 6 and 9 degrees of freedom sensors. Tested with InvenSense MPU-9150 9DOF sensor.
@@ -13,222 +14,267 @@
 # Ported to Python. Integrator timing adapted for pyboard.
 # See README.md for documentation.
 
+# V0.18 start() processes the data read to determine the sensor type.
+# V0.17 Engine variants moved to fusion_async_engines.py and fusion_async_fixed.py
+# so that they are only loaded if used.
+# V0.16 Fixed point kernel for platforms without hardware floating point.
+# V0.15 Multi-rate sensors: samples may lack a fresh mag reading.
+# V0.14 Mahony and complementary engines.
+# V0.13 Optional fixed rate operation.
+# V0.12 Optional ellipsoid magnetometer calibration, optionally ending
+# automatically on sufficient coverage.
+# V0.11 read_coro may return a batch of samples. Optional ring buffer.
+# V0.10 Calculations shared with fusion.py: state is updated in place.
 # V0.9 Time calculations devolved to deltat.py
 
 try:
     import uasyncio as asyncio
 except ImportError:
     import asyncio
-from math import sqrt, atan2, asin, degrees, radians
-from deltat import DeltaT
+try:
+    import utime as time
+except ImportError:
+    import time
+import fusion
+
+# Time source for fixed rate operation. Under MicroPython this is ticks_us();
+# elsewhere a monotonic clock without rollover.
+class Clock:
+    if hasattr(time, 'ticks_us'):
+        ticks_us = staticmethod(time.ticks_us)
+        ticks_diff = staticmethod(time.ticks_diff)
+        ticks_add = staticmethod(time.ticks_add)
+    else:
+        ticks_us = staticmethod(lambda : int(time.perf_counter() * 1000000))
+        ticks_diff = staticmethod(lambda end, start : end - start)
+        ticks_add = staticmethod(lambda ticks, delta : ticks + delta)
+
+    async def sleep_us(self, us):
+        await asyncio.sleep(us / 1000000)
+
+# Simulated clock for testing fixed rate operation on any platform. Time
+# advances only when the update task sleeps or when advance() is called, e.g.
+# by a read_coro emulating a slow device. Suitable for tests where only the
+# update task sleeps.
+class SimClock(Clock):
+    def __init__(self):
+        self.t = 0
+
+    def ticks_us(self):
+        return self.t
+
+    def advance(self, us):
+        self.t += us
+
+    async def sleep_us(self, us):
+        self.t += us
+        await asyncio.sleep(0)
 
-class Fusion(object):
+# read_coro may return a single sample or a batch (list) of samples e.g. the
+# contents of a hardware FIFO.
+def _is_batch(data):
+    return not data or not isinstance(data[0][0], (int, float))
+
+class _Ring:  # Bounded FIFO of samples. When full the oldest is discarded.
+    def __init__(self, size):
+        self.buf = [None] * size
+        self.size = size
+        self.head = 0  # Next write
+        self.tail = 0  # Next read
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def put(self, x):  # Return False if a sample was discarded
+        self.buf[self.head] = x
+        self.head = (self.head + 1) % self.size
+        if self.n == self.size:
+            self.tail = self.head
+            return False
+        self.n += 1
+        return True
+
+    def get(self):
+        x = self.buf[self.tail]
+        self.buf[self.tail] = None
+        self.tail = (self.tail + 1) % self.size
+        self.n -= 1
+        return x
+
+class Fusion(fusion.Fusion):
     '''
     Class provides sensor fusion allowing heading, pitch and roll to be extracted. This uses the Madgwick algorithm.
     The update method runs as a coroutine. Its calculations take 1.6mS on the Pyboard.
     '''
-    declination = 0                         # Optional offset for true north. A +ve value adds to heading
     def __init__(self, read_coro, timediff=None):
+        super().__init__(timediff)
         self.read_coro = read_coro
-        self.magbias = (0, 0, 0)            # local magnetic bias factors: set from calibration
-        self.expect_ts = timediff is not None
-        self.deltat = DeltaT(timediff)      # Time between updates
-        self.q = [1.0, 0.0, 0.0, 0.0]       # vector to hold quaternion
-        GyroMeasError = radians(40)         # Original code indicates this leads to a 2 sec response time
-        self.beta = sqrt(3.0 / 4.0) * GyroMeasError  # compute beta (see README)
-        self.pitch = 0
-        self.heading = 0
-        self.roll = 0
-
-    async def calibrate(self, stopfunc):
-        res = await self.read_coro()
-        mag = res[2]
-        magmax = list(mag)                  # Initialise max and min lists with current values
-        magmin = magmax[:]
-        while not stopfunc():
-            res = await self.read_coro()
-            magxyz = res[2]
-            for x in range(3):
-                magmax[x] = max(magmax[x], magxyz[x])
-                magmin[x] = min(magmin[x], magxyz[x])
-        self.magbias = tuple(map(lambda a, b: (a +b)/2, magmin, magmax))
-
-    async def start(self, slow_platform=False):
-        data = await self.read_coro()
-        if len(data) == 2 or (self.expect_ts and len(data) == 3):
-            asyncio.create_task(self._update_nomag(slow_platform))
-        else:
-            asyncio.create_task(self._update_mag(slow_platform))
+        self.expect_ts = self.deltat.expect_ts
+        self.nomag = False
+        self.overruns = 0                   # Number of times the ring buffer overflowed
+        self.dropped = 0                    # Number of samples discarded
+        self.late = 0                       # Fixed rate: number of deadlines missed
+        self.clock = Clock()
+        self._period = 0
+        self._flag = None
+        self._deadline = 0
+
+    # fit is as for fusion.Fusion.calibrate.
+    async def calibrate(self, stopfunc, fit=None):
+        magmax = None
+        if fit is not None:
+            fit.reset()
+        stopfunc = fusion._stopfunc(stopfunc, fit)
+        mts = None
+        while magmax is None or not stopfunc():
+            data = await self.read_coro()
+            for sample in (data if _is_batch(data) else (data,)):
+                magxyz = sample[2]
+                if magxyz is None:  # Multi-rate: no mag reading
+                    continue
+                if len(sample) == 5:  # Ignore stale readings
+                    if sample[4] == mts:
+                        continue
+                    mts = sample[4]
+                if magmax is None:
+                    magmax = list(magxyz)   # Initialise max and min lists with current values
+                    magmin = magmax[:]
+                for x in range(3):
+                    magmax[x] = max(magmax[x], magxyz[x])
+                    magmin[x] = min(magmin[x], magxyz[x])
+                if fit is not None:
+                    fit.add(magxyz)
+        return self._calibrated(magmin, magmax, fit)
 
-    async def _update_nomag(self, slow_platform):
+    # If bufsize > 0 samples are acquired by a separate task and queued in a
+    # ring buffer holding up to bufsize samples. The update task processes all
+    # queued samples each time it runs.
+    # If rate (Hz) > 0 read_coro is called at that rate. flag, if supplied, is
+    # a ThreadSafeFlag set by a timer: each read waits on it.
+    # The first data read determines the type of sensor. It is then processed
+    # as normal.
+    async def start(self, slow_platform=False, bufsize=0, rate=0, flag=None):
         while True:
+            first = await self.read_coro()
+            if not _is_batch(first):
+                data = first
+                first = (first,)
+                break
+            if first:
+                data = first[0]
+                break
+        self.nomag = len(data) == 2 or (self.expect_ts and len(data) == 3)
+        if rate:
+            self._period = int(1000000 / rate)  # μs
+            self._flag = flag
+            self._deadline = self.clock.ticks_us()
+            if flag is None:
+                self._deadline = self.clock.ticks_add(self._deadline, self._period)
+        if bufsize:
+            ring = _Ring(bufsize)
+            lost = 0
+            for sample in first:
+                if not ring.put(sample):
+                    lost += 1
+            if lost:
+                self.overruns += 1
+                self.dropped += lost
+            ready = asyncio.Event()
+            ready.set()
+            asyncio.create_task(self._acquire(ring, ready))
+            asyncio.create_task(self._update_ring(ring, ready, slow_platform))
+        else:
+            for sample in first:
+                self._sample(sample)
+            asyncio.create_task(self._update(slow_platform))
+
+    # Process one sample. A sample with a zero accel or mag vector is ignored
+    # by the update methods. With a 9DOF sensor mag may be None, and a sample
+    # with a timestamp may be followed by the timestamp of the mag reading:
+    # see fusion.Fusion.update.
+    def _sample(self, data):
+        if self.nomag:
             if self.expect_ts:
-                accel, gyro, ts = await self.read_coro()
+                accel, gyro, ts = data
             else:
-                accel, gyro = await self.read_coro()
+                accel, gyro = data
                 ts = None
-            ax, ay, az = accel                  # Units G (but later normalised)
-            gx, gy, gz = (radians(x) for x in gyro) # Units deg/s
-            q1, q2, q3, q4 = (self.q[x] for x in range(4))   # short name local variable for readability
-            # Auxiliary variables to avoid repeated arithmetic
-            _2q1 = 2 * q1
-            _2q2 = 2 * q2
-            _2q3 = 2 * q3
-            _2q4 = 2 * q4
-            _4q1 = 4 * q1
-            _4q2 = 4 * q2
-            _4q3 = 4 * q3
-            _8q2 = 8 * q2
-            _8q3 = 8 * q3
-            q1q1 = q1 * q1
-            q2q2 = q2 * q2
-            q3q3 = q3 * q3
-            q4q4 = q4 * q4
-
-            # Normalise accelerometer measurement
-            norm = sqrt(ax * ax + ay * ay + az * az)
-            if (norm == 0):
-                return # handle NaN
-            norm = 1 / norm        # use reciprocal for division
-            ax *= norm
-            ay *= norm
-            az *= norm
-
-            # Gradient decent algorithm corrective step
-            s1 = _4q1 * q3q3 + _2q3 * ax + _4q1 * q2q2 - _2q2 * ay
-            s2 = _4q2 * q4q4 - _2q4 * ax + 4 * q1q1 * q2 - _2q1 * ay - _4q2 + _8q2 * q2q2 + _8q2 * q3q3 + _4q2 * az
-            s3 = 4 * q1q1 * q3 + _2q1 * ax + _4q3 * q4q4 - _2q4 * ay - _4q3 + _8q3 * q2q2 + _8q3 * q3q3 + _4q3 * az
-            s4 = 4 * q2q2 * q4 - _2q2 * ax + 4 * q3q3 * q4 - _2q3 * ay
-            norm = 1 / sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4)    # normalise step magnitude
-            s1 *= norm
-            s2 *= norm
-            s3 *= norm
-            s4 *= norm
-
-            # Compute rate of change of quaternion
-            qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - self.beta * s1
-            qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - self.beta * s2
-            qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - self.beta * s3
-            qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
-
-            if slow_platform:
-                await asyncio.sleep_ms(0)
-
-            # Integrate to yield quaternion
-            deltat = self.deltat(ts)
-            q1 += qDot1 * deltat
-            q2 += qDot2 * deltat
-            q3 += qDot3 * deltat
-            q4 += qDot4 * deltat
-            norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
-            self.q = q1 * norm, q2 * norm, q3 * norm, q4 * norm
-            self.heading = 0  # Meaningless without a magnetometer
-            self.pitch = degrees(-asin(2.0 * (self.q[1] * self.q[3] - self.q[0] * self.q[2])))
-            self.roll = degrees(atan2(2.0 * (self.q[0] * self.q[1] + self.q[2] * self.q[3]),
-                self.q[0] * self.q[0] - self.q[1] * self.q[1] - self.q[2] * self.q[2] + self.q[3] * self.q[3]))
-
-    async def _update_mag(self, slow_platform):
-        while True:
+            self.update_nomag(accel, gyro, ts)
+        else:
+            mts = None
             if self.expect_ts:
-                accel, gyro, mag, ts = await self.read_coro()
+                if len(data) == 5:
+                    accel, gyro, mag, ts, mts = data
+                else:
+                    accel, gyro, mag, ts = data
             else:
-                accel, gyro, mag = await self.read_coro()
+                accel, gyro, mag = data
                 ts = None
-            mx, my, mz = (mag[x] - self.magbias[x] for x in range(3)) # Units irrelevant (normalised)
-            ax, ay, az = accel                  # Units irrelevant (normalised)
-            gx, gy, gz = (radians(x) for x in gyro)  # Units deg/s
-            q1, q2, q3, q4 = (self.q[x] for x in range(4))   # short name local variable for readability
-            # Auxiliary variables to avoid repeated arithmetic
-            _2q1 = 2 * q1
-            _2q2 = 2 * q2
-            _2q3 = 2 * q3
-            _2q4 = 2 * q4
-            _2q1q3 = 2 * q1 * q3
-            _2q3q4 = 2 * q3 * q4
-            q1q1 = q1 * q1
-            q1q2 = q1 * q2
-            q1q3 = q1 * q3
-            q1q4 = q1 * q4
-            q2q2 = q2 * q2
-            q2q3 = q2 * q3
-            q2q4 = q2 * q4
-            q3q3 = q3 * q3
-            q3q4 = q3 * q4
-            q4q4 = q4 * q4
-
-            # Normalise accelerometer measurement
-            norm = sqrt(ax * ax + ay * ay + az * az)
-            if (norm == 0):
-                return # handle NaN
-            norm = 1 / norm                     # use reciprocal for division
-            ax *= norm
-            ay *= norm
-            az *= norm
-
-            # Normalise magnetometer measurement
-            norm = sqrt(mx * mx + my * my + mz * mz)
-            if (norm == 0):
-                return                          # handle NaN
-            norm = 1 / norm                     # use reciprocal for division
-            mx *= norm
-            my *= norm
-            mz *= norm
-
-            # Reference direction of Earth's magnetic field
-            _2q1mx = 2 * q1 * mx
-            _2q1my = 2 * q1 * my
-            _2q1mz = 2 * q1 * mz
-            _2q2mx = 2 * q2 * mx
-            hx = mx * q1q1 - _2q1my * q4 + _2q1mz * q3 + mx * q2q2 + _2q2 * my * q3 + _2q2 * mz * q4 - mx * q3q3 - mx * q4q4
-            hy = _2q1mx * q4 + my * q1q1 - _2q1mz * q2 + _2q2mx * q3 - my * q2q2 + my * q3q3 + _2q3 * mz * q4 - my * q4q4
-            _2bx = sqrt(hx * hx + hy * hy)
-            _2bz = -_2q1mx * q3 + _2q1my * q2 + mz * q1q1 + _2q2mx * q4 - mz * q2q2 + _2q3 * my * q4 - mz * q3q3 + mz * q4q4
-            _4bx = 2 * _2bx
-            _4bz = 2 * _2bz
-
-            # Gradient descent algorithm corrective step
-            s1 = (-_2q3 * (2 * q2q4 - _2q1q3 - ax) + _2q2 * (2 * q1q2 + _2q3q4 - ay) - _2bz * q3 * (_2bx * (0.5 - q3q3 - q4q4)
-                + _2bz * (q2q4 - q1q3) - mx) + (-_2bx * q4 + _2bz * q2) * (_2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my)
-                + _2bx * q3 * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
-
-            s2 = (_2q4 * (2 * q2q4 - _2q1q3 - ax) + _2q1 * (2 * q1q2 + _2q3q4 - ay) - 4 * q2 * (1 - 2 * q2q2 - 2 * q3q3 - az)
-                + _2bz * q4 * (_2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx) + (_2bx * q3 + _2bz * q1) * (_2bx * (q2q3 - q1q4)
-                + _2bz * (q1q2 + q3q4) - my) + (_2bx * q4 - _4bz * q2) * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
+            self.update(accel, gyro, mag, ts, mts)
+
+    # Fixed rate operation. Deadlines are at multiples of the period from the
+    # start so that timing errors do not accumulate. A deadline which has
+    # passed when a wait begins is late. If more than a period has passed the
+    # schedule restarts from the current time and the deadlines skipped are
+    # also counted as late. When waiting on a flag lateness is inferred from
+    # the interval between successive wakeups.
+    async def _pace(self):
+        clock = self.clock
+        period = self._period
+        if self._flag is not None:
+            await self._flag.wait()
+            now = clock.ticks_us()
+            d = clock.ticks_diff(now, self._deadline)  # Time since last wakeup
+            if d > period + period // 2:
+                self.late += (d + period // 2) // period - 1
+            self._deadline = now
+            return
+        wait = clock.ticks_diff(self._deadline, clock.ticks_us())
+        if wait > 0:
+            await clock.sleep_us(wait)
+        else:
+            self.late += 1
+            if wait <= -period:
+                self.late += -wait // period
+                self._deadline = clock.ticks_us()
+        self._deadline = clock.ticks_add(self._deadline, period)
 
+    async def _update(self, slow_platform):
+        while True:
+            if self._period:
+                await self._pace()
+            data = await self.read_coro()
+            if _is_batch(data):
+                for sample in data:
+                    self._sample(sample)
+            else:
+                self._sample(data)
+            if slow_platform:
+                await asyncio.sleep(0)
+
+    async def _acquire(self, ring, ready):
+        while True:
+            if self._period:
+                await self._pace()
+            data = await self.read_coro()
+            lost = 0
+            if _is_batch(data):
+                for sample in data:
+                    if not ring.put(sample):
+                        lost += 1
+            elif not ring.put(data):
+                lost = 1
+            if lost:
+                self.overruns += 1
+                self.dropped += lost
+            ready.set()
+
+    async def _update_ring(self, ring, ready, slow_platform):
+        while True:
+            await ready.wait()
+            ready.clear()
+            while len(ring):
+                self._sample(ring.get())
             if slow_platform:
-                await asyncio.sleep_ms(0)
-
-            s3 = (-_2q1 * (2 * q2q4 - _2q1q3 - ax) + _2q4 * (2 * q1q2 + _2q3q4 - ay) - 4 * q3 * (1 - 2 * q2q2 - 2 * q3q3 - az)
-                + (-_4bx * q3 - _2bz * q1) * (_2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx)
-                + (_2bx * q2 + _2bz * q4) * (_2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my)
-                + (_2bx * q1 - _4bz * q3) * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
-
-            s4 = (_2q2 * (2 * q2q4 - _2q1q3 - ax) + _2q3 * (2 * q1q2 + _2q3q4 - ay) + (-_4bx * q4 + _2bz * q2) * (_2bx * (0.5 - q3q3 - q4q4)
-                + _2bz * (q2q4 - q1q3) - mx) + (-_2bx * q1 + _2bz * q3) * (_2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my)
-                + _2bx * q2 * (_2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz))
-
-            norm = 1 / sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4)    # normalise step magnitude
-            s1 *= norm
-            s2 *= norm
-            s3 *= norm
-            s4 *= norm
-
-            # Compute rate of change of quaternion
-            qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - self.beta * s1
-            qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - self.beta * s2
-            qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - self.beta * s3
-            qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
-
-            # Integrate to yield quaternion
-            deltat = self.deltat(ts)
-            q1 += qDot1 * deltat
-            q2 += qDot2 * deltat
-            q3 += qDot3 * deltat
-            q4 += qDot4 * deltat
-            norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
-            self.q = q1 * norm, q2 * norm, q3 * norm, q4 * norm
-            self.heading = self.declination + degrees(atan2(2.0 * (self.q[1] * self.q[2] + self.q[0] * self.q[3]),
-                self.q[0] * self.q[0] + self.q[1] * self.q[1] - self.q[2] * self.q[2] - self.q[3] * self.q[3]))
-            self.pitch = degrees(-asin(2.0 * (self.q[1] * self.q[3] - self.q[0] * self.q[2])))
-            self.roll = degrees(atan2(2.0 * (self.q[0] * self.q[1] + self.q[2] * self.q[3]),
-                self.q[0] * self.q[0] - self.q[1] * self.q[1] - self.q[2] * self.q[2] + self.q[3] * self.q[3]))
+                await asyncio.sleep(0)
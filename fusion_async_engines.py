@@ -0,0 +1,17 @@
+# fusion_async_engines.py Asynchronous versions of the alternative engines.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# The Mahony and complementary filters of fusion_engines.py with the interface
+# of fusion_async.Fusion. Held in a separate module so that users of
+# fusion_async do not pay the RAM cost of engines they do not use.
+# Requires fusion_async.py, fusion_engines.py, fusion.py and deltat.py.
+
+from fusion_async import Fusion
+from fusion_engines import MahonyEngine, ComplementaryEngine
+
+class Mahony(MahonyEngine, Fusion):  # See fusion_engines.py
+    pass
+
+class Complementary(ComplementaryEngine, Fusion):
+    pass
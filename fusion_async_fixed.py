@@ -0,0 +1,13 @@
+# fusion_async_fixed.py Asynchronous version of the fixed point kernel.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# FixedFusion of fusion_fixed.py with the interface of fusion_async.Fusion.
+# read_coro must return integer readings.
+# Requires fusion_async.py, fusion_fixed.py, fusion.py and deltat.py.
+
+from fusion_async import Fusion
+from fusion_fixed import FixedEngine
+
+class FixedFusion(FixedEngine, Fusion):  # See fusion_fixed.py
+    pass
@@ -0,0 +1,238 @@
+# fusion_engines.py Lower cost alternatives to the Madgwick filter.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Mahony and Complementary have the interface of fusion.Fusion. Only the
+# kernels differ: normalisation, calibration, orientation, batch updates, fast
+# start and statistics are inherited. In each engine beta is the gain applied
+# to the correction from the accelerometer (and magnetometer). The engines are
+# also available as mixins for use with fusion_async.Fusion: see
+# fusion_async_engines.py.
+# Mahony source https://x-io.co.uk/open-source-imu-and-ahrs-algorithms/
+
+from array import array
+from math import sqrt
+import fusion
+from fusion import _FLOAT, _attitude
+
+# Mahony nonlinear complementary (PI) filter. The error between the measured
+# and estimated directions of gravity (and the magnetic field) is fed back to
+# the gyro rates. beta is the proportional gain (Mahony's 2Kp) and ki the
+# integral gain (2Ki) which estimates gyro bias. By default ki is zero and
+# there is no integral action.
+class MahonyEngine:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.beta = 1.0
+        self.ki = 0.0
+        self.integral = array(_FLOAT, (0, 0, 0))  # Integral feedback (rad/s)
+
+    def _feedback(self, ex, ey, ez, gx, gy, gz, deltat):  # ex, ey, ez are half the error
+        ki = self.ki
+        i = self.integral
+        if ki > 0:
+            i[0] += ki * ex * deltat
+            i[1] += ki * ey * deltat
+            i[2] += ki * ez * deltat
+        else:
+            i[0] = 0
+            i[1] = 0
+            i[2] = 0
+        beta = self.beta
+        gx += beta * ex + i[0]
+        gy += beta * ey + i[1]
+        gz += beta * ez + i[2]
+        # Integrate rate of change of quaternion
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        deltat *= 0.5
+        gx *= deltat
+        gy *= deltat
+        gz *= deltat
+        a = q1
+        b = q2
+        c = q3
+        q1 += -b * gx - c * gy - q4 * gz
+        q2 += a * gx + c * gz - q4 * gy
+        q3 += a * gy - b * gz + q4 * gx
+        q4 += a * gz + b * gy - c * gx
+        norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
+        q[0] = q1 * norm
+        q[1] = q2 * norm
+        q[2] = q3 * norm
+        q[3] = q4 * norm
+        self._cached = 0
+
+    def _fuse_nomag(self, ax, ay, az, gx, gy, gz, deltat):
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        # Estimated direction of gravity: half the third column of .rotation
+        vx = q2 * q4 - q1 * q3
+        vy = q1 * q2 + q3 * q4
+        vz = q1 * q1 - 0.5 + q4 * q4
+        # Error is the cross product of measured and estimated directions
+        self._feedback(ay * vz - az * vy, az * vx - ax * vz, ax * vy - ay * vx, gx, gy, gz, deltat)
+        self._ninedof = False
+
+    def _fuse(self, ax, ay, az, gx, gy, gz, mx, my, mz, deltat):
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        # Auxiliary variables to avoid repeated arithmetic
+        q1q1 = q1 * q1
+        q1q2 = q1 * q2
+        q1q3 = q1 * q3
+        q1q4 = q1 * q4
+        q2q2 = q2 * q2
+        q2q3 = q2 * q3
+        q2q4 = q2 * q4
+        q3q3 = q3 * q3
+        q3q4 = q3 * q4
+        q4q4 = q4 * q4
+
+        # Reference direction of Earth's magnetic field
+        hx = 2 * (mx * (0.5 - q3q3 - q4q4) + my * (q2q3 - q1q4) + mz * (q2q4 + q1q3))
+        hy = 2 * (mx * (q2q3 + q1q4) + my * (0.5 - q2q2 - q4q4) + mz * (q3q4 - q1q2))
+        bx = sqrt(hx * hx + hy * hy)
+        bz = 2 * (mx * (q2q4 - q1q3) + my * (q3q4 + q1q2) + mz * (0.5 - q2q2 - q3q3))
+
+        # Estimated directions of gravity and magnetic field (halved)
+        vx = q2q4 - q1q3
+        vy = q1q2 + q3q4
+        vz = q1q1 - 0.5 + q4q4
+        wx = bx * (0.5 - q3q3 - q4q4) + bz * (q2q4 - q1q3)
+        wy = bx * (q2q3 - q1q4) + bz * (q1q2 + q3q4)
+        wz = bx * (q1q3 + q2q4) + bz * (0.5 - q2q2 - q3q3)
+
+        # Error is the sum of cross products of measured and estimated directions
+        ex = (ay * vz - az * vy) + (my * wz - mz * wy)
+        ey = (az * vx - ax * vz) + (mz * wx - mx * wz)
+        ez = (ax * vy - ay * vx) + (mx * wy - my * wx)
+        self._feedback(ex, ey, ez, gx, gy, gz, deltat)
+        self._ninedof = True
+
+# First order complementary filter. The gyro rates are integrated, then the
+# result is interpolated towards the attitude measured from the sample by
+# beta * deltat, so that 1/beta is the time constant (s) of the correction. In
+# 6DOF mode only the tilt is corrected, by a rotation about the horizontal.
+class ComplementaryEngine:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.beta = 0.5
+        self._qc = array(_FLOAT, (1, 0, 0, 0))  # Measured attitude
+
+    def _blend(self, ax, ay, az, mx, my, mz, deltat):
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        qc = self._qc
+        if _attitude(qc, ax, ay, az, mx, my, mz):
+            k = self.beta * deltat
+            if k > 1:
+                k = 1
+            if q1 * qc[0] + q2 * qc[1] + q3 * qc[2] + q4 * qc[3] < 0:
+                k = -k  # Shortest path
+            j = 1 - abs(k)
+            q1 = j * q1 + k * qc[0]
+            q2 = j * q2 + k * qc[1]
+            q3 = j * q3 + k * qc[2]
+            q4 = j * q4 + k * qc[3]
+        norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
+        q[0] = q1 * norm
+        q[1] = q2 * norm
+        q[2] = q3 * norm
+        q[3] = q4 * norm
+        self._cached = 0
+
+    def _integrate(self, gx, gy, gz, deltat):  # Quaternion is not normalised
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        deltat *= 0.5
+        gx *= deltat
+        gy *= deltat
+        gz *= deltat
+        q[0] = q1 - q2 * gx - q3 * gy - q4 * gz
+        q[1] = q2 + q1 * gx + q3 * gz - q4 * gy
+        q[2] = q3 + q1 * gy - q2 * gz + q4 * gx
+        q[3] = q4 + q1 * gz + q2 * gy - q3 * gx
+
+    # The tilt correction is the shortest rotation r taking the measured
+    # gravity vector a to the estimated one v, both in the sensor frame. The
+    # gyro step and a fraction k of r are applied to q: q = q * nlerp(1, r, k).
+    def _fuse_nomag(self, ax, ay, az, gx, gy, gz, deltat):
+        q = self.q
+        q1 = q[0]
+        q2 = q[1]
+        q3 = q[2]
+        q4 = q[3]
+        h = 0.5 * deltat
+        gx *= h
+        gy *= h
+        gz *= h
+        p1 = q1 - q2 * gx - q3 * gy - q4 * gz
+        p2 = q2 + q1 * gx + q3 * gz - q4 * gy
+        p3 = q3 + q1 * gy - q2 * gz + q4 * gx
+        p4 = q4 + q1 * gz + q2 * gy - q3 * gx
+        # Estimated direction of gravity (third row of .rotation)
+        s = 1 / (p1 * p1 + p2 * p2 + p3 * p3 + p4 * p4)
+        vx = 2.0 * (p2 * p4 - p1 * p3) * s
+        vy = 2.0 * (p1 * p2 + p3 * p4) * s
+        vz = (p1 * p1 - p2 * p2 - p3 * p3 + p4 * p4) * s
+        d = 1 + ax * vx + ay * vy + az * vz  # r is (d, a x v) / sqrt(2d)
+        if d > 1e-6:
+            k = self.beta * deltat
+            if k > 1:
+                k = 1
+            j = (1 - k) * sqrt(2 * d)
+            r1 = j + k * d
+            r2 = k * (ay * vz - az * vy)
+            r3 = k * (az * vx - ax * vz)
+            r4 = k * (ax * vy - ay * vx)
+            q1 = p1 * r1 - p2 * r2 - p3 * r3 - p4 * r4
+            q2 = p1 * r2 + p2 * r1 + p3 * r4 - p4 * r3
+            q3 = p1 * r3 - p2 * r4 + p3 * r1 + p4 * r2
+            q4 = p1 * r4 + p2 * r3 - p3 * r2 + p4 * r1
+        else:  # Measured and estimated gravity are opposed
+            q1 = p1
+            q2 = p2
+            q3 = p3
+            q4 = p4
+        norm = 1 / sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
+        q[0] = q1 * norm
+        q[1] = q2 * norm
+        q[2] = q3 * norm
+        q[3] = q4 * norm
+        self._cached = 0
+        self._ninedof = False
+
+    def _fuse(self, ax, ay, az, gx, gy, gz, mx, my, mz, deltat):
+        self._integrate(gx, gy, gz, deltat)
+        self._blend(ax, ay, az, mx, my, mz, deltat)
+        self._ninedof = True
+
+class Mahony(MahonyEngine, fusion.Fusion):
+    '''
+    Class provides sensor fusion allowing heading, pitch and roll to be extracted. This uses the Mahony algorithm.
+    The update method must be called peiodically.
+    '''
+    pass
+
+class Complementary(ComplementaryEngine, fusion.Fusion):
+    '''
+    Class provides sensor fusion allowing heading, pitch and roll to be extracted. This uses a complementary filter.
+    The update method must be called peiodically.
+    '''
+    pass
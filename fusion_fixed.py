@@ -0,0 +1,429 @@
+# fusion_fixed.py Fixed point sensor fusion for platforms without hardware floating point.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# FixedFusion has the interface of fusion.Fusion but update and update_nomag
+# run the Madgwick algorithm in integer arithmetic. Values are held as scaled
+# integers small enough to be MicroPython small ints (31 bits), which are not
+# allocated on the heap. Sensor readings must be integers, for example raw
+# register values. Accelerometer and magnetometer units are irrelevant. The
+# gyro scale (deg/s per count) is passed to the constructor.
+# Formats: unit vectors and quaternion operands are Q14 (1.0 == 16384). The
+# quaternion is held in Q24 so that small increments are not lost. Angles
+# turned per sample are Q18 radians, intervals Q19 seconds. Vectors are
+# normalised by scaling to 12-13 significant bits then multiplying by an
+# inverse square root found from a table and two Newton iterations. After
+# each update the quaternion is renormalised by a second order expansion of
+# 1 / sqrt(|q|^2) about 1, which needs no square root.
+# Limits: the rotation between samples must be below 0.5 rad and beta * dt
+# below 1. Larger values are computed correctly but may allocate. Intervals
+# longer than 0.1s, for example after a pause in sampling, are treated as 0.1s
+# and negative intervals as zero.
+# Floating point is used only to convert results: heading, pitch, roll, q,
+# quaternion and rotation are computed on demand from the integer quaternion.
+# Also when beta, magbias or magcorr are assigned (a new object is detected
+# and converted), and with a timediff function other than deltat.TimeDiff.
+# Fast start (initialise) and magnetometer bias tracking (magtrack) run the
+# float code: on each sample until fast start completes, and on each mag
+# reading while a tracker is attached. Neither is allocation free.
+# Not supported: in place modification of q or magbias.
+
+try:
+    import utime as time
+except ImportError:
+    import time
+from array import array
+from math import pi
+import fusion
+from fusion import SKIP_ACCEL, SKIP_MAG, _INIT
+from deltat import TimeDiff, ticks_diff
+
+_Q = 24  # Quaternion state
+_ONE = 1 << 14
+_HALF = 1 << 13
+_MAXDT = 100000  # μs: longer intervals (e.g. after a pause) are truncated
+# Initial estimates of 1/sqrt(x) (Q13) indexed by x (Q14) >> 10, x in [0.25, 1)
+_RSQRT = (0, 0, 0, 0, 15447, 13972, 12853, 11965, 11239, 10631, 10112, 9663, 9268, 8918, 8605, 8323)
+
+# Place the Q14 unit vector in the direction of (x, y, z, w) in v. Returns
+# False if all are zero.
+def _unit(v, x, y, z, w):
+    m = max(abs(x), abs(y), abs(z), abs(w))
+    if not m:
+        return False
+    sh = 0  # Scale so that the largest component is in [2**12, 2**13)
+    while m >= 8192:
+        m >>= 1
+        sh += 1
+    while m < 4096:
+        m <<= 1
+        sh -= 1
+    if sh > 0:
+        x >>= sh
+        y >>= sh
+        z >>= sh
+        w >>= sh
+    elif sh < 0:
+        sh = -sh
+        x <<= sh
+        y <<= sh
+        z <<= sh
+        w <<= sh
+    n = x * x + y * y + z * z + w * w  # In [2**24, 2**28)
+    s = 12
+    if n >= 67108864:
+        n >>= 2
+        s = 13
+    t = n >> 12  # n / 2**26 in Q14: in [0.25, 1)
+    r = _RSQRT[t >> 10]  # 1/sqrt in Q13. Newton: r *= (3 - t * r * r) / 2
+    r = r * (24576 - (t * (r * r >> 13) >> 14)) >> 14
+    r = r * (24576 - (t * (r * r >> 13) >> 14)) >> 14
+    h = 1 << (s - 1)  # Round
+    v[0] = (x * r + h) >> s
+    v[1] = (y * r + h) >> s
+    v[2] = (z * r + h) >> s
+    v[3] = (w * r + h) >> s
+    return True
+
+# Mixin: see FixedFusion below and fusion_async_fixed.py. gscale is the
+# gyro scale in deg/s per count.
+class FixedEngine:
+    def __init__(self, *args, gscale=1.0, **kwargs):
+        super().__init__(*args, **kwargs)  # Assigns q, creating _q and _qi
+        self._stale = False  # _q needs updating from _qi
+        self._v = array('i', (0, 0, 0, 0))  # Unit vectors
+        self._a = array('i', (0, 0, 0))  # Unit accel
+        self._s = array('i', (0, 0, 0, 0))  # Unit gradient step
+        self._bias = array('i', (0, 0, 0))
+        self._corr = None  # Soft iron correction: 3 rows, Q14
+        self._src = [None, None, None, None]  # Objects converted: beta, magbias, magcorr, orientation
+        self._signs = None  # Orientation signs as integers
+        self._ibeta = 0  # Q14
+        # Gyro counts to rad/s in Q12: g * _gk >> _gs
+        k = gscale * pi / 180 * 4096
+        gs = 0
+        while k * (1 << gs) < 16384:
+            gs += 1
+        self._gk = int(k * (1 << gs) + 0.5)
+        self._gs = gs
+        d = self.deltat
+        self._fixed = int(d.fixed * 1000000 + 0.5)  # μs
+        self._ticks = d.timediff is TimeDiff
+
+    # The float quaternion is derived from the integer state on demand.
+    # Assigning q sets the state.
+    @property
+    def q(self):
+        if self._stale:
+            qi = self._qi
+            q = self._q
+            q[0] = qi[0] / 16777216
+            q[1] = qi[1] / 16777216
+            q[2] = qi[2] / 16777216
+            q[3] = qi[3] / 16777216
+            self._stale = False
+        return self._q
+
+    @q.setter
+    def q(self, v):
+        self._q = array(fusion._FLOAT, v)
+        self._qi = array('i', (int(x * (1 << _Q)) for x in v))
+        self._stale = False
+
+    # Fast start (see fusion.Fusion.initialise) runs the float code on the Q14
+    # unit vectors. dt is in μs. Once the attitude is set the integer state
+    # is updated from it; beta changes are picked up by _convert.
+    def _warmup(self, ax, ay, az, mx, my, mz, dt):
+        init = self._warm == _INIT
+        k = 1 / _ONE
+        if mx is not None:
+            mx *= k
+            my *= k
+            mz *= k
+        super()._warmup(ax * k, ay * k, az * k, mx, my, mz, dt / 1000000)
+        if init and self._warm != _INIT:
+            self.q = self._q
+        self._convert()
+
+    # Batch updates call update for each sample.
+    def update_batch(self, accel, gyro, mag, ts):
+        if mag is None:
+            return self.update_nomag_batch(accel, gyro, ts)
+        return self._batch(accel, gyro, mag, ts, True)
+
+    def update_nomag_batch(self, accel, gyro, ts):
+        return self._batch(accel, gyro, None, ts, False)
+
+    def _batch(self, accel, gyro, mag, ts, ninedof):
+        quats = []
+        angles = []
+        for n in range(len(ts)):
+            if ninedof:
+                self.update(accel[n], gyro[n], mag[n], ts[n])
+            else:
+                self.update_nomag(accel[n], gyro[n], ts[n])
+            quats.append(tuple(self.q))
+            angles.append((self.heading, self.pitch, self.roll))
+        return quats, angles
+
+    def _interval(self, ts):  # μs since the last update
+        if self._fixed:
+            return self._fixed
+        deltat = self.deltat
+        if not deltat.expect_ts:  # MicroPython
+            ts = time.ticks_us()
+        elif ts is None:
+            raise ValueError('Timestamp expected but not supplied.')
+        start = deltat.start_time
+        deltat.start_time = ts
+        if start is None:
+            dt = 100  # As DeltaT
+        elif self._ticks:
+            dt = ticks_diff(ts, start)
+        else:
+            dt = int(deltat.timediff(ts, start) * 1000000)
+        if self.stats is not None:
+            deltat.dt = dt / 1000000
+        return 0 if dt < 0 else dt if dt < _MAXDT else _MAXDT
+
+    def _convert(self):  # Convert objects assigned to beta, magbias, magcorr and orientation
+        src = self._src
+        if self.beta is not src[0]:
+            src[0] = self.beta
+            self._ibeta = int(self.beta * _ONE + 0.5)
+        if self.magbias is not src[1]:
+            src[1] = self.magbias
+            for i in range(3):
+                self._bias[i] = int(round(self.magbias[i]))
+        if self.magcorr is not src[2]:
+            src[2] = w = self.magcorr
+            if w is None:
+                self._corr = None
+            else:  # Scale is irrelevant: largest element becomes 1.0
+                k = _ONE / max(abs(x) for r in w for x in r)
+                self._corr = tuple(array('i', (int(round(x * k)) for x in r)) for r in w)
+        if self.orientation is not src[3]:
+            src[3] = o = self.orientation
+            self._signs = None if o is None else tuple(int(x) for x in o.s)
+
+    def update_nomag(self, accel, gyro, ts=None):
+        self._convert()
+        o = self.orientation
+        if o is None:
+            ax, ay, az = accel
+            gx, gy, gz = gyro
+        else:
+            t0, t1, t2 = o.t
+            s0, s1, s2 = self._signs
+            ax = s0 * accel[t0]
+            ay = s1 * accel[t1]
+            az = s2 * accel[t2]
+            gx = s0 * gyro[t0]
+            gy = s1 * gyro[t1]
+            gz = s2 * gyro[t2]
+        a = self._a
+        v = self._v
+        if not _unit(v, ax, ay, az, 0):
+            self._skipped[SKIP_ACCEL] += 1
+            return
+        a[0] = v[0]
+        a[1] = v[1]
+        a[2] = v[2]
+        dt = self._interval(ts)
+        if self._warm:
+            self._warmup(a[0], a[1], a[2], None, 0, 0, dt)
+        self._step(gx, gy, gz, None, dt)
+        self._ninedof = False
+        if self.history is not None:
+            self.history.add(self, ts)
+
+    def update(self, accel, gyro, mag, ts=None, mts=None):
+        if mag is None or (mts is not None and not self._fresh(mts)):
+            warm = self._warm
+            if warm == _INIT:  # Wait for a mag reading to set heading
+                self._warm = 0
+            ninedof = self._ninedof
+            FixedEngine.update_nomag(self, accel, gyro, ts)
+            self._ninedof = ninedof
+            if warm == _INIT:
+                self._warm = _INIT
+            return
+        if self.magtrack is not None:  # Assigns a new magbias when it moves
+            self.magtrack.add(self, mag)
+        self._convert()
+        b = self._bias
+        mx = mag[0] - b[0]
+        my = mag[1] - b[1]
+        mz = mag[2] - b[2]
+        w = self._corr
+        if w is not None:
+            if not _unit(self._v, mx, my, mz, 0):  # Keep products in range
+                self._skipped[SKIP_MAG] += 1
+                return
+            v = self._v
+            r = w[0]
+            x = (r[0] * v[0] + r[1] * v[1] + r[2] * v[2]) >> 14
+            r = w[1]
+            y = (r[0] * v[0] + r[1] * v[1] + r[2] * v[2]) >> 14
+            r = w[2]
+            mz = (r[0] * v[0] + r[1] * v[1] + r[2] * v[2]) >> 14
+            mx = x
+            my = y
+        o = self.orientation
+        if o is None:
+            ax, ay, az = accel
+            gx, gy, gz = gyro
+        else:
+            t0, t1, t2 = o.t
+            s0, s1, s2 = self._signs
+            m = self._a  # Enables scalars to be indexed
+            m[0] = mx
+            m[1] = my
+            m[2] = mz
+            mx = s0 * m[t0]
+            my = s1 * m[t1]
+            mz = s2 * m[t2]
+            ax = s0 * accel[t0]
+            ay = s1 * accel[t1]
+            az = s2 * accel[t2]
+            gx = s0 * gyro[t0]
+            gy = s1 * gyro[t1]
+            gz = s2 * gyro[t2]
+        a = self._a
+        v = self._v
+        if not _unit(v, ax, ay, az, 0):
+            self._skipped[SKIP_ACCEL] += 1
+            return
+        a[0] = v[0]
+        a[1] = v[1]
+        a[2] = v[2]
+        if not _unit(v, mx, my, mz, 0):
+            self._skipped[SKIP_MAG] += 1
+            return
+        dt = self._interval(ts)
+        if self._warm:
+            self._warmup(a[0], a[1], a[2], v[0], v[1], v[2], dt)
+        self._step(gx, gy, gz, v, dt)
+        self._ninedof = True
+        if self.history is not None:
+            self.history.add(self, ts)
+
+    # Gradient descent step followed by integration. m is the unit mag vector
+    # or None. gx, gy, gz are gyro counts, dt is in μs.
+    def _step(self, gx, gy, gz, m, dt):
+        qi = self._qi
+        q1 = (qi[0] + 512) >> 10  # Q14 operands
+        q2 = (qi[1] + 512) >> 10
+        q3 = (qi[2] + 512) >> 10
+        q4 = (qi[3] + 512) >> 10
+        a = self._a
+        ax = a[0]
+        ay = a[1]
+        az = a[2]
+        q1q1 = q1 * q1 >> 14
+        q2q2 = q2 * q2 >> 14
+        q3q3 = q3 * q3 >> 14
+        q4q4 = q4 * q4 >> 14
+        if m is None:
+            s1 = 4 * (q1 * q3q3 >> 14) + 2 * (q3 * ax >> 14) + 4 * (q1 * q2q2 >> 14) - 2 * (q2 * ay >> 14)
+            s2 = (4 * (q2 * q4q4 >> 14) - 2 * (q4 * ax >> 14) + 4 * (q1q1 * q2 >> 14) - 2 * (q1 * ay >> 14) - 4 * q2
+                  + 8 * (q2 * q2q2 >> 14) + 8 * (q2 * q3q3 >> 14) + 4 * (q2 * az >> 14))
+            s3 = (4 * (q1q1 * q3 >> 14) + 2 * (q1 * ax >> 14) + 4 * (q3 * q4q4 >> 14) - 2 * (q4 * ay >> 14) - 4 * q3
+                  + 8 * (q3 * q2q2 >> 14) + 8 * (q3 * q3q3 >> 14) + 4 * (q3 * az >> 14))
+            s4 = 4 * (q2q2 * q4 >> 14) - 2 * (q2 * ax >> 14) + 4 * (q3q3 * q4 >> 14) - 2 * (q3 * ay >> 14)
+        else:
+            mx = m[0]
+            my = m[1]
+            mz = m[2]
+            q1q2 = q1 * q2 >> 14
+            q1q3 = q1 * q3 >> 14
+            q1q4 = q1 * q4 >> 14
+            q2q3 = q2 * q3 >> 14
+            q2q4 = q2 * q4 >> 14
+            q3q4 = q3 * q4 >> 14
+            # Reference direction of Earth's magnetic field
+            _2q1mx = 2 * (q1 * mx >> 14)
+            _2q1my = 2 * (q1 * my >> 14)
+            _2q1mz = 2 * (q1 * mz >> 14)
+            _2q2mx = 2 * (q2 * mx >> 14)
+            hx = ((mx * q1q1 >> 14) - (_2q1my * q4 >> 14) + (_2q1mz * q3 >> 14) + (mx * q2q2 >> 14)
+                  + 2 * ((q2 * my >> 14) * q3 >> 14) + 2 * ((q2 * mz >> 14) * q4 >> 14) - (mx * q3q3 >> 14) - (mx * q4q4 >> 14))
+            hy = ((_2q1mx * q4 >> 14) + (my * q1q1 >> 14) - (_2q1mz * q2 >> 14) + (_2q2mx * q3 >> 14)
+                  - (my * q2q2 >> 14) + (my * q3q3 >> 14) + 2 * ((q3 * mz >> 14) * q4 >> 14) - (my * q4q4 >> 14))
+            _2bx = 0
+            v = self._s
+            if _unit(v, hx, hy, 0, 0):  # Magnitude is the dot product with the unit vector
+                _2bx = (hx * v[0] >> 14) + (hy * v[1] >> 14)
+            _2bz = (-(_2q1mx * q3 >> 14) + (_2q1my * q2 >> 14) + (mz * q1q1 >> 14) + (_2q2mx * q4 >> 14)
+                    - (mz * q2q2 >> 14) + 2 * ((q3 * my >> 14) * q4 >> 14) - (mz * q3q3 >> 14) + (mz * q4q4 >> 14))
+            bx1 = _2bx * q1 >> 14
+            bx2 = _2bx * q2 >> 14
+            bx3 = _2bx * q3 >> 14
+            bx4 = _2bx * q4 >> 14
+            bz1 = _2bz * q1 >> 14
+            bz2 = _2bz * q2 >> 14
+            bz3 = _2bz * q3 >> 14
+            bz4 = _2bz * q4 >> 14
+            # Errors in the estimated directions of gravity and magnetic field
+            fa = 2 * q2q4 - 2 * q1q3 - ax
+            fb = 2 * q1q2 + 2 * q3q4 - ay
+            fc = _ONE - 2 * q2q2 - 2 * q3q3 - az
+            fmx = (_2bx * (_HALF - q3q3 - q4q4) >> 14) + (_2bz * (q2q4 - q1q3) >> 14) - mx
+            fmy = (_2bx * (q2q3 - q1q4) >> 14) + (_2bz * (q1q2 + q3q4) >> 14) - my
+            fmz = (_2bx * (q1q3 + q2q4) >> 14) + (_2bz * (_HALF - q2q2 - q3q3) >> 14) - mz
+            # Gradient: each product has factors below 2**15
+            s1 = (-2 * (q3 * fa >> 14) + 2 * (q2 * fb >> 14) - (bz3 * fmx >> 14) - (bx4 * fmy >> 14)
+                  + (bz2 * fmy >> 14) + (bx3 * fmz >> 14))
+            s2 = (2 * (q4 * fa >> 14) + 2 * (q1 * fb >> 14) - 4 * (q2 * fc >> 14) + (bz4 * fmx >> 14)
+                  + (bx3 * fmy >> 14) + (bz1 * fmy >> 14) + (bx4 * fmz >> 14) - 2 * (bz2 * fmz >> 14))
+            s3 = (-2 * (q1 * fa >> 14) + 2 * (q4 * fb >> 14) - 4 * (q3 * fc >> 14) - 2 * (bx3 * fmx >> 14)
+                  - (bz1 * fmx >> 14) + (bx2 * fmy >> 14) + (bz4 * fmy >> 14) + (bx1 * fmz >> 14) - 2 * (bz3 * fmz >> 14))
+            s4 = (2 * (q2 * fa >> 14) + 2 * (q3 * fb >> 14) - 2 * (bx4 * fmx >> 14) + (bz2 * fmx >> 14)
+                  - (bx1 * fmy >> 14) + (bz3 * fmy >> 14) + (bx2 * fmz >> 14))
+        s = self._s
+        if not _unit(s, s1, s2, s3, s4):  # Zero gradient: no correction
+            s[0] = 0
+            s[1] = 0
+            s[2] = 0
+            s[3] = 0
+        # Interval in Q19 s. Angles turned (Q18 rad) and beta * dt (Q18).
+        dt = (dt * 8590 + 8192) >> 14
+        k = self._gk
+        sh = self._gs
+        h = 1 << (sh - 1) if sh else 0
+        gx = ((((gx * k + h) >> sh) * dt) + 4096) >> 13
+        gy = ((((gy * k + h) >> sh) * dt) + 4096) >> 13
+        gz = ((((gz * k + h) >> sh) * dt) + 4096) >> 13
+        bdt = (self._ibeta * dt + 16384) >> 15
+        # Integrate in Q24: Q12 operands * Q18 angles are Q30.
+        p1 = qi[0] >> 12
+        p2 = qi[1] >> 12
+        p3 = qi[2] >> 12
+        p4 = qi[3] >> 12
+        q1 = qi[0] - (p2 * gx >> 7) - (p3 * gy >> 7) - (p4 * gz >> 7) - ((s[0] >> 2) * bdt >> 6)
+        q2 = qi[1] + (p1 * gx >> 7) + (p3 * gz >> 7) - (p4 * gy >> 7) - ((s[1] >> 2) * bdt >> 6)
+        q3 = qi[2] + (p1 * gy >> 7) - (p2 * gz >> 7) + (p4 * gx >> 7) - ((s[2] >> 2) * bdt >> 6)
+        q4 = qi[3] + (p1 * gz >> 7) + (p2 * gy >> 7) - (p3 * gx >> 7) - ((s[3] >> 2) * bdt >> 6)
+        # Renormalise: with e = |q|^2 - 1, q /= sqrt(1 + e) ~ q * (1 - e / 2 + 3 * e * e / 8).
+        # |q|^2 in Q28 from Q14 parts and remainders, e in Q20.
+        c1 = (q1 + 512) >> 10
+        c2 = (q2 + 512) >> 10
+        c3 = (q3 + 512) >> 10
+        c4 = (q4 + 512) >> 10
+        e = (c1 * c1 + c2 * c2 + c3 * c3 + c4 * c4 - (1 << 28) + (c1 * (q1 - (c1 << 10)) >> 9)
+             + (c2 * (q2 - (c2 << 10)) >> 9) + (c3 * (q3 - (c3 << 10)) >> 9) + (c4 * (q4 - (c4 << 10)) >> 9)) >> 8
+        k = e >> 4
+        k = (e >> 1) - (3 * (k * k >> 12) >> 3)
+        qi[0] = q1 - ((q1 >> 12) * k >> 8)
+        qi[1] = q2 - ((q2 >> 12) * k >> 8)
+        qi[2] = q3 - ((q3 >> 12) * k >> 8)
+        qi[3] = q4 - ((q4 >> 12) * k >> 8)
+        self._stale = True
+        self._cached = 0
+
+class FixedFusion(FixedEngine, fusion.Fusion):
+    '''
+    Class provides sensor fusion allowing heading, pitch and roll to be extracted. This uses the Madgwick algorithm
+    in fixed point arithmetic. The update method must be called peiodically with integer sensor readings.
+    '''
+    pass
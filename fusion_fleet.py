@@ -0,0 +1,184 @@
+# fusion_fleet.py Sensor fusion for a fleet of IMU's in a single filter state.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Requires numpy: intended for host platforms fusing data from many remote
+# devices (see remote/README.md). The Madgwick algorithm is as in fusion.py
+# but the state of N devices is held in arrays: each call advances every
+# device that has a new sample in one vectorised step. This removes per-device
+# Python call overhead so that cost scales with array width.
+
+import numpy as np
+from math import sqrt, radians
+from deltat import TimeDiff
+
+class FusionFleet(object):
+    '''
+    Madgwick sensor fusion for N devices. State is held in arrays indexed by
+    device number: q (N x 4), beta (N), magbias (N x 3).
+    '''
+    declination = 0                         # Optional offset for true north. A +ve value adds to heading
+    def __init__(self, n, timediff=None):
+        self.n = n
+        self.magbias = np.zeros((n, 3))     # local magnetic bias factors: set from calibration
+        self.q = np.zeros((n, 4))           # quaternions
+        self.q[:, 0] = 1.0
+        GyroMeasError = radians(40)         # Original code indicates this leads to a 2 sec response time
+        self.beta = np.full(n, sqrt(3.0 / 4.0) * GyroMeasError)  # compute beta (see README)
+        # Timestamp differencing function. Must accept arrays. Default: ticks_us()
+        # values with rollover (see deltat.py).
+        self.timediff = TimeDiff if timediff is None else timediff
+        # Timestamp of each device's last sample. Integer timestamps are held
+        # exactly: the array becomes float if float timestamps are passed.
+        self.start_time = np.zeros(n, dtype=np.int64)
+        self.started = np.zeros(n, dtype=bool)
+
+    # idx is an array of k distinct device numbers (None: all devices). accel,
+    # gyro and mag are k x 3 arrays, ts an array of k timestamps. Samples with
+    # a zero accel or mag vector are ignored. Returns the numbers of the devices
+    # updated.
+    def update(self, idx, accel, gyro, mag, ts):
+        idx, accel, gyro, ts = self._args(idx, accel, gyro, ts)
+        m = np.asarray(mag, dtype=float) - self.magbias[idx]
+        anorm = np.sqrt((accel * accel).sum(1))
+        mnorm = np.sqrt((m * m).sum(1))
+        ok = (anorm != 0) & (mnorm != 0)    # handle NaN
+        if not ok.all():
+            idx, accel, gyro, m, ts, anorm, mnorm = (x[ok] for x in (idx, accel, gyro, m, ts, anorm, mnorm))
+        a = accel / anorm[:, None]
+        m /= mnorm[:, None]
+        ax, ay, az = a.T
+        mx, my, mz = m.T
+        q1, q2, q3, q4 = self.q[idx].T
+        # Auxiliary variables to avoid repeated arithmetic
+        _2q1 = 2 * q1
+        _2q2 = 2 * q2
+        _2q3 = 2 * q3
+        _2q4 = 2 * q4
+        _2q1q3 = 2 * q1 * q3
+        _2q3q4 = 2 * q3 * q4
+        q1q1 = q1 * q1
+        q1q2 = q1 * q2
+        q1q3 = q1 * q3
+        q1q4 = q1 * q4
+        q2q2 = q2 * q2
+        q2q3 = q2 * q3
+        q2q4 = q2 * q4
+        q3q3 = q3 * q3
+        q3q4 = q3 * q4
+        q4q4 = q4 * q4
+
+        # Reference direction of Earth's magnetic field
+        _2q1mx = 2 * q1 * mx
+        _2q1my = 2 * q1 * my
+        _2q1mz = 2 * q1 * mz
+        _2q2mx = 2 * q2 * mx
+        hx = mx * q1q1 - _2q1my * q4 + _2q1mz * q3 + mx * q2q2 + _2q2 * my * q3 + _2q2 * mz * q4 - mx * q3q3 - mx * q4q4
+        hy = _2q1mx * q4 + my * q1q1 - _2q1mz * q2 + _2q2mx * q3 - my * q2q2 + my * q3q3 + _2q3 * mz * q4 - my * q4q4
+        _2bx = np.sqrt(hx * hx + hy * hy)
+        _2bz = -_2q1mx * q3 + _2q1my * q2 + mz * q1q1 + _2q2mx * q4 - mz * q2q2 + _2q3 * my * q4 - mz * q3q3 + mz * q4q4
+        _4bx = 2 * _2bx
+        _4bz = 2 * _2bz
+
+        # Gradient descent algorithm corrective step. Common subexpressions
+        # are the residuals of the accel and mag reference directions.
+        fax = 2 * q2q4 - _2q1q3 - ax
+        fay = 2 * q1q2 + _2q3q4 - ay
+        faz = 1 - 2 * q2q2 - 2 * q3q3 - az
+        fmx = _2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx
+        fmy = _2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my
+        fmz = _2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz
+        s1 = -_2q3 * fax + _2q2 * fay - _2bz * q3 * fmx + (-_2bx * q4 + _2bz * q2) * fmy + _2bx * q3 * fmz
+        s2 = (_2q4 * fax + _2q1 * fay - 4 * q2 * faz + _2bz * q4 * fmx + (_2bx * q3 + _2bz * q1) * fmy
+              + (_2bx * q4 - _4bz * q2) * fmz)
+        s3 = (-_2q1 * fax + _2q4 * fay - 4 * q3 * faz + (-_4bx * q3 - _2bz * q1) * fmx
+              + (_2bx * q2 + _2bz * q4) * fmy + (_2bx * q1 - _4bz * q3) * fmz)
+        s4 = (_2q2 * fax + _2q3 * fay + (-_4bx * q4 + _2bz * q2) * fmx + (-_2bx * q1 + _2bz * q3) * fmy
+              + _2bx * q2 * fmz)
+        self._integrate(idx, gyro, ts, q1, q2, q3, q4, s1, s2, s3, s4)
+        return idx
+
+    def update_nomag(self, idx, accel, gyro, ts):
+        idx, accel, gyro, ts = self._args(idx, accel, gyro, ts)
+        anorm = np.sqrt((accel * accel).sum(1))
+        ok = anorm != 0                     # handle NaN
+        if not ok.all():
+            idx, accel, gyro, ts, anorm = (x[ok] for x in (idx, accel, gyro, ts, anorm))
+        ax, ay, az = (accel / anorm[:, None]).T
+        q1, q2, q3, q4 = self.q[idx].T
+        # Auxiliary variables to avoid repeated arithmetic
+        _2q1 = 2 * q1
+        _2q2 = 2 * q2
+        _2q3 = 2 * q3
+        _2q4 = 2 * q4
+        _4q1 = 4 * q1
+        _4q2 = 4 * q2
+        _4q3 = 4 * q3
+        _8q2 = 8 * q2
+        _8q3 = 8 * q3
+        q1q1 = q1 * q1
+        q2q2 = q2 * q2
+        q3q3 = q3 * q3
+        q4q4 = q4 * q4
+
+        # Gradient decent algorithm corrective step
+        s1 = _4q1 * q3q3 + _2q3 * ax + _4q1 * q2q2 - _2q2 * ay
+        s2 = _4q2 * q4q4 - _2q4 * ax + 4 * q1q1 * q2 - _2q1 * ay - _4q2 + _8q2 * q2q2 + _8q2 * q3q3 + _4q2 * az
+        s3 = 4 * q1q1 * q3 + _2q1 * ax + _4q3 * q4q4 - _2q4 * ay - _4q3 + _8q3 * q2q2 + _8q3 * q3q3 + _4q3 * az
+        s4 = 4 * q2q2 * q4 - _2q2 * ax + 4 * q3q3 * q4 - _2q3 * ay
+        self._integrate(idx, gyro, ts, q1, q2, q3, q4, s1, s2, s3, s4)
+        return idx
+
+    def _args(self, idx, accel, gyro, ts):
+        idx = np.arange(self.n) if idx is None else np.asarray(idx)
+        ts = np.asarray(ts)
+        if ts.dtype.kind in 'iu':
+            ts = ts.astype(np.int64)
+        elif self.start_time.dtype.kind != 'f':
+            self.start_time = self.start_time.astype(float)
+        return idx, np.asarray(accel, dtype=float), np.asarray(gyro, dtype=float), ts
+
+    # Apply normalised corrective step s, integrate gyro rates and store the
+    # normalised quaternions.
+    def _integrate(self, idx, gyro, ts, q1, q2, q3, q4, s1, s2, s3, s4):
+        norm = 1 / np.sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4)    # normalise step magnitude
+        beta = self.beta[idx] * norm
+        gx, gy, gz = np.radians(gyro).T     # Units deg/s
+
+        # Compute rate of change of quaternion
+        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - beta * s1
+        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - beta * s2
+        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - beta * s3
+        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - beta * s4
+
+        # Integrate to yield quaternion. On a device's 1st sample dt can't be
+        # computed: use a notional 100μs as in DeltaT.
+        started = self.started[idx]
+        deltat = np.where(started, self.timediff(ts, self.start_time[idx]), 0.0001)
+        self.start_time[idx] = ts
+        self.started[idx] = True
+        q1 = q1 + qDot1 * deltat
+        q2 = q2 + qDot2 * deltat
+        q3 = q3 + qDot3 * deltat
+        q4 = q4 + qDot4 * deltat
+        norm = 1 / np.sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)    # normalise quaternion
+        self.q[idx] = np.stack((q1 * norm, q2 * norm, q3 * norm, q4 * norm), axis=1)
+
+    # Angles in degrees of all devices as arrays of length N. Heading is only
+    # meaningful for devices updated with a magnetometer.
+    @property
+    def heading(self):
+        q = self.q.T
+        return self.declination + np.degrees(np.arctan2(2.0 * (q[1] * q[2] + q[0] * q[3]),
+            q[0] * q[0] + q[1] * q[1] - q[2] * q[2] - q[3] * q[3]))
+
+    @property
+    def pitch(self):
+        q = self.q.T
+        return np.degrees(-np.arcsin(2.0 * (q[1] * q[3] - q[0] * q[2])))
+
+    @property
+    def roll(self):
+        q = self.q.T
+        return np.degrees(np.arctan2(2.0 * (q[0] * q[1] + q[2] * q[3]),
+            q[0] * q[0] - q[1] * q[1] - q[2] * q[2] + q[3] * q[3]))
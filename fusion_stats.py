@@ -0,0 +1,100 @@
+# fusion_stats.py Runtime statistics for sensor fusion.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Instantiated by Fusion.enable_stats(): not intended for direct use.
+# Counters are fixed in number and held in preallocated storage. Stats wraps
+# the Fusion update methods, recording the number of updates, the time between
+# samples computed by DeltaT, the number of skipped samples by cause and the
+# time taken by each update. snapshot() returns a dict suitable for logging.
+# The total of the intervals is accumulated in an array, which avoids
+# allocation, with compensated (Kahan) summation so that precision is not lost
+# over long runs with single precision floats.
+
+try:
+    import utime as time
+except ImportError:
+    import time
+from array import array
+from fusion import SKIP_ACCEL, SKIP_MAG, _FLOAT
+
+if hasattr(time, 'ticks_us'):
+    _ticks_us = time.ticks_us
+    _ticks_diff = time.ticks_diff
+else:
+    _ticks_us = lambda : int(time.perf_counter() * 1000000)
+    _ticks_diff = lambda end, start : end - start
+
+class Stats:
+    def __init__(self, fuse):
+        self.fuse = fuse
+        cls = type(fuse)  # Access the uninstrumented methods
+        self._update = cls.update
+        self._update_nomag = cls.update_nomag
+        self.dt = array(_FLOAT, (0, 0, 0, 0))  # min, total, max (s), compensation
+        self.reset()
+
+    def reset(self):
+        self.updates = 0
+        self.time_total = 0  # μs
+        self.time_max = 0
+        dt = self.dt
+        dt[0] = 1e9
+        dt[1] = 0
+        dt[2] = 0
+        dt[3] = 0
+        skipped = self.fuse._skipped
+        self._skip_base = [skipped[SKIP_ACCEL], skipped[SKIP_MAG]]
+
+    def update(self, accel, gyro, mag, ts=None, mts=None):
+        skipped = self.fuse._skipped
+        n = skipped[SKIP_ACCEL] + skipped[SKIP_MAG]
+        t = _ticks_us()
+        self._update(self.fuse, accel, gyro, mag, ts, mts)
+        self._record(_ticks_diff(_ticks_us(), t), skipped[SKIP_ACCEL] + skipped[SKIP_MAG] == n)
+
+    def update_nomag(self, accel, gyro, ts=None):
+        skipped = self.fuse._skipped
+        n = skipped[SKIP_ACCEL]
+        t = _ticks_us()
+        self._update_nomag(self.fuse, accel, gyro, ts)
+        self._record(_ticks_diff(_ticks_us(), t), skipped[SKIP_ACCEL] == n)
+
+    def _record(self, t, ok):
+        self.time_total += t
+        if t > self.time_max:
+            self.time_max = t
+        if ok:  # DeltaT was called
+            self.updates += 1
+            d = self.fuse.deltat.dt
+            dt = self.dt
+            if d < dt[0]:
+                dt[0] = d
+            if d > dt[2]:
+                dt[2] = d
+            total = dt[1]  # Kahan summation: dt[3] holds the lost low order part
+            d -= dt[3]
+            dt[1] = total + d
+            dt[3] = (dt[1] - total) - d
+
+    def snapshot(self):
+        n = self.updates
+        dt = self.dt
+        skipped = self.fuse._skipped
+        sa = skipped[SKIP_ACCEL] - self._skip_base[SKIP_ACCEL]
+        sm = skipped[SKIP_MAG] - self._skip_base[SKIP_MAG]
+        calls = n + sa + sm
+        res = {'updates': n,
+               'rate': n / dt[1] if dt[1] else 0,  # Updates per second of sample time
+               'dt_min': dt[0] if n else 0,
+               'dt_mean': dt[1] / n if n else 0,
+               'dt_max': dt[2],
+               'skipped_accel': sa,
+               'skipped_mag': sm,
+               'time_mean_us': self.time_total / calls if calls else 0,
+               'time_max_us': self.time_max,
+               }
+        for k in ('overruns', 'dropped', 'late'):  # fusion_async
+            if hasattr(self.fuse, k):
+                res[k] = getattr(self.fuse, k)
+        return res
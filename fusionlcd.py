@@ -11,7 +11,7 @@
 # https://github.com/peterhinch/micropython-async/blob/master/v3/as_drivers/hd44780/alcd.py
 # From https://github.com/micropython-IMU/micropython-mpu9x50:
 # imu.py, mpu9150.py, vector3d.py
-# From this repo: deltat.py fusion_async.py
+# From this repo: deltat.py fusion.py fusion_async.py
 
 # Hitachi HD44780 2 row LCD display wired using 4 bit data bus as follows:
 
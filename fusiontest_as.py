@@ -7,7 +7,7 @@
 # uasyncio V3 (Included in daily builds and release builds later than V1.12).
 # From https://github.com/micropython-IMU/micropython-mpu9x50:
 # imu.py, mpu9150.py, vector3d.py
-# From this repo: deltat.py fusion_async.py
+# From this repo: deltat.py fusion.py fusion_async.py
 
 # MPU9150 on X position
 # Normally open pushbutton connected between pin Y7 and ground
@@ -7,7 +7,7 @@
 # uasyncio V3 (Included in daily builds and release builds later than V1.12).
 # From https://github.com/micropython-IMU/micropython-mpu9x50:
 # imu.py, mpu6050.py, vector3d.py
-# From this repo: deltat.py fusion_async.py
+# From this repo: deltat.py fusion.py fusion_async.py
 # MPU9150 on X position
 
 from machine import Pin
@@ -0,0 +1,169 @@
+# history.py Attitude history for sensor fusion.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under MicroPython or CPython.
+# A History instance assigned to Fusion.history records the timestamp and
+# quaternion after each update in a ring buffer of fixed size. The attitude
+# at the time of another measurement, such as a camera frame or a GPS fix, is
+# found by binary search and spherical linear interpolation (slerp) between
+# the two entries either side of it.
+# Storage is preallocated: entries are overwritten in place when the buffer is
+# full. Timestamps are normally ticks_us() values, which are small integers
+# stored without allocation under MicroPython. They are compared with the
+# timediff function of the Fusion instance so rollover is handled: the span of
+# the history must be less than half the rollover period. If the Fusion
+# instance has a fixed interval the timestamp of an entry is the number of
+# updates performed since the history was attached.
+
+from array import array
+from math import acos, sin, sqrt
+from fusion import _FLOAT
+
+class History:
+    def __init__(self, size=256):
+        self.size = size
+        self._ts = [0] * size
+        self._q = array(_FLOAT, (0 for _ in range(4 * size)))
+        self.timediff = None
+        self.clear()
+
+    def clear(self):
+        self.n = 0  # Entries held
+        self.count = 0  # Updates recorded
+        self._head = 0  # Index of next entry
+
+    def __len__(self):
+        return self.n
+
+    # Called by Fusion after each update. ts is the timestamp passed to the
+    # update method.
+    def add(self, fuse, ts):
+        deltat = fuse.deltat
+        if self.timediff is None:
+            if deltat.fixed:
+                fixed = deltat.fixed
+                self.timediff = lambda end, start : (end - start) * fixed
+            else:
+                self.timediff = deltat.timediff
+        if deltat.fixed:
+            ts = self.count
+        elif ts is None:  # MicroPython: DeltaT has read ticks_us()
+            ts = deltat.start_time
+        head = self._head
+        self._ts[head] = ts
+        q = fuse.q
+        buf = self._q
+        i = head * 4
+        buf[i] = q[0]
+        buf[i + 1] = q[1]
+        buf[i + 2] = q[2]
+        buf[i + 3] = q[3]
+        head += 1
+        self._head = 0 if head == self.size else head
+        if self.n < self.size:
+            self.n += 1
+        self.count += 1
+
+    def _index(self, i):  # Buffer index of the ith oldest entry
+        i += self._head - self.n
+        return i + self.size if i < 0 else i
+
+    # Timestamps of the oldest and newest entries, or None if empty.
+    def span(self):
+        if not self.n:
+            return None
+        return self._ts[self._index(0)], self._ts[self._index(self.n - 1)]
+
+    # Return the number of entries with timestamp <= ts, searching entries
+    # from lo onwards.
+    def _search(self, ts, lo=0):
+        timediff = self.timediff
+        tss = self._ts
+        hi = self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if timediff(ts, tss[self._index(mid)]) < 0:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    # Attitude at time ts as a (w, x, y, z) tuple, or None if ts is outside the
+    # span of the history. If q is an array of 4 floats the result is placed in
+    # it and q is returned, avoiding allocation of a tuple.
+    def attitude_at(self, ts, q=None):
+        if not self.n:
+            return None
+        return self._interpolate(ts, self._search(ts), q)
+
+    # Attitudes at each of a sequence of timestamps. Returns a list of tuples
+    # with None for those outside the span. Where timestamps are in ascending
+    # order each search starts from the position of the previous one.
+    def attitudes_at(self, tss):
+        res = []
+        if not self.n:
+            return [None] * len(tss)
+        timediff = self.timediff
+        i = 0
+        prev = None
+        for ts in tss:
+            lo = i if prev is not None and timediff(ts, prev) >= 0 else 0
+            i = self._search(ts, lo)
+            res.append(self._interpolate(ts, i, None))
+            prev = ts
+        return res
+
+    # Interpolate between entries i - 1 and i.
+    def _interpolate(self, ts, i, q):
+        n = self.n
+        buf = self._q
+        if i == n or i == 0:  # After the newest entry or before the oldest
+            if i == 0 or self.timediff(ts, self._ts[self._index(n - 1)]) != 0:
+                return None
+            j = self._index(n - 1) * 4  # Equal to the newest
+            return self._result(q, buf[j], buf[j + 1], buf[j + 2], buf[j + 3])
+        a = self._index(i - 1)
+        b = self._index(i)
+        ta = self._ts[a]
+        f = self.timediff(ts, ta) / self.timediff(self._ts[b], ta)
+        a *= 4
+        b *= 4
+        aw = buf[a]
+        ax = buf[a + 1]
+        ay = buf[a + 2]
+        az = buf[a + 3]
+        bw = buf[b]
+        bx = buf[b + 1]
+        by = buf[b + 2]
+        bz = buf[b + 3]
+        d = aw * bw + ax * bx + ay * by + az * bz
+        if d < 0:  # q and -q are the same rotation: take the shorter path
+            d = -d
+            bw = -bw
+            bx = -bx
+            by = -by
+            bz = -bz
+        if d > 0.9995:  # Nearly parallel: linear interpolation
+            ka = 1 - f
+            kb = f
+        else:
+            theta = acos(d)
+            s = 1 / sin(theta)
+            ka = sin((1 - f) * theta) * s
+            kb = sin(f * theta) * s
+        w = ka * aw + kb * bw
+        x = ka * ax + kb * bx
+        y = ka * ay + kb * by
+        z = ka * az + kb * bz
+        norm = 1 / sqrt(w * w + x * x + y * y + z * z)
+        return self._result(q, w * norm, x * norm, y * norm, z * norm)
+
+    def _result(self, q, w, x, y, z):
+        if q is None:
+            return (w, x, y, z)
+        q[0] = w
+        q[1] = x
+        q[2] = y
+        q[3] = z
+        return q
@@ -0,0 +1,326 @@
+# ingest.py Asyncio ingestion server for many remote IMU devices.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython 3.8 or later.
+# python3 ingest.py [-u port] [-t port] [-q frames] [-f devices]
+# Devices send frames over UDP or TCP. A frame is an 8 byte header followed by
+# count records in the format of capfile.py, all little-endian:
+# Header: b'IF', version (uint8), count (uint8), device (uint32).
+# Over UDP each datagram holds one frame. Over TCP frames are sent back to
+# back. Each device's records are queued in a bounded queue and routed either
+# to its own fusion_async.Fusion instance or to a FusionFleet which advances
+# all devices in vectorised steps.
+# Backpressure: a TCP connection is not read while its device's queue is full,
+# so the sender is throttled by TCP flow control. A UDP frame arriving when
+# the queue is full is discarded and counted.
+# Latency is measured from the timestamp of each sample until its update has
+# completed. This requires samples to be timestamped with ticks_us() values on
+# the same machine, as by benchmarks/loadgen.py.
+
+import sys
+import struct
+import asyncio
+import time
+from collections import deque
+import capfile
+from deltat import TimeDiff, ticks_diff, TICKS_PERIOD
+
+MAGIC = b'IF'
+VERSION = 1
+_FRAME = '<2sBBI'
+FRAME_SIZE = struct.calcsize(_FRAME)  # 8
+RECORD_SIZE = capfile.RECORD_SIZE
+MAX_RECORDS = 255
+
+def ticks_us():  # Emulates MicroPython ticks_us() on the host
+    return (time.monotonic_ns() // 1000) % TICKS_PERIOD
+
+# A frame holding records for device. A record is as accepted by
+# capfile.pack_into().
+def frame(device, records):
+    if len(records) > MAX_RECORDS:
+        raise ValueError('Too many records')
+    buf = bytearray(FRAME_SIZE + len(records) * RECORD_SIZE)
+    struct.pack_into(_FRAME, buf, 0, MAGIC, VERSION, len(records), device)
+    offs = FRAME_SIZE
+    for rec in records:
+        capfile.pack_into(buf, offs, rec)
+        offs += RECORD_SIZE
+    return buf
+
+# Return (device, count) from a frame header. Raises ValueError if invalid.
+def header(buf):
+    magic, version, count, device = struct.unpack_from(_FRAME, buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Bad frame header')
+    return device, count
+
+def records(buf, count, offs=FRAME_SIZE):
+    return [capfile.unpack_from(buf, offs + i * RECORD_SIZE) for i in range(count)]
+
+class Stats:
+    def __init__(self, window=10000):
+        self.window = window  # Number of latencies retained for percentiles
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.samples = 0  # Received
+        self.fused = 0
+        self.dropped = 0  # Samples discarded because a queue was full
+        self.bad = 0  # Invalid frames
+        self.markers = 0
+        self.lat_total = 0  # μs
+        self.lat_max = 0
+        self._lat = deque((), self.window)
+        self._start = time.monotonic()
+        self._first = None  # ticks_us() of first and last completed update
+        self._last = None
+
+    def latency(self, ts, now):  # Record the latency of a sample with timestamp ts
+        d = ticks_diff(now, ts)
+        if self._first is None:
+            self._first = now
+        self._last = now
+        self.fused += 1
+        self.lat_total += d
+        if d > self.lat_max:
+            self.lat_max = d
+        self._lat.append(d)
+
+    def snapshot(self):
+        t = time.monotonic() - self._start
+        span = 0 if self._first is None else ticks_diff(self._last, self._first)  # μs
+        d = sorted(self._lat)
+        pc = lambda p : d[min(len(d) - 1, (len(d) * p) // 100)] if d else 0
+        return {'seconds': t, 'frames': self.frames, 'samples': self.samples, 'fused': self.fused,
+                'dropped': self.dropped, 'bad': self.bad, 'markers': self.markers,
+                'rate': self.fused * 1000000 / span if span > 0 else 0,
+                'lat_mean_us': self.lat_total / self.fused if self.fused else 0,
+                'lat_p50_us': pc(50), 'lat_p99_us': pc(99), 'lat_max_us': self.lat_max}
+
+# Routes the records of each device to a consumer via a bounded queue of
+# frames. If factory is supplied it is called with a read_coro to create a
+# fusion_async.Fusion instance for each new device. Otherwise fleet must be a
+# FusionFleet: device numbers index its arrays. marker, if supplied, is called
+# with the device number and name of each marker received.
+class Router:
+    def __init__(self, factory=None, fleet=None, queue=64, interval=0.01, stats=None, marker=None):
+        if (factory is None) == (fleet is None):
+            raise ValueError('Supply a factory or a fleet')
+        self.factory = factory
+        self.fleet = fleet
+        self.size = queue  # Frames
+        self.interval = interval  # Fleet update period (s)
+        self.stats = Stats() if stats is None else stats
+        self.marker = marker
+        self.queues = {}  # Bounded queues by device
+        self.fusers = {}  # fusion_async.Fusion instances by device
+        self._ready = None
+
+    def _queue(self, device):
+        q = self.queues.get(device)
+        if q is None:
+            if self.fleet is not None and not 0 <= device < self.fleet.n:
+                raise ValueError('Device {} out of range'.format(device))
+            q = asyncio.Queue(self.size)
+            self.queues[device] = q
+            if self.factory is not None:
+                fuse = self.factory(self._reader(q))
+                self.fusers[device] = fuse
+                asyncio.create_task(fuse.start())
+            elif self._ready is None:
+                self._ready = asyncio.Event()
+                asyncio.create_task(self._fleet())
+        return q
+
+    def _samples(self, device, recs):  # Remove markers
+        res = []
+        for rec in recs:
+            if isinstance(rec, (str, int)):
+                self.stats.markers += 1
+                if self.marker is not None:
+                    self.marker(device, rec)
+            else:
+                res.append(rec)
+        return res
+
+    # Queue the records of a frame, waiting while the queue is full.
+    async def put(self, device, recs):
+        q = self._queue(device)
+        recs = self._samples(device, recs)
+        self.stats.samples += len(recs)
+        if recs:
+            await q.put(recs)
+            if self._ready is not None:
+                self._ready.set()
+
+    # Queue the records of a frame. Returns False if the queue is full, when
+    # they are discarded.
+    def put_nowait(self, device, recs):
+        q = self._queue(device)
+        recs = self._samples(device, recs)
+        self.stats.samples += len(recs)
+        if recs:
+            try:
+                q.put_nowait(recs)
+            except asyncio.QueueFull:
+                self.stats.dropped += len(recs)
+                return False
+            if self._ready is not None:
+                self._ready.set()
+        return True
+
+    # read_coro for a fusion_async.Fusion instance. Returns a batch of samples.
+    # When called the previous batch has been processed: its latency is
+    # recorded.
+    def _reader(self, q):
+        last = []
+        stats = self.stats
+        async def read_coro():
+            now = ticks_us()
+            for rec in last:
+                stats.latency(rec[-1], now)
+            recs = await q.get()
+            last[:] = recs
+            return recs
+        return read_coro
+
+    # Fleet consumer. Pending frames of all devices are collected each
+    # interval. Each vectorised update takes one sample from each device
+    # having one.
+    async def _fleet(self):
+        import numpy as np
+        fleet = self.fleet
+        stats = self.stats
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            pending = {}
+            for device, q in self.queues.items():
+                recs = []
+                while not q.empty():
+                    recs.extend(q.get_nowait())
+                if recs:
+                    pending[device] = recs
+            i = 0
+            while pending:
+                nine = [d for d, r in pending.items() if len(r[i]) == 4]
+                six = [d for d, r in pending.items() if len(r[i]) == 3]
+                done = []  # Devices updated: the fleet skips zero vectors
+                if nine:
+                    recs = [pending[d][i] for d in nine]
+                    done += fleet.update(np.array(nine), [r[0] for r in recs], [r[1] for r in recs],
+                                         [r[2] for r in recs], np.array([r[3] for r in recs], dtype=np.int64)).tolist()
+                if six:
+                    recs = [pending[d][i] for d in six]
+                    done += fleet.update_nomag(np.array(six), [r[0] for r in recs], [r[1] for r in recs],
+                                               np.array([r[2] for r in recs], dtype=np.int64)).tolist()
+                now = ticks_us()
+                for d in done:
+                    stats.latency(pending[d][i][-1], now)
+                i += 1
+                pending = {d: r for d, r in pending.items() if len(r) > i}
+            await asyncio.sleep(self.interval)
+
+class _Datagram(asyncio.DatagramProtocol):
+    def __init__(self, router):
+        self.router = router
+
+    def datagram_received(self, data, addr):
+        stats = self.router.stats
+        try:
+            device, count = header(data)
+            if len(data) != FRAME_SIZE + count * RECORD_SIZE:
+                raise ValueError('Bad frame length')
+            recs = records(data, count)
+            stats.frames += 1
+            self.router.put_nowait(device, recs)
+        except (ValueError, struct.error):
+            stats.bad += 1
+
+class Server:
+    def __init__(self, router):
+        self.router = router
+        self.udp = None  # Transport
+        self.tcp = None  # asyncio.Server
+
+    # Open endpoints on the given ports. Returns once they are listening.
+    async def start(self, host='0.0.0.0', udp_port=None, tcp_port=None):
+        loop = asyncio.get_running_loop()
+        if udp_port is not None:
+            self.udp, _ = await loop.create_datagram_endpoint(lambda : _Datagram(self.router),
+                                                              local_addr=(host, udp_port))
+        if tcp_port is not None:
+            self.tcp = await asyncio.start_server(self._connection, host, tcp_port)
+
+    def close(self):
+        if self.udp is not None:
+            self.udp.close()
+        if self.tcp is not None:
+            self.tcp.close()
+
+    # A TCP connection. put() waits while the queue is full so the connection
+    # is not read: backpressure is applied to the sender.
+    async def _connection(self, reader, writer):
+        router = self.router
+        stats = router.stats
+        try:
+            while True:
+                hdr = await reader.readexactly(FRAME_SIZE)
+                device, count = header(hdr)
+                data = await reader.readexactly(count * RECORD_SIZE)
+                stats.frames += 1
+                await router.put(device, records(data, count, 0))
+        except asyncio.IncompleteReadError:
+            pass
+        except (ValueError, struct.error):
+            stats.bad += 1
+        writer.close()
+
+def show(s):
+    print('{samples} samples {fused} fused {dropped} dropped {bad} bad: {rate:.0f} samples/s '
+          'latency μs mean {lat_mean_us:.0f} p50 {lat_p50_us} p99 {lat_p99_us} max {lat_max_us}'.format(**s))
+
+async def serve(udp_port, tcp_port, queue, fleet):
+    if fleet:
+        from fusion_fleet import FusionFleet
+        router = Router(fleet=FusionFleet(fleet, TimeDiff), queue=queue)
+    else:
+        from fusion_async import Fusion
+        router = Router(lambda read_coro : Fusion(read_coro, TimeDiff), queue=queue)
+    server = Server(router)
+    await server.start(udp_port=udp_port, tcp_port=tcp_port)
+    while True:
+        await asyncio.sleep(1)
+        show(router.stats.snapshot())
+
+def main(args):
+    udp_port = None
+    tcp_port = None
+    queue = 64
+    fleet = 0
+    while args:
+        arg = args.pop(0)
+        if arg == '-u':
+            udp_port = int(args.pop(0))
+        elif arg == '-t':
+            tcp_port = int(args.pop(0))
+        elif arg == '-q':
+            queue = int(args.pop(0))
+        elif arg == '-f':
+            fleet = int(args.pop(0))
+        else:
+            args = None
+            break
+    if args is None or (udp_port is None and tcp_port is None):
+        print('Usage: ingest.py [-u port] [-t port] [-q frames] [-f devices]')
+        return
+    try:
+        asyncio.run(serve(udp_port, tcp_port, queue, fleet))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,498 @@
+# magcal.py Magnetometer calibration for sensor fusion.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# The calibrate methods of fusion.py and fusion_async.py estimate hard iron
+# offsets from the per-axis maxima and minima of the magnetometer readings.
+# Soft iron distortion, which turns the sphere of readings into an ellipsoid,
+# is ignored. An Ellipsoid instance passed to calibrate fits a general
+# ellipsoid to the readings, producing a bias vector and a 3x3 correction
+# matrix which maps the ellipsoid onto a sphere. The fit is incremental: each
+# reading updates the sums of a least squares problem held in preallocated
+# arrays so memory use does not grow with the number of readings.
+# Usage:
+# fuse.calibrate(imu.mag.xyz, sw, 100, Ellipsoid())
+# Thereafter fuse.magbias holds the bias and fuse.magcorr the matrix.
+
+from array import array
+from math import sqrt
+from fusion import _FLOAT
+
+# Solve a x = b in place by Gaussian elimination with partial pivoting. a is a
+# list of n rows. Returns x or None if a is singular.
+def _solve(a, b):
+    n = len(b)
+    for c in range(n):
+        p = c
+        for r in range(c + 1, n):
+            if abs(a[r][c]) > abs(a[p][c]):
+                p = r
+        if abs(a[p][c]) < 1e-12:
+            return None
+        a[c], a[p] = a[p], a[c]
+        b[c], b[p] = b[p], b[c]
+        for r in range(c + 1, n):
+            f = a[r][c] / a[c][c]
+            if f:
+                for k in range(c, n):
+                    a[r][k] -= f * a[c][k]
+                b[r] -= f * b[c]
+    x = [0] * n
+    for r in range(n - 1, -1, -1):
+        s = b[r]
+        for k in range(r + 1, n):
+            s -= a[r][k] * x[k]
+        x[r] = s / a[r][r]
+    return x
+
+# Eigen decomposition of a symmetric 3x3 matrix by the Jacobi method. Returns
+# eigenvalues and a matrix whose columns are the eigenvectors.
+def _eigen(m):
+    a = [row[:] for row in m]
+    v = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+    for _ in range(20):
+        off = a[0][1] ** 2 + a[0][2] ** 2 + a[1][2] ** 2
+        if off < 1e-20:
+            break
+        for p, q in ((0, 1), (0, 2), (1, 2)):
+            if a[p][q] == 0:
+                continue
+            theta = (a[q][q] - a[p][p]) / (2 * a[p][q])
+            t = (1 if theta >= 0 else -1) / (abs(theta) + sqrt(theta * theta + 1))
+            c = 1 / sqrt(t * t + 1)
+            s = t * c
+            for k in range(3):  # a = a J
+                akp = a[k][p]
+                akq = a[k][q]
+                a[k][p] = c * akp - s * akq
+                a[k][q] = s * akp + c * akq
+            for k in range(3):  # a = J' a
+                apk = a[p][k]
+                aqk = a[q][k]
+                a[p][k] = c * apk - s * aqk
+                a[q][k] = s * apk + c * aqk
+            for k in range(3):
+                vkp = v[k][p]
+                vkq = v[k][q]
+                v[k][p] = c * vkp - s * vkq
+                v[k][q] = s * vkp + c * vkq
+    return [a[0][0], a[1][1], a[2][2]], v
+
+# Least squares fit of the quadric
+# A x² + B y² + C z² + 2D xy + 2E xz + 2F yz + 2G x + 2H y + 2I z = 1
+# Readings are scaled by the reciprocal of the magnitude of the first so that
+# the sums are of order 1 per reading, which matters with single precision
+# floats.
+class Ellipsoid:
+    def __init__(self):
+        self._d = array(_FLOAT, (0 for _ in range(9)))  # Terms of the current reading
+        self._ata = array(_FLOAT, (0 for _ in range(45)))  # Upper triangle of sum(d d')
+        self._atb = array(_FLOAT, (0 for _ in range(9)))  # sum(d)
+        self.reset()
+
+    def reset(self):
+        for a in (self._ata, self._atb):
+            for i in range(len(a)):
+                a[i] = 0
+        self.n = 0
+        self.scale = 0
+        self.bias = None  # Results of a successful fit
+        self.matrix = None
+        self.radius = 0  # Mean radius of the ellipsoid: field strength in sensor units
+        self.residual = 0  # RMS deviation of readings from the ellipsoid as a fraction of radius
+
+    def add(self, xyz):
+        x, y, z = xyz
+        if not self.scale:
+            norm = sqrt(x * x + y * y + z * z)
+            if norm == 0:
+                return
+            self.scale = 1 / norm
+        s = self.scale
+        x *= s
+        y *= s
+        z *= s
+        d = self._d
+        d[0] = x * x
+        d[1] = y * y
+        d[2] = z * z
+        d[3] = 2 * x * y
+        d[4] = 2 * x * z
+        d[5] = 2 * y * z
+        d[6] = 2 * x
+        d[7] = 2 * y
+        d[8] = 2 * z
+        ata = self._ata
+        atb = self._atb
+        k = 0
+        for i in range(9):
+            di = d[i]
+            for j in range(i, 9):
+                ata[k] += di * d[j]
+                k += 1
+            atb[i] += di
+        self.n += 1
+
+    # Compute the bias and correction matrix. Returns False if the readings do
+    # not determine an ellipsoid, e.g. because the sensor was not rotated
+    # about all three axes.
+    def solve(self):
+        self.bias = None
+        self.matrix = None
+        self.residual = 0
+        if self.n < 9:
+            return False
+        ata = self._ata
+        a = [[0] * 9 for _ in range(9)]
+        k = 0
+        for i in range(9):
+            for j in range(i, 9):
+                a[i][j] = a[j][i] = ata[k]
+                k += 1
+        p = _solve(a, list(self._atb))
+        if p is None:
+            return False
+        m = [[p[0], p[3], p[4]], [p[3], p[1], p[5]], [p[4], p[5], p[2]]]
+        # Centre c = -inv(m) v
+        c = _solve([row[:] for row in m], [-p[6], -p[7], -p[8]])
+        if c is None:
+            return False
+        # (u - c)' m (u - c) = 1 + c' m c. If the origin lies outside the
+        # ellipsoid m and k are negative.
+        k = 1 + sum(c[i] * m[i][j] * c[j] for i in range(3) for j in range(3))
+        if k == 0:
+            return False
+        # Residual. For each reading d.p - 1 = k(ρ² - 1) where ρ is its radius
+        # normalised to the ellipsoid. sum((d.p - 1)²) = p'Ap - 2p'b + n.
+        # Since ρ² - 1 ≈ 2(ρ - 1) the RMS radial error is sqrt(mean)/2|k|.
+        atb = self._atb
+        e = self.n
+        h = 0
+        for i in range(9):
+            e -= 2 * p[i] * atb[i]
+            for j in range(i, 9):
+                e += (1 if i == j else 2) * p[i] * ata[h] * p[j]
+                h += 1
+        residual = sqrt(max(e, 0) / self.n) / (2 * abs(k))
+        ev, v = _eigen([[x / k for x in row] for row in m])
+        if min(ev) <= 0:  # Not an ellipsoid
+            return False
+        # Symmetric square root of m / k maps the ellipsoid onto the unit
+        # sphere without rotating it. Scale by the geometric mean radius so
+        # that corrected readings retain their magnitude.
+        r = (ev[0] * ev[1] * ev[2]) ** (-1 / 6)
+        sq = [sqrt(e) * r for e in ev]
+        self.matrix = tuple(array(_FLOAT, (sum(v[i][n] * sq[n] * v[j][n] for n in range(3)) for j in range(3)))
+                            for i in range(3))
+        s = self.scale
+        self.bias = array(_FLOAT, (x / s for x in c))
+        self.radius = r / s
+        self.residual = residual
+        return True
+
+# Coverage-aware calibration. A Coverage instance wraps a fit (by default an
+# Ellipsoid) and is passed to calibrate as the fit arg. It records which of 24
+# direction bins (a cube map with 4 bins per face) have received readings,
+# measured from the centre of the range of readings so far. Each bin holds the
+# first reading to arrive in it. Until the unit has been turned through every
+# axis the centre moves: if it moves by more than 10% of the half range the
+# stored readings are redistributed among the bins. Once the fraction of bins
+# filled reaches coverage the fit is solved every check readings. When its
+# residual is below residual and its centre has moved by less than
+# residual * radius since the previous check, done() returns True and
+# calibration ends without a stopfunc. Readings identical to the previous one
+# (e.g. a magnetometer polled faster than its update rate) are dropped.
+# progress is the coverage from 0 to 1; if supplied, callback(progress) runs
+# when it changes.
+# Usage:
+# fuse.calibrate(imu.mag.xyz, None, 100, Coverage(callback=show))
+class Coverage:
+    def __init__(self, fit=None, coverage=0.5, residual=0.05, check=16, callback=None):
+        self.fit = Ellipsoid() if fit is None else fit
+        self.coverage = coverage
+        self.threshold = residual
+        self.check = check
+        self.callback = callback
+        self._min = array(_FLOAT, (0, 0, 0))
+        self._max = array(_FLOAT, (0, 0, 0))
+        self._last = array(_FLOAT, (0, 0, 0))
+        self._centre = array(_FLOAT, (0, 0, 0))  # Centre used for binning
+        self._prev = array(_FLOAT, (0, 0, 0))  # Centre of fit at previous check
+        self._store = array(_FLOAT, (0 for _ in range(72)))  # A reading per bin
+        self.reset()
+
+    def reset(self):
+        self.fit.reset()
+        self.n = 0  # Readings passed to the fit
+        self.dropped = 0  # Duplicate readings
+        self.bins = 0  # Bitmap of bins containing readings
+        self.filled = 0  # Number of bins containing readings
+        self.progress = 0
+        self._due = 0  # Readings before the next check of the fit
+        self._fitted = False  # A previous check produced a fit
+        self._done = False
+
+    def done(self):
+        return self._done
+
+    def add(self, xyz):
+        x, y, z = xyz
+        last = self._last
+        mn = self._min
+        mx = self._max
+        if self.n:
+            if x == last[0] and y == last[1] and z == last[2]:
+                self.dropped += 1
+                return
+        else:
+            for i in range(3):
+                mn[i] = mx[i] = xyz[i]
+        last[0] = x
+        last[1] = y
+        last[2] = z
+        self.fit.add(xyz)
+        self.n += 1
+        for i in range(3):
+            v = last[i]
+            if v < mn[i]:
+                mn[i] = v
+            elif v > mx[i]:
+                mx[i] = v
+        cx = (mn[0] + mx[0]) / 2
+        cy = (mn[1] + mx[1]) / 2
+        cz = (mn[2] + mx[2]) / 2
+        c = self._centre
+        d = (mx[0] - mn[0] + mx[1] - mn[1] + mx[2] - mn[2]) / 60  # 10% of mean half range
+        if (cx - c[0]) ** 2 + (cy - c[1]) ** 2 + (cz - c[2]) ** 2 > d * d:
+            c[0] = cx
+            c[1] = cy
+            c[2] = cz
+            self._rebin()
+        self._bin(x, y, z)
+        self._report(min(self.filled / (24 * self.coverage), 1))
+        if self.progress >= 1 and not self._done:
+            self._due -= 1
+            if self._due <= 0:
+                self._due = self.check
+                self._evaluate()
+
+    def _bin(self, x, y, z):  # Store a reading if its bin is empty
+        c = self._centre
+        dx = x - c[0]
+        dy = y - c[1]
+        dz = z - c[2]
+        ax = abs(dx)
+        ay = abs(dy)
+        az = abs(dz)
+        if ax >= ay and ax >= az:
+            b = 0 if dx > 0 else 4
+            u = dy
+            v = dz
+        elif ay >= az:
+            b = 8 if dy > 0 else 12
+            u = dx
+            v = dz
+        else:
+            b = 16 if dz > 0 else 20
+            u = dx
+            v = dy
+        b += (2 if u > 0 else 0) + (1 if v > 0 else 0)
+        if not self.bins & (1 << b):
+            self.bins |= 1 << b
+            self.filled += 1
+            s = self._store
+            s[3 * b] = x
+            s[3 * b + 1] = y
+            s[3 * b + 2] = z
+
+    def _rebin(self):
+        s = self._store
+        old = [(s[3 * b], s[3 * b + 1], s[3 * b + 2]) for b in range(24) if self.bins & (1 << b)]
+        self.bins = 0
+        self.filled = 0
+        for v in old:
+            self._bin(*v)
+
+    def _evaluate(self):
+        fit = self.fit
+        prev = self._prev
+        if not fit.solve():
+            self._fitted = False
+            return
+        b = fit.bias
+        d = (b[0] - prev[0]) ** 2 + (b[1] - prev[1]) ** 2 + (b[2] - prev[2]) ** 2
+        t = self.threshold
+        self._done = self._fitted and fit.residual <= t and d <= (t * fit.radius) ** 2
+        for i in range(3):
+            prev[i] = b[i]
+        self._fitted = True
+
+    def _report(self, progress):
+        if progress != self.progress:
+            self.progress = progress
+            if self.callback is not None:
+                self.callback(progress)
+
+    def solve(self):
+        return self.fit.solve()
+
+    @property
+    def bias(self):
+        return self.fit.bias
+
+    @property
+    def matrix(self):
+        return self.fit.matrix
+
+    @property
+    def radius(self):
+        return self.fit.radius
+
+    @property
+    def residual(self):
+        return self.fit.residual
+
+# Background bias tracking. A Tracker attached to a Fusion instance
+# (fuse.magtrack = Tracker()) refines magbias from the readings passed to
+# update(), so a device may start without a calibration phase and will follow
+# slow changes in the local field. A reading is accepted only if it differs
+# from the previously accepted one by more than spacing * radius: a stationary
+# device adds nothing. Accepted readings are held in a reservoir of the most
+# recent size readings, over which a sphere is fitted by least squares. The
+# sums of the fit are updated recursively as readings enter and leave the
+# reservoir. Once the reservoir is full each accepted reading moves magbias a
+# fraction gain of the way towards the fitted centre, provided the readings
+# span at least spread * radius on each axis. A new magbias array is assigned
+# on each move. If magcorr is set the fit is performed on corrected readings.
+class Tracker:
+    def __init__(self, size=32, spacing=0.25, gain=0.1, spread=0.2):
+        self.size = size
+        self.spacing = spacing
+        self.gain = gain
+        self.spread = spread
+        self._buf = array(_FLOAT, (0 for _ in range(3 * size)))  # Reservoir
+        self._sums = array(_FLOAT, (0 for _ in range(14)))  # Least squares sums
+        self._origin = array(_FLOAT, (0, 0, 0))  # Readings are relative to this
+        self._last = array(_FLOAT, (0, 0, 0))  # Last accepted reading
+        self.reset()
+
+    def reset(self):
+        self.n = 0  # Readings in the reservoir
+        self.accepted = 0
+        self.updates = 0  # Number of bias updates
+        self.radius = 0  # Field strength in sensor units
+        self._head = 0
+
+    def add(self, fuse, mag):
+        x, y, z = mag
+        w = fuse.magcorr
+        if w is not None:
+            x, y, z = (r[0] * x + r[1] * y + r[2] * z for r in w)
+        last = self._last
+        if self.n:
+            dx = x - last[0]
+            dy = y - last[1]
+            dz = z - last[2]
+            d = self.spacing * self.radius
+            if dx * dx + dy * dy + dz * dz < d * d:
+                return
+        else:  # Initial estimate of radius
+            self._rebase(fuse)
+            o = self._origin
+            self.radius = sqrt((x - o[0]) ** 2 + (y - o[1]) ** 2 + (z - o[2]) ** 2)
+            if self.radius == 0:
+                return
+        last[0] = x
+        last[1] = y
+        last[2] = z
+        buf = self._buf
+        i = 3 * self._head
+        if self.n == self.size:  # Remove the oldest reading
+            self._sum(buf[i], buf[i + 1], buf[i + 2], -1)
+        else:
+            self.n += 1
+        buf[i] = x
+        buf[i + 1] = y
+        buf[i + 2] = z
+        self._sum(x, y, z, 1)
+        self._head = (self._head + 1) % self.size
+        self.accepted += 1
+        if self.n == self.size:
+            self._fit(fuse)
+        if not self.accepted % self.size:  # Limit accumulation of rounding errors
+            self._rebase(fuse)
+
+    # Set the origin to the current bias and recompute the sums.
+    def _rebase(self, fuse):
+        b = fuse.magbias
+        w = fuse.magcorr
+        o = self._origin
+        for i in range(3):
+            o[i] = b[i] if w is None else w[i][0] * b[0] + w[i][1] * b[1] + w[i][2] * b[2]
+        s = self._sums
+        for i in range(len(s)):
+            s[i] = 0
+        buf = self._buf
+        for i in range(self.n):
+            self._sum(buf[3 * i], buf[3 * i + 1], buf[3 * i + 2], 1)
+
+    def _sum(self, x, y, z, sign):
+        o = self._origin
+        x -= o[0]
+        y -= o[1]
+        z -= o[2]
+        t = (x * x + y * y + z * z) * sign
+        s = self._sums
+        s[0] += x * x * sign
+        s[1] += x * y * sign
+        s[2] += x * z * sign
+        s[3] += x * sign
+        s[4] += y * y * sign
+        s[5] += y * z * sign
+        s[6] += y * sign
+        s[7] += z * z * sign
+        s[8] += z * sign
+        s[9] += sign
+        s[10] += x * t
+        s[11] += y * t
+        s[12] += z * t
+        s[13] += t
+
+    # Sphere |v - c|² = r² is linear in the form 2c.v + r² - |c|² = |v|²
+    def _fit(self, fuse):
+        s = self._sums
+        a = [[s[0], s[1], s[2], s[3]],
+             [s[1], s[4], s[5], s[6]],
+             [s[2], s[5], s[7], s[8]],
+             [s[3], s[6], s[8], s[9]]]
+        p = _solve(a, [s[10], s[11], s[12], s[13]])
+        if p is None:
+            return
+        o = self._origin
+        c = [p[i] / 2 + o[i] for i in range(3)]
+        r2 = p[3] + (p[0] * p[0] + p[1] * p[1] + p[2] * p[2]) / 4
+        if r2 <= 0:
+            return
+        r = sqrt(r2)
+        # Check coverage. If the readings lie close to a plane (rotation about
+        # one axis) the centre is poorly determined. The smallest eigenvalue
+        # of their covariance is the variance normal to the best fit plane.
+        n = s[9]
+        mx = s[3] / n
+        my = s[6] / n
+        mz = s[8] / n
+        ev, _ = _eigen([[s[0] / n - mx * mx, s[1] / n - mx * my, s[2] / n - mx * mz],
+                        [s[1] / n - mx * my, s[4] / n - my * my, s[5] / n - my * mz],
+                        [s[2] / n - mx * mz, s[5] / n - my * mz, s[7] / n - mz * mz]])
+        if min(ev) < (self.spread * r) ** 2:
+            return
+        w = fuse.magcorr
+        if w is not None:  # Map centre to the sensor frame
+            c = _solve([list(row) for row in w], c)
+            if c is None:
+                return
+        b = fuse.magbias  # May be a tuple or shared: assign a new array
+        g = self.gain
+        fuse.magbias = array(_FLOAT, (b[i] + g * (c[i] - b[i]) for i in range(3)))
+        self.radius = r
+        self.updates += 1
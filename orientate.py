@@ -40,3 +40,21 @@ def transpose(idx, vectors):# transpose axes in a list of vectors
 
 def orientate(t, i, *vecs):
     return invert(i, transpose(t, vecs))
+
+# Precomputed orientation. Equivalent to orientate(t, i, ...) but the
+# permutation and signs are derived once. May be attached to a Fusion instance
+# (fuse.orientation = Orientation(T, I)) whereupon the update methods remap the
+# raw sensor vectors without allocation. Typical invocation:
+# fuse.orientation = Orientation(T, I)
+# fuse.update(imu.get_accel(), imu.get_gyro(), imu.get_mag())
+class Orientation:
+    def __init__(self, t=(0, 1, 2), i=(False, False, False)):
+        if sorted(t) != [0, 1, 2]:
+            raise ValueError('t must be a permutation of (0, 1, 2)')
+        self.t = tuple(t)
+        self.s = tuple(-1.0 if x else 1.0 for x in i)
+
+    def remap(self, v):  # Return a remapped vector (x, y, z)
+        t0, t1, t2 = self.t
+        s0, s1, s2 = self.s
+        return (s0 * v[t0], s1 * v[t1], s2 * v[t2])
@@ -0,0 +1,201 @@
+# pipeline.py Streaming sample -> attitude processing for sensor fusion.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# A pipeline comprises a source of records followed by a chain of stages, each
+# a generator taking an iterator of records. Records are processed one at a
+# time so arbitrarily long streams run in constant memory. A record is in the
+# form accepted by the Fusion update methods e.g.
+# [[ax, ay, az], [gx, gy, gz], [mx, my, mz], timestamp]
+# Markers in the stream (e.g. 'cal_end') are passed through by stages which do
+# not act on them. Stages pass the record object downstream: those which alter
+# vectors yield a new record (a list), so records may be tuples and a record
+# held elsewhere is not modified.
+# Typical usage:
+# fuse = Fusion(TimeDiff)
+# p = Pipeline(source('mpudata'), calibrate(fuse), fusion(fuse), decimate(25))
+# p.run(lambda rec : print(fuse.heading, fuse.pitch, fuse.roll))
+# print(p.stats())
+# Stages are evaluated lazily so when a record emerges from the pipeline the
+# Fusion instance holds the state resulting from that record.
+
+try:
+    import utime as time
+except ImportError:
+    import time
+from orientate import Orientation
+
+if hasattr(time, 'ticks_us'):
+    _ticks_us = time.ticks_us
+    _ticks_diff = time.ticks_diff
+else:
+    _ticks_us = lambda : int(time.perf_counter() * 1000000)
+    _ticks_diff = lambda end, start : end - start
+
+def _is_sample(rec):
+    return not isinstance(rec, (str, int))
+
+def _nvec(rec):  # Number of vectors in a record: 2 (6DOF) or 3 (9DOF)
+    return 3 if len(rec) > 2 and not isinstance(rec[2], (int, float)) else 2
+
+# Sources.
+# src may be a filename or an iterable of records. A file may be in JSON lines
+# format as in remote/mpudata or, if the name ends in .bin, in the binary
+# format of capfile.py.
+def source(src):
+    if not isinstance(src, str):
+        for rec in src:
+            yield rec
+    elif src.endswith('.bin'):
+        import capfile
+        with capfile.Reader(src) as r:
+            for rec in r:
+                yield rec
+    else:
+        try:
+            import ujson as json
+        except ImportError:
+            import json
+        with open(src, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('['):
+                    yield json.loads(line)
+                elif line:
+                    yield line  # Marker
+
+# Stages. Each function returns a stage: a generator function taking an
+# iterator of records.
+
+# Magnetometer calibration. Records up to the marker are consumed by
+# fuse.calibrate(), which sets fuse.magbias. The marker is discarded and
+# subsequent records are passed through. fit is as for fuse.calibrate().
+def calibrate(fuse, marker='cal_end', fit=None):
+    def stage(records):
+        it = iter(records)
+        nxt = [next(it, marker)]  # Lookahead detects the marker
+        def getxyz():
+            rec = nxt[0]
+            nxt[0] = next(it, marker)
+            return rec[2]
+        if nxt[0] != marker:
+            fuse.calibrate(getxyz, lambda : nxt[0] == marker, 0, fit)
+        for rec in it:
+            yield rec
+    return stage
+
+# Subtract fixed offsets from accel and/or gyro vectors, e.g. a gyro zero rate
+# bias.
+def bias(accel=None, gyro=None):
+    def stage(records):
+        for rec in records:
+            if _is_sample(rec):
+                rec = list(rec)
+                if accel is not None:
+                    v = rec[0]
+                    rec[0] = (v[0] - accel[0], v[1] - accel[1], v[2] - accel[2])
+                if gyro is not None:
+                    v = rec[1]
+                    rec[1] = (v[0] - gyro[0], v[1] - gyro[1], v[2] - gyro[2])
+            yield rec
+    return stage
+
+# Axis remapping: t and i are as for orientate.orientate(). An alternative is
+# to attach an Orientation to the Fusion instance.
+def remap(t, i):
+    o = Orientation(t, i)
+    def stage(records):
+        for rec in records:
+            if _is_sample(rec):
+                rec = list(rec)
+                for n in range(_nvec(rec)):
+                    if rec[n] is not None:  # Mag may be absent
+                        rec[n] = o.remap(rec[n])
+            yield rec
+    return stage
+
+# Fusion. Each sample updates fuse using update or update_nomag depending on
+# the number of vectors in the record. A 9DOF record may end with the
+# timestamp of the mag reading, mts (see Fusion.update).
+def fusion(fuse):
+    def stage(records):
+        update = fuse.update
+        update_nomag = fuse.update_nomag
+        for rec in records:
+            if _is_sample(rec):
+                n = _nvec(rec)
+                ts = rec[n] if len(rec) > n else None
+                if n == 3:
+                    update(rec[0], rec[1], rec[2], ts, rec[4] if len(rec) > 4 else None)
+                else:
+                    update_nomag(rec[0], rec[1], ts)
+            yield rec
+    return stage
+
+# Restore timestamp order to records received over a link, discarding
+# duplicates and late records. buf is a reorder.Reorder instance. A marker
+# releases the records held before it is passed on.
+def reorder(buf):
+    def stage(records):
+        for rec in records:
+            if _is_sample(rec):
+                buf.put(rec)
+                for x in buf.ready():
+                    yield x
+            else:
+                for x in buf.ready(True):
+                    yield x
+                yield rec
+        for x in buf.ready(True):
+            yield x
+    return stage
+
+# Pass every nth sample.
+def decimate(n):
+    def stage(records):
+        count = 0
+        for rec in records:
+            if _is_sample(rec):
+                count += 1
+                if count < n:
+                    continue
+                count = 0
+            yield rec
+    return stage
+
+class Pipeline:
+    def __init__(self, src, *stages):
+        self.src = src
+        self.stages = stages
+        self.count = 0      # Records read from the source
+        self.out = 0        # Records emerging from the pipeline
+        self.elapsed = 0    # μs
+
+    def _counter(self):
+        for rec in self.src:
+            self.count += 1
+            yield rec
+
+    def __iter__(self):
+        it = self._counter()
+        for stage in self.stages:
+            it = stage(it)
+        return it
+
+    # Run the pipeline to completion. sink, if supplied, is called with each
+    # record emerging from the pipeline. Returns the number of such records.
+    def run(self, sink=None):
+        start = _ticks_us()
+        try:
+            for rec in self:
+                self.out += 1
+                if sink is not None:
+                    sink(rec)
+        finally:
+            self.elapsed += _ticks_diff(_ticks_us(), start)
+        return self.out
+
+    def stats(self):
+        secs = self.elapsed / 1000000
+        return {'records': self.count, 'out': self.out, 'seconds': secs,
+                'rate': self.count / secs if secs else 0}
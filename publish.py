@@ -0,0 +1,168 @@
+# publish.py Publication of the attitude in shared memory.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython 3.8 or later (requires multiprocessing.shared_memory).
+# A Publisher writes the attitude of a Fusion instance to a named block of
+# shared memory after each update. Any number of processes may attach a Reader
+# to the block by name and read consistent snapshots without locks or system
+# calls. Block layout, little-endian:
+# b'FA', version (uint8), 5 bytes padding, sequence number (uint64), then
+# doubles: timestamp, w, x, y, z, heading, pitch, roll.
+# Consistency is ensured by a seqlock. The writer makes the sequence number odd
+# while it writes the data and even when it has finished. A reader retries if
+# the number is odd or changes while it reads. Readers never block the writer.
+# This relies on stores becoming visible to other cores in program order, as
+# on x86. On weakly ordered architectures (e.g. ARM) a torn read is improbable
+# but not excluded.
+
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+MAGIC = b'FA'
+VERSION = 1
+_HEADER = struct.Struct('<2sB5x')
+_SEQ = struct.Struct('<Q')
+_DATA = struct.Struct('<8d')
+_SEQ_OFFS = _HEADER.size
+_DATA_OFFS = _SEQ_OFFS + _SEQ.size
+_SNAPSHOT = struct.Struct('<Q8d')  # Sequence number and data
+SIZE = _DATA_OFFS + _DATA.size  # 80 bytes
+_NAN = float('nan')
+
+# Creates a block named name, or with a generated name if None. Unless auto is
+# False the update methods of fuse are wrapped so that each update publishes
+# the result: any stats should be enabled beforehand. If auto is False the
+# application calls publish().
+class Publisher:
+    def __init__(self, fuse, name=None, auto=True):
+        self.fuse = fuse
+        self._shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+        _HEADER.pack_into(self._buf, 0, MAGIC, VERSION)
+        self.seq = 0
+        self._wrapped = False
+        if auto:
+            self._wrap()
+
+    def _wrap(self):
+        fuse = self.fuse
+        update = fuse.update  # May be instrumented by fusion_stats
+        update_nomag = fuse.update_nomag
+        update_batch = fuse.update_batch
+        update_nomag_batch = fuse.update_nomag_batch
+        publish = self.publish
+
+        def upd(accel, gyro, mag, ts=None, mts=None):
+            update(accel, gyro, mag, ts, mts)
+            publish(ts)
+
+        def upd_nomag(accel, gyro, ts=None):
+            update_nomag(accel, gyro, ts)
+            publish(ts)
+
+        def batch(accel, gyro, mag, ts):  # Publish the final state
+            update_batch(accel, gyro, mag, ts)
+            publish(ts[-1] if len(ts) else None)
+
+        def batch_nomag(accel, gyro, ts):
+            update_nomag_batch(accel, gyro, ts)
+            publish(ts[-1] if len(ts) else None)
+
+        fuse.update = upd
+        fuse.update_nomag = upd_nomag
+        fuse.update_batch = batch
+        fuse.update_nomag_batch = batch_nomag
+        self._wrapped = (update, update_nomag, update_batch, update_nomag_batch)
+
+    # Write the current attitude. ts is the timestamp of the sample (NaN if
+    # None).
+    def publish(self, ts=None):
+        fuse = self.fuse
+        q = fuse.q
+        heading = fuse.heading  # Compute angles before the write starts
+        pitch = fuse.pitch
+        roll = fuse.roll
+        buf = self._buf
+        seq = self.seq + 1
+        _SEQ.pack_into(buf, _SEQ_OFFS, seq)  # Odd: write in progress
+        _DATA.pack_into(buf, _DATA_OFFS, _NAN if ts is None else ts, q[0], q[1], q[2], q[3], heading, pitch, roll)
+        seq += 1
+        _SEQ.pack_into(buf, _SEQ_OFFS, seq)
+        self.seq = seq
+
+    # Restore the update methods and remove the block. Attached readers
+    # retain access until they close.
+    def close(self):
+        if self._wrapped:
+            fuse = self.fuse
+            fuse.update, fuse.update_nomag, fuse.update_batch, fuse.update_nomag_batch = self._wrapped
+            for attr in ('update', 'update_nomag', 'update_batch', 'update_nomag_batch'):
+                if getattr(fuse, attr) == getattr(type(fuse), attr).__get__(fuse):
+                    delattr(fuse, attr)  # Was not wrapped by anything else
+            self._wrapped = False
+        if self._buf is not None:
+            self._buf = None
+            self._shm.close()
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+# Attaches to the block of a Publisher in this or another process.
+class Reader:
+    def __init__(self, name):
+        try:
+            self._shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:  # Before 3.13 attaching registers the block for removal at exit
+            self._shm = shared_memory.SharedMemory(name)
+            if os.name == 'posix':
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._buf = self._shm.buf
+        if self._shm.size < SIZE or _HEADER.unpack_from(self._buf, 0) != (MAGIC, VERSION):
+            self.close()
+            raise ValueError('{} is not an attitude block'.format(name))
+        self.retries = 0  # Reads repeated because a write was in progress
+
+    # Return (seq, ts, w, x, y, z, heading, pitch, roll), or None if nothing
+    # has been published or no consistent snapshot was obtained in retries
+    # attempts. seq increases by 2 with each update.
+    def read(self, retries=100):
+        buf = self._buf
+        for _ in range(retries):
+            data = _SNAPSHOT.unpack_from(buf, _SEQ_OFFS)
+            seq = data[0]
+            if not seq & 1 and _SEQ.unpack_from(buf, _SEQ_OFFS)[0] == seq:
+                return data if seq else None
+            self.retries += 1
+        return None
+
+    # Wait for an update later than seq (as returned by read), polling every
+    # interval seconds. Returns the snapshot, or None on timeout (s).
+    def wait(self, seq=0, timeout=None, interval=0.0005):
+        start = time.monotonic()
+        while True:
+            data = self.read()
+            if data is not None and data[0] != seq:
+                return data
+            if timeout is not None and time.monotonic() - start >= timeout:
+                return None
+            time.sleep(interval)
+
+    def close(self):
+        if self._buf is not None:
+            self._buf = None
+            self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -7,6 +7,8 @@
 # uasyncio V3 (Included in daily builds and release builds later than V1.12).
 # MPU9150 on X position
 # Normally open pushbutton connected between pin Y7 and ground
+# From this repo: deltat.py fusion.py fusion_async.py capfile.py
+# Data is written in the binary format of capfile.py: see remote/README.md.
 # LCD driver alcd.py uasyncio V3 version from
 # https://github.com/peterhinch/micropython-async/blob/master/v3/as_drivers/hd44780/alcd.py
 # Hitachi HD44780 2 row LCD display wired using 4 bit data bus as follows:
@@ -21,11 +23,11 @@
 
 from machine import Pin
 import uasyncio as asyncio
-import ujson
 import utime as time
 import gc
 from mpu9150 import MPU9150
 from fusion_async import Fusion # Using async version
+import capfile                  # Binary capture file format
 from alcd import LCD, PINLIST   # Library supporting Hitachi LCD module
 
 switch = Pin('Y7', Pin.IN, pull=Pin.PULL_UP) # Switch to ground on Y7
@@ -34,14 +36,14 @@ imu = MPU9150('X')              # Attached to 'X' bus, 1 device, disable interru
 
 lcd = LCD(PINLIST, cols = 24)   # Should work with 16 column LCD
 
-f = open('/sd/mpudata', 'w')
+f = capfile.Writer(open('/sd/mpudata.bin', 'wb'))
 
 async def read_coro():
     imu.mag_trigger()
     await asyncio.sleep_ms(20)  # Plenty of time for mag to be ready
-    f.write(ujson.dumps([imu.accel.xyz, imu.gyro.xyz, imu.mag_nonblocking.xyz, time.ticks_us()]))
-    f.write('\n')
-    return imu.accel.xyz, imu.gyro.xyz, imu.mag_nonblocking.xyz
+    accel, gyro, mag = imu.accel.xyz, imu.gyro.xyz, imu.mag_nonblocking.xyz
+    f.sample(accel, gyro, mag, time.ticks_us())
+    return accel, gyro, mag
 
 fuse = Fusion(read_coro)
 
@@ -66,7 +68,7 @@ async def lcd_task():
         lcd[1] = "when done"
         await asyncio.sleep_ms(100)  # Let LCD coro run
         await fuse.calibrate(lambda : not switch.value())
-        f.write('cal_end\n')
+        f.marker(capfile.CAL_END)
         print(fuse.magbias)
     print('Turn switch off to close the file and terminate.')
     await fuse.start()  # Start the update task
@@ -8,10 +8,6 @@
 # uasyncio V3 (Included in daily builds and release builds later than V1.12).
 # Run under MicroPython on Unix or other target, or CPython 3.8 or later
 
-try:
-    import utime as time
-except ImportError:
-    import time
 try:
     import ujson as json
 except ImportError:
@@ -21,7 +17,7 @@ try:
 except ImportError:
     import asyncio
 
-from deltat import is_micropython
+from deltat import TimeDiff
 from fusion_async import Fusion
 
 intro = '''
@@ -76,14 +72,8 @@ class GetData:
 
 get_data = GetData()
 
-# Test of supplying a timediff
-if is_micropython:
-    def TimeDiff(start, end):
-        return time.ticks_diff(start, end)/1000000
-else:  # Cpython cheat: test data does not roll over
-    def TimeDiff(start, end):
-        return (start - end)/1000000
-
+# Timestamps are ticks_us() values from the capturing device. TimeDiff
+# handles their rollover under MicroPython or CPython.
 fuse = Fusion(get_data.read, TimeDiff)
 
 async def display():
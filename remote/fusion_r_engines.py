@@ -0,0 +1,63 @@
+# fusion_r_engines.py Test for the alternative engines using captured data mpudata
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+# Run under CPython 3.5 or later from this directory.
+
+# Each engine is constructed with timediff passed by position and by keyword
+# and both instances replay the dataset: their quaternions must be identical.
+# FixedFusion is tested in the same way on the data converted to integers.
+# The asynchronous variants are constructed with timediff passed by keyword.
+# The program exits with status 1 on failure.
+
+import sys
+import json
+from deltat import TimeDiff
+from fusion_engines import Mahony, Complementary
+from fusion_fixed import FixedFusion
+import fusion_async_engines
+import fusion_async_fixed
+
+def load():
+    cal = []
+    data = []
+    dest = cal
+    with open('mpudata', 'r') as f:
+        for line in f:
+            if line.strip() == 'cal_end':
+                dest = data
+            else:
+                dest.append(json.loads(line))
+    return cal, data
+
+async def read_coro():
+    return (0, 0, 1), (0, 0, 0), (1, 0, 0), 0
+
+def main():
+    _, data = load()
+    fail = False
+    idata = [[[int(round(x * k)) for x in r[i]] for i, k in enumerate((4096, 131, 100))] + [r[3]] for r in data]
+    for cls in (Mahony, Complementary, FixedFusion):
+        if cls is FixedFusion:
+            a = cls(TimeDiff, gscale=1 / 131)
+            b = cls(timediff=TimeDiff, gscale=1 / 131)
+        else:
+            a = cls(TimeDiff)
+            b = cls(timediff=TimeDiff)
+        err = 0.0
+        for r in (idata if cls is FixedFusion else data):
+            a.update(r[0], r[1], r[2], r[3])
+            b.update(r[0], r[1], r[2], r[3])
+            err = max(err, max(abs(x - y) for x, y in zip(a.q, b.q)))
+        ok = err == 0 and b.deltat.timediff is TimeDiff
+        print('{:14s} heading {:8.3f} pitch {:8.3f} roll {:8.3f} {}'.format(
+              cls.__name__, b.heading, b.pitch, b.roll, 'PASS' if ok else 'FAIL'))
+        fail |= not ok
+    for cls in (fusion_async_engines.Mahony, fusion_async_engines.Complementary, fusion_async_fixed.FixedFusion):
+        fuse = cls(read_coro, timediff=TimeDiff)
+        ok = fuse.deltat.timediff is TimeDiff and fuse.read_coro is read_coro
+        print('async {:8s} {}'.format(cls.__name__, 'PASS' if ok else 'FAIL'))
+        fail |= not ok
+    if fail:
+        sys.exit(1)
+
+main()
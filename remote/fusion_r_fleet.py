@@ -0,0 +1,80 @@
+# fusion_r_fleet.py Test for FusionFleet using captured data mpudata
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+# Run under CPython 3.4 or later with numpy installed, from this directory.
+
+# A fleet of devices replays the dataset, each with timestamps offset so that
+# its ticks_us() values roll over at a different point in the data. The fleet
+# uses deltat.TimeDiff. Each device is also fused by its own Fusion instance
+# and the quaternions are compared. A sample with a zero accel vector must be
+# skipped. The program exits with status 1 on failure.
+
+import sys
+import json
+import numpy as np
+from fusion import Fusion
+from fusion_fleet import FusionFleet
+from deltat import TimeDiff, TICKS_PERIOD
+
+DEVICES = 4
+TOLERANCE = 1e-9
+
+def load():
+    cal = []
+    data = []
+    dest = cal
+    with open('mpudata', 'r') as f:
+        for line in f:
+            if line.strip() == 'cal_end':
+                dest = data
+            else:
+                dest.append(json.loads(line))
+    return cal, data
+
+def magbias(cal):
+    mag = np.array([r[2] for r in cal])
+    return (mag.max(0) + mag.min(0)) / 2
+
+def main():
+    cal, data = load()
+    accel = np.array([r[0] for r in data])
+    gyro = np.array([r[1] for r in data])
+    mag = np.array([r[2] for r in data])
+    ts = np.array([r[3] for r in data], dtype=np.int64)
+    # Device d rolls over after a fraction d / DEVICES of the data.
+    roll = [int(ts[len(ts) * d // DEVICES]) for d in range(DEVICES)]
+    stamps = [(ts - r + TICKS_PERIOD) % TICKS_PERIOD for r in roll]
+    bias = magbias(cal)
+    fleet = FusionFleet(DEVICES, TimeDiff)
+    fleet.magbias[:] = bias
+    fuses = []
+    for _ in range(DEVICES):
+        fuse = Fusion(TimeDiff)
+        for i in range(3):
+            fuse.magbias[i] = bias[i]
+        fuses.append(fuse)
+    err = 0.0
+    for n in range(len(data)):
+        t = np.array([s[n] for s in stamps])
+        fleet.update(None, np.tile(accel[n], (DEVICES, 1)), np.tile(gyro[n], (DEVICES, 1)),
+                     np.tile(mag[n], (DEVICES, 1)), t)
+        for d, fuse in enumerate(fuses):
+            fuse.update(data[n][0], data[n][1], data[n][2], int(t[d]))
+            err = max(err, float(np.abs(fleet.q[d] - np.array(fuse.q)).max()))
+    print('{} devices, {} samples, timestamps rolling over at {}.'.format(DEVICES, len(data), TICKS_PERIOD))
+    print('Heading    Pitch    Roll')
+    for d in range(DEVICES):
+        print('{:8.3f} {:8.3f} {:8.3f}'.format(fleet.heading[d], fleet.pitch[d], fleet.roll[d]))
+    print('Maximum difference from Fusion: {:.3g}'.format(err))
+    # A sample with a zero accel vector is skipped and its device not returned.
+    zero = np.tile(accel[-1], (DEVICES, 1))
+    zero[1] = 0
+    done = fleet.update(None, zero, np.tile(gyro[-1], (DEVICES, 1)), np.tile(mag[-1], (DEVICES, 1)), t + 1000)
+    skip = done.tolist() != [d for d in range(DEVICES) if d != 1]
+    print('Devices updated with a zero sample: {}'.format(done.tolist()))
+    if err > TOLERANCE or skip:
+        print('FAIL')
+        sys.exit(1)
+    print('PASS')
+
+main()
@@ -0,0 +1,26 @@
+# fusion_r_pipe.py Test for sensor fusion remote device using a pipeline
+# simulated by captured data mpudata
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+# Run under MicroPython on Unix or other target, or CPython 3.4 or later
+
+# As fusion_r_syn.py but composing the data source, calibration, fusion and
+# display from pipeline stages. The data file may be in JSON lines format or
+# converted to binary with capfile.py.
+
+import sys
+from fusion import Fusion
+from pipeline import Pipeline, source, calibrate, fusion, decimate
+from deltat import TimeDiff  # Timestamps are ticks_us() values
+
+fuse = Fusion(TimeDiff)
+
+def show(rec):
+    print("{:8.3f} {:8.3f} {:8.3f}".format(fuse.heading, fuse.pitch, fuse.roll))
+
+fn = sys.argv[1] if len(sys.argv) > 1 else 'mpudata'
+p = Pipeline(source(fn), calibrate(fuse), fusion(fuse), decimate(25))
+print('Heading    Pitch    Roll')
+p.run(show)
+print('Magnetometer bias vector:', fuse.magbias)
+print('Processed {records} records in {seconds:.3f}s: {rate:.0f} records/s'.format(**p.stats()))
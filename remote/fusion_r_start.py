@@ -0,0 +1,64 @@
+# fusion_r_start.py Test that fusion_async fuses every sample read, using mpudata
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+# Run under CPython 3.8 or later from this directory.
+
+# start() reads the first data to determine the type of sensor. That data must
+# be fused like any other. The dataset is read by an async Fusion, directly and
+# through a ring buffer, and by single samples and batches. Each result is
+# compared with a synchronous Fusion updated with every sample. The program
+# exits with status 1 if they differ.
+
+import sys
+import json
+import asyncio
+from deltat import TimeDiff
+from fusion import Fusion
+import fusion_async
+
+BATCH = 8
+
+def load():
+    data = []
+    with open('mpudata', 'r') as f:
+        for line in f:
+            if line.strip() != 'cal_end':
+                data.append(json.loads(line))
+    return data
+
+async def replay(data, bufsize, batch):
+    done = asyncio.Event()
+    idx = [0]
+    async def read_coro():
+        n = idx[0]
+        if n >= len(data):
+            done.set()
+            await asyncio.Event().wait()  # Block forever: no more data
+        await asyncio.sleep(0)
+        idx[0] = n + batch
+        return data[n:n + batch] if batch > 1 else data[n]
+    fuse = fusion_async.Fusion(read_coro, TimeDiff)
+    await fuse.start(bufsize=bufsize)
+    await done.wait()
+    for _ in range(4):  # Let the update task drain the ring
+        await asyncio.sleep(0)
+    return fuse
+
+def main():
+    data = load()
+    ref = Fusion(TimeDiff)
+    for r in data:
+        ref.update(r[0], r[1], r[2], r[3])
+    fail = False
+    for bufsize in (0, 4 * BATCH):
+        for batch in (1, BATCH):
+            fuse = asyncio.run(replay(data, bufsize, batch))
+            err = max(abs(x - y) for x, y in zip(fuse.q, ref.q))
+            ok = err == 0 and fuse.dropped == 0
+            print('bufsize {:3d} batch {:2d} difference {:.3g} dropped {} {}'.format(
+                  bufsize, batch, err, fuse.dropped, 'PASS' if ok else 'FAIL'))
+            fail |= not ok
+    if fail:
+        sys.exit(1)
+
+main()
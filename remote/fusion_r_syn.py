@@ -14,7 +14,7 @@ try:
 except ImportError:
     import json
 from fusion import Fusion
-from deltat import is_micropython
+from deltat import TimeDiff
 
 intro = '''
 This demo reads data from a file created by recording IMU data from a Pyboard
@@ -53,15 +53,8 @@ def gdata():
 
 get_data = gdata()
 
-# Test of supplying a timediff
-if is_micropython:
-    def TimeDiff(start, end):
-        return time.ticks_diff(start, end)/1000000
-else:  # Cpython cheat: test data does not roll over
-    def TimeDiff(start, end):
-        return (start - end)/1000000
-
-# Expect a timestamp. Use supplied differencing function.
+# Timestamps are ticks_us() values from the capturing device. TimeDiff
+# handles their rollover under MicroPython or CPython.
 fuse = Fusion(TimeDiff)
 
 def getmag():  # Return (x, y, z) magnetometer vector.
@@ -0,0 +1,196 @@
+# reorder.py Reordering and resampling of timestamped samples for remote mode.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Samples received over a link may arrive late, duplicated or out of order.
+# Reorder holds records of the form accepted by the Fusion update methods, e.g.
+# [[ax, ay, az], [gx, gy, gz], [mx, my, mz], timestamp], releasing them in
+# timestamp order. Resampler accepts accel, gyro and mag readings with their
+# own timestamps and produces records on the timeline of the gyro, with accel
+# and mag interpolated.
+# Timestamps are compared using the timediff function passed to the Fusion
+# constructor, so rollover is handled. Latency is measured on the timeline of
+# the samples: a sample is held until one at least latency seconds newer has
+# arrived, or until more than depth samples are held. Duplicates, and samples
+# older than one already released, are discarded and counted.
+# Runs under MicroPython or CPython.
+
+# Insert item into buf in timestamp order. item[-1] is the timestamp. Arrivals
+# are usually in order so the search is from the end. Returns False if an item
+# with the same timestamp is present.
+def _insert(buf, item, timediff):
+    ts = item[-1]
+    i = len(buf)
+    while i:
+        d = timediff(ts, buf[i - 1][-1])
+        if d > 0:
+            break
+        if d == 0:
+            return False
+        i -= 1
+    buf.insert(i, item)
+    return True
+
+class Reorder:
+    def __init__(self, timediff, latency=0.05, depth=16):
+        self.timediff = timediff
+        self.latency = latency  # s
+        self.depth = depth
+        self.buf = []
+        self.duplicates = 0
+        self.late = 0  # Older than a released record
+        self._last = None  # Timestamp of last record released
+        self._newest = None
+
+    def __len__(self):
+        return len(self.buf)
+
+    def put(self, rec):
+        timediff = self.timediff
+        ts = rec[-1]
+        if self._last is not None:
+            d = timediff(ts, self._last)
+            if d <= 0:
+                if d == 0:
+                    self.duplicates += 1
+                else:
+                    self.late += 1
+                return
+        if not _insert(self.buf, rec, timediff):
+            self.duplicates += 1
+            return
+        if self._newest is None or timediff(ts, self._newest) > 0:
+            self._newest = ts
+
+    # Return the oldest record if it is due for release, otherwise None. If
+    # flush is True any held record is released.
+    def get(self, flush=False):
+        buf = self.buf
+        if buf and (flush or len(buf) > self.depth or self.timediff(self._newest, buf[0][-1]) >= self.latency):
+            rec = buf.pop(0)
+            self._last = rec[-1]
+            return rec
+        return None
+
+    def ready(self, flush=False):  # Generator of records due for release
+        rec = self.get(flush)
+        while rec is not None:
+            yield rec
+            rec = self.get(flush)
+
+# Indices into Resampler.streams
+_ACCEL = 0
+_GYRO = 1
+_MAG = 2
+
+class Resampler:
+    def __init__(self, timediff, latency=0.05, depth=16, nomag=False):
+        self.timediff = timediff
+        self.latency = latency  # s
+        self.depth = depth
+        self.nomag = nomag
+        self.streams = ([], [], [])  # Pending (xyz, ts) readings
+        self.duplicates = 0
+        self.late = 0  # Arrived after their time had passed
+        self.dropped = 0  # Gyro readings discarded for lack of accel data
+        self._prev = [None, None, None]  # Last accel and mag reading at or before the timeline
+        self._last = None  # Timestamp of last record released
+        self._newest = None
+
+    def accel(self, xyz, ts):
+        self._put(_ACCEL, xyz, ts)
+
+    def gyro(self, xyz, ts):
+        self._put(_GYRO, xyz, ts)
+
+    def mag(self, xyz, ts):
+        self._put(_MAG, xyz, ts)
+
+    def _put(self, k, xyz, ts):
+        timediff = self.timediff
+        prev = self._last if k == _GYRO else self._prev[k]
+        if prev is not None:
+            d = timediff(ts, prev if k == _GYRO else prev[1])
+            if d <= 0:
+                if d == 0:
+                    self.duplicates += 1
+                else:
+                    self.late += 1
+                return
+        if k != _GYRO and self._last is not None and timediff(ts, self._last) <= 0:
+            self.late += 1  # Too late to interpolate: is the latest reading
+            self._prev[k] = (xyz, ts)
+            return
+        if not _insert(self.streams[k], (xyz, ts), timediff):
+            self.duplicates += 1
+            return
+        if self._newest is None or timediff(ts, self._newest) > 0:
+            self._newest = ts
+
+    # Value of stream k at time t. Returns (xyz, n) where n is the number of
+    # pending readings at or before t, or None to wait for a later reading. If
+    # late, xyz is the last reading before t (accel) or None (mag).
+    def _value(self, k, t, late):
+        timediff = self.timediff
+        buf = self.streams[k]
+        prev = self._prev[k]
+        n = 0
+        while n < len(buf) and timediff(buf[n][1], t) <= 0:
+            prev = buf[n]
+            n += 1
+        if prev is not None and timediff(prev[1], t) == 0:
+            return prev[0], n
+        if n < len(buf):  # Interpolate
+            nxt = buf[n]
+            if prev is None:
+                return nxt[0], n
+            f = timediff(t, prev[1]) / timediff(nxt[1], prev[1])
+            p = prev[0]
+            q = nxt[0]
+            return (p[0] + f * (q[0] - p[0]), p[1] + f * (q[1] - p[1]), p[2] + f * (q[2] - p[2])), n
+        if not late:
+            return None
+        if k == _MAG or prev is None:
+            return None, n
+        return prev[0], n
+
+    # Return the next record on the gyro timeline if it is due, otherwise None.
+    # A record is due when accel (and mag) readings after its time have
+    # arrived, or when it is late. If flush is True any held gyro reading is
+    # released. mag is None in a record if no reading after its time arrived
+    # in time.
+    def get(self, flush=False):
+        g = self.streams[_GYRO]
+        while g:
+            gyro, t = g[0]
+            late = flush or len(g) > self.depth or self.timediff(self._newest, t) >= self.latency
+            a = self._value(_ACCEL, t, late)
+            if a is None:
+                return None
+            if not self.nomag:
+                m = self._value(_MAG, t, late)
+                if m is None:
+                    return None
+            g.pop(0)
+            self._last = t
+            self._consume(_ACCEL, a[1])
+            if a[0] is None:  # No accel reading yet
+                self.dropped += 1
+                continue
+            if self.nomag:
+                return [a[0], gyro, t]
+            self._consume(_MAG, m[1])
+            return [a[0], gyro, m[0], t]
+        return None
+
+    def _consume(self, k, n):
+        if n:
+            buf = self.streams[k]
+            self._prev[k] = buf[n - 1]
+            del buf[:n]
+
+    def ready(self, flush=False):  # Generator of records due for release
+        rec = self.get(flush)
+        while rec is not None:
+            yield rec
+            rec = self.get(flush)
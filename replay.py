@@ -0,0 +1,207 @@
+# replay.py Parallel replay of capture files through sensor fusion.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython 3.5 or later (requires multiprocessing).
+# python3 replay.py [-j jobs] [-o outdir] [-e engine] [-s name=value ...] [-f] src [src ...]
+# Each src is a capture file in JSON lines format (as in remote/mpudata) or in
+# the binary format of capfile.py, or a directory which is searched for such
+# files. Files are spread over a pool of processes, one per core by default.
+# Each file is replayed through its own Fusion instance: if it contains a
+# cal_end marker the records before it are used for calibration. Parameters
+# given with -s, e.g. magbias, take precedence over calibrated values. The
+# attitude after each sample is streamed to an output file in outdir as JSON
+# lines: a header line, then [ts, heading, pitch, roll, w, x, y, z] per
+# sample.
+# The header records the SHA256 of the capture and the parameters. A file
+# whose output has a matching header is skipped unless -f is given.
+# Outputs are written to a temporary file and renamed on completion, so an
+# interrupted run leaves no output which appears current.
+
+import sys
+import os
+import json
+import hashlib
+import multiprocessing
+import time
+from deltat import TimeDiff
+from pipeline import Pipeline, source, calibrate, fusion
+
+VERSION = 1  # Changes to the output format invalidate previous results
+SUFFIX = '.att'
+
+# Filter classes by the names used in params.
+def engines():
+    from fusion import Fusion
+    from fusion_engines import Mahony, Complementary
+    return {'madgwick': Fusion, 'mahony': Mahony, 'complementary': Complementary}
+
+# Return a list of (src, dst) pairs. Files found in a directory keep their
+# path relative to it.
+def find(srcs, outdir):
+    res = []
+    for src in srcs:
+        if os.path.isdir(src):
+            for root, dirs, files in os.walk(src):
+                dirs.sort()
+                for fn in sorted(files):
+                    if not fn.startswith('.') and not fn.endswith((SUFFIX, SUFFIX + '.tmp')):
+                        path = os.path.join(root, fn)
+                        res.append((path, os.path.join(outdir, os.path.relpath(path, src) + SUFFIX)))
+        else:
+            res.append((src, os.path.join(outdir, os.path.basename(src) + SUFFIX)))
+    return res
+
+# A Fusion instance configured by params: 'engine' names the filter class,
+# other items set bound variables e.g. beta.
+def make(params):
+    fuse = engines()[params.get('engine', 'madgwick')](TimeDiff)
+    configure(fuse, params)
+    return fuse
+
+def configure(fuse, params):
+    for k, v in params.items():
+        if k != 'engine':
+            setattr(fuse, k, v)
+
+# Stage following calibration, which sets magbias and magcorr: params are
+# applied again before the first record is passed on so that values given by
+# the user take precedence.
+def override(fuse, params):
+    def stage(records):
+        it = iter(records)
+        for rec in it:  # Calibration has completed
+            configure(fuse, params)
+            yield rec
+            break
+        for rec in it:
+            yield rec
+    return stage
+
+def header(src, digest, params):
+    return {'version': VERSION, 'source': src, 'sha256': digest, 'params': params}
+
+def current(dst, hdr):  # True if dst holds results for the same data and parameters
+    try:
+        with open(dst, 'r') as f:
+            old = json.loads(f.readline())
+    except (OSError, ValueError):
+        return False
+    return all(old.get(k) == hdr[k] for k in ('version', 'sha256', 'params'))
+
+def has_cal(src, data):
+    if src.endswith('.bin'):
+        import capfile
+        with capfile.Reader(src) as r:
+            return r.find() is not None
+    return any(line.strip() == b'cal_end' for line in data.splitlines())
+
+# Replay one file. params is as for make(). Returns (src, status,
+# records, seconds) where status is 'done', 'current' or an error message.
+def replay(job):
+    src, dst, params, force = job
+    t = time.perf_counter()
+    tmp = None
+    try:
+        with open(src, 'rb') as f:
+            data = f.read()
+        hdr = header(src, hashlib.sha256(data).hexdigest(), params)
+        if not force and current(dst, hdr):
+            return src, 'current', 0, time.perf_counter() - t
+        fuse = make(params)
+        stages = [calibrate(fuse), override(fuse, params)] if has_cal(src, data) else []
+        del data
+        stages.append(fusion(fuse))
+        d = os.path.dirname(dst)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = dst + '.tmp'
+        fs = '[{}, {:.3f}, {:.3f}, {:.3f}, {:.6f}, {:.6f}, {:.6f}, {:.6f}]\n'
+        n = 0
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(hdr) + '\n')
+            for rec in Pipeline(source(src), *stages):
+                if isinstance(rec, (str, int)):  # Marker
+                    continue
+                q = fuse.q
+                f.write(fs.format(rec[-1], fuse.heading, fuse.pitch, fuse.roll, q[0], q[1], q[2], q[3]))
+                n += 1
+        if not n:
+            raise ValueError('no samples')
+        os.replace(tmp, dst)
+    except Exception as e:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+        return src, '{}: {}'.format(type(e).__name__, e), 0, time.perf_counter() - t
+    return src, 'done', n, time.perf_counter() - t
+
+# Replay each (src, dst) pair using a pool of jobs processes (default one per
+# core). Calls report(result) as each file completes. Returns a dict of
+# aggregate statistics.
+def run(pairs, params, jobs=None, force=False, report=None):
+    jobs = jobs or os.cpu_count() or 1
+    work = [(src, dst, params, force) for src, dst in pairs]
+    stats = {'files': len(work), 'done': 0, 'current': 0, 'failed': 0, 'records': 0, 'cpu_s': 0.0}
+    t = time.perf_counter()
+    with multiprocessing.Pool(jobs) as pool:
+        for res in pool.imap_unordered(replay, work):
+            status = res[1]
+            stats[status if status in ('done', 'current') else 'failed'] += 1
+            stats['records'] += res[2]
+            stats['cpu_s'] += res[3]
+            if report is not None:
+                report(res)
+    wall = time.perf_counter() - t
+    stats['jobs'] = jobs
+    stats['seconds'] = wall
+    stats['rate'] = stats['records'] / wall if wall else 0
+    return stats
+
+def show(res):
+    src, status, n, secs = res
+    if status == 'done':
+        print('{}: {} records in {:.3f}s'.format(src, n, secs))
+    elif status != 'current':
+        print('{}: {}'.format(src, status))
+
+def value(s):  # Parameter values are numbers where possible
+    try:
+        return json.loads(s)
+    except ValueError:
+        return s
+
+def main(args):
+    usage = 'Usage: replay.py [-j jobs] [-o outdir] [-e engine] [-s name=value ...] [-f] src [src ...]'
+    jobs = None
+    outdir = '.'
+    params = {'engine': 'madgwick'}
+    force = False
+    srcs = []
+    while args:
+        arg = args.pop(0)
+        if arg == '-j':
+            jobs = int(args.pop(0))
+        elif arg == '-o':
+            outdir = args.pop(0)
+        elif arg == '-e':
+            params['engine'] = args.pop(0)
+        elif arg == '-s':
+            k, _, v = args.pop(0).partition('=')
+            params[k] = value(v)
+        elif arg == '-f':
+            force = True
+        elif arg.startswith('-'):
+            print(usage)
+            return
+        else:
+            srcs.append(arg)
+    if not srcs or params['engine'] not in engines():
+        print(usage)
+        print('Engines:', ' '.join(engines()))
+        return
+    stats = run(find(srcs, outdir), params, jobs, force, show)
+    print('{files} files: {done} replayed, {current} current, {failed} failed'.format(**stats))
+    print('{records} records in {seconds:.3f}s on {jobs} processes: {rate:.0f} records/s'.format(**stats))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
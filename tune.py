@@ -0,0 +1,341 @@
+# tune.py Tuning of beta and other parameters by replaying captures.
+# Released under the MIT License (MIT)
+# Copyright (c) 2026 Peter Hinch
+
+# Runs under CPython 3.5 or later (requires multiprocessing).
+# python3 tune.py [options] capture [capture ...]
+# Captures are replayed with each set of parameters and scored: the score of
+# a set is the mean over the captures. Sets may be a grid (-g) or the result
+# of an adaptive search of beta which repeatedly evaluates a grid of points
+# spaced logarithmically between the neighbours of the best point found.
+# Runs execute in a multiprocessing pool. Scores are cached in a JSON file
+# keyed by the SHA256 of the capture, the parameters and the metric, so that
+# a refined or repeated search only replays new points. The key also includes
+# VERSION and the SHA256 of the source of the filter and scoring code, so
+# that scores are recomputed after a change to either.
+# Metrics (lower is better):
+# smooth: RMS angle (degrees) between the filter and the attitude measured
+# from each sample (tilt only for 6DOF data), plus weight (s) times the RMS
+# rate (degrees/s) at which the filter corrects the integrated gyro rates.
+# The first term penalises lag, the second noise.
+# reference: RMS difference (degrees) of heading (9DOF only), pitch and roll
+# from a reference file in the format of replay.py output, matched by
+# timestamp. The reference for capture name is name + suffix.
+# If a capture has a cal_end marker the records before it are used for
+# calibration unless magbias is given, and are replayed to allow the filter to
+# converge before the records after it are scored. The filter is initialised
+# from the first sample (Fusion.initialise()).
+
+import sys
+import os
+import json
+import hashlib
+import multiprocessing
+from math import sqrt, acos, degrees, log, exp
+from array import array
+from fusion import _attitude
+from pipeline import source
+from replay import engines, make, value
+
+VERSION = 1  # Changes to the scoring invalidate cached scores
+SMOOTH = 'smooth'
+REFERENCE = 'reference'
+# Modules whose source determines the scores
+_CODE = ('tune', 'replay', 'pipeline', 'fusion', 'fusion_engines', 'deltat', 'capfile', 'magcal')
+
+_captures = {}  # Per process cache of loaded captures
+
+def digest(fn):
+    with open(fn, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def code_digest():  # SHA256 of the source of the modules in _CODE
+    import importlib
+    h = hashlib.sha256()
+    for name in _CODE:
+        with open(importlib.import_module(name).__file__, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+# Return (cal, data): lists of records before and after the cal_end marker.
+# cal is empty if there is no marker.
+def load(fn):
+    if fn not in _captures:
+        cal = []
+        data = []
+        for rec in source(fn):
+            if rec == 'cal_end':
+                cal = data
+                data = []
+            elif not isinstance(rec, (str, int)):
+                data.append(rec)
+        _captures[fn] = (cal, data)
+    return _captures[fn]
+
+def reference(fn):  # Dict of (heading, pitch, roll) by timestamp
+    res = {}
+    with open(fn, 'r') as f:
+        f.readline()  # Header
+        for line in f:
+            r = json.loads(line)
+            res[r[0]] = (r[1], r[2], r[3])
+    return res
+
+def angle(q, r):  # Rotation (degrees) between two unit quaternions
+    d = abs(q[0] * r[0] + q[1] * r[1] + q[2] * r[2] + q[3] * r[3])
+    return degrees(2 * acos(min(d, 1.0)))
+
+def angdiff(a, b):  # Difference between two angles (degrees) in range ±180
+    return (a - b + 180) % 360 - 180
+
+# Squared error from the measured attitude for one sample.
+def _measured(fuse, rec, qm):
+    ax, ay, az = rec[0]
+    norm = sqrt(ax * ax + ay * ay + az * az)
+    if norm == 0:
+        return None
+    ax /= norm
+    ay /= norm
+    az /= norm
+    q = fuse.q
+    if len(rec) < 4 or isinstance(rec[2], (int, float)):  # 6DOF: tilt only
+        c = (2.0 * (q[1] * q[3] - q[0] * q[2]) * ax + 2.0 * (q[2] * q[3] + q[0] * q[1]) * ay
+             + (q[0] * q[0] - q[1] * q[1] - q[2] * q[2] + q[3] * q[3]) * az)
+        e = degrees(acos(max(-1.0, min(c, 1.0))))
+        return e * e
+    b = fuse.magbias
+    mx = rec[2][0] - b[0]
+    my = rec[2][1] - b[1]
+    mz = rec[2][2] - b[2]
+    norm = sqrt(mx * mx + my * my + mz * mz)
+    if norm == 0 or not _attitude(qm, ax, ay, az, mx / norm, my / norm, mz / norm):
+        return None
+    e = angle(q, qm)
+    return e * e
+
+# Rate (degrees/s) of the correction applied by the filter: the rotation
+# between the updated quaternion and q integrated with the gyro rates alone.
+def _correction(fuse, q, gyro, dt):
+    g = 0.5 * dt * 0.017453292519943295
+    gx = gyro[0] * g
+    gy = gyro[1] * g
+    gz = gyro[2] * g
+    w, x, y, z = q
+    p = (w - x * gx - y * gy - z * gz, x + w * gx + y * gz - z * gy,
+         y + w * gy - x * gz + z * gx, z + w * gz + x * gy - y * gx)
+    norm = sqrt(p[0] * p[0] + p[1] * p[1] + p[2] * p[2] + p[3] * p[3])
+    return angle(fuse.q, [v / norm for v in p]) / dt
+
+def _update(fuse, rec):
+    if len(rec) > 3 and not isinstance(rec[2], (int, float)):
+        fuse.update(rec[0], rec[1], rec[2], rec[3])
+    else:
+        fuse.update_nomag(rec[0], rec[1], rec[-1])
+
+# Replay capture fn with params and return its score.
+def score(fn, params, metric=SMOOTH, weight=1.0, suffix='.ref'):
+    cal, data = load(fn)
+    fuse = make(params)
+    if cal and 'magbias' not in params and len(cal[0]) > 3:
+        count = [0]
+        def getxyz():
+            count[0] += 1
+            return cal[count[0] - 1][2]
+        fuse.calibrate(getxyz, lambda : count[0] >= len(cal))
+    fuse.initialise()
+    for rec in cal:
+        _update(fuse, rec)
+    if metric == REFERENCE:
+        ref = reference(fn + suffix)
+    qm = array('d', (1, 0, 0, 0))
+    total = 0
+    rate = 0
+    n = 0
+    for rec in data:
+        q = tuple(fuse.q)
+        s = fuse.skipped
+        _update(fuse, rec)
+        if fuse.skipped != s:
+            continue
+        if metric == REFERENCE:
+            r = ref.get(rec[-1])
+            if r is None:
+                continue
+            e = (angdiff(fuse.pitch, r[1]) ** 2 + angdiff(fuse.roll, r[2]) ** 2) / 2
+            if fuse.ninedof:
+                e = (2 * e + angdiff(fuse.heading, r[0]) ** 2) / 3
+        else:
+            e = _measured(fuse, rec, qm)
+            if e is None:
+                continue
+            c = _correction(fuse, q, rec[1], fuse.deltat.dt)
+            rate += c * c
+        total += e
+        n += 1
+    if not n:
+        raise ValueError('{}: no samples scored'.format(fn))
+    if metric == REFERENCE:
+        return sqrt(total / n)
+    return sqrt(total / n) + weight * sqrt(rate / n)
+
+def _run(job):
+    fn, params, metric, weight, suffix = job
+    return score(fn, params, metric, weight, suffix)
+
+# Cache of scores in a JSON file.
+class Cache:
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.scores = {}
+        self.hits = 0
+        self.code = code_digest()
+        if fn is not None and os.path.exists(fn):
+            with open(fn, 'r') as f:
+                self.scores = json.load(f)
+
+    def key(self, sha, params, metric, weight, suffix):
+        m = [metric, weight] if metric == SMOOTH else [metric, suffix]
+        return json.dumps([VERSION, self.code, sha, params, m], sort_keys=True)
+
+    def save(self):
+        if self.fn is not None:
+            tmp = self.fn + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.scores, f)
+            os.replace(tmp, self.fn)
+
+class Tuner:
+    def __init__(self, captures, metric=SMOOTH, weight=1.0, suffix='.ref', jobs=None, cache=None):
+        self.captures = captures
+        self.shas = [digest(fn) for fn in captures]
+        if metric == REFERENCE:  # Changes to a reference invalidate its scores
+            self.shas = [sha + digest(fn + suffix) for sha, fn in zip(self.shas, captures)]
+        self.metric = metric
+        self.weight = weight
+        self.suffix = suffix
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache = cache if cache is not None else Cache()
+        self.runs = 0  # Replays performed
+
+    # Return a list of scores, one for each dict of parameters in points.
+    # Replays not in the cache are performed in parallel.
+    def evaluate(self, points):
+        cache = self.cache
+        keys = {}
+        work = []
+        for params in points:
+            for fn, sha in zip(self.captures, self.shas):
+                k = cache.key(sha, params, self.metric, self.weight, self.suffix)
+                if k in cache.scores or k in keys:
+                    cache.hits += 1
+                else:
+                    keys[k] = len(work)
+                    work.append((fn, params, self.metric, self.weight, self.suffix))
+        if work:
+            if self.jobs > 1 and len(work) > 1:
+                with multiprocessing.Pool(min(self.jobs, len(work))) as pool:
+                    res = pool.map(_run, work)
+            else:
+                res = [_run(job) for job in work]
+            for k, i in keys.items():
+                cache.scores[k] = res[i]
+            cache.save()
+            self.runs += len(work)
+        res = []
+        for params in points:
+            s = [cache.scores[cache.key(sha, params, self.metric, self.weight, self.suffix)] for sha in self.shas]
+            res.append(sum(s) / len(s))
+        return res
+
+    # Evaluate the cartesian product of a dict of lists of values, merged
+    # with fixed parameters. Returns a list of (score, params) sorted by score.
+    def grid(self, axes, fixed=None):
+        points = [dict(fixed or {})]
+        for name in sorted(axes):
+            points = [dict(p, **{name: v}) for p in points for v in axes[name]]
+        return sorted(zip(self.evaluate(points), points), key=lambda x : x[0])
+
+    # Adaptive search of beta in [lo, hi]. Each round evaluates n points
+    # spaced logarithmically, the next spanning the neighbours of the best.
+    # Values are rounded to 3 significant figures so that refinements reuse
+    # cached runs. Returns (score, params) for the best point and a list of
+    # all points evaluated.
+    def search(self, lo=0.01, hi=10.0, n=8, rounds=3, fixed=None):
+        tried = {}
+        for _ in range(rounds):
+            step = (log(hi) - log(lo)) / (n - 1)
+            betas = sorted({float('{:.3g}'.format(exp(log(lo) + i * step))) for i in range(n)})
+            for s, p in self.grid({'beta': betas}, fixed):
+                tried[p['beta']] = (s, p)
+            ranked = sorted(tried)
+            best = min(ranked, key=lambda b : tried[b][0])
+            i = ranked.index(best)
+            lo = ranked[max(i - 1, 0)]
+            hi = ranked[min(i + 1, len(ranked) - 1)]
+            if lo == hi:
+                break
+        return tried[best], [tried[b] for b in sorted(tried)]
+
+def main(args):
+    usage = ('Usage: tune.py [-j jobs] [-e engine] [-s name=value ...] [-g name=v1,v2,... ...] [-b lo,hi] '
+             '[-n points] [-k rounds] [-m smooth|reference] [-w weight] [-r suffix] [-c cache] capture [capture ...]')
+    jobs = None
+    fixed = {'engine': 'madgwick'}
+    axes = {}
+    lo, hi = 0.01, 10.0
+    n = 8
+    rounds = 3
+    metric = SMOOTH
+    weight = 1.0
+    suffix = '.ref'
+    cachefile = 'tune_cache.json'
+    captures = []
+    while args:
+        arg = args.pop(0)
+        if arg == '-j':
+            jobs = int(args.pop(0))
+        elif arg == '-e':
+            fixed['engine'] = args.pop(0)
+        elif arg == '-s':
+            k, _, v = args.pop(0).partition('=')
+            fixed[k] = value(v)
+        elif arg == '-g':
+            k, _, v = args.pop(0).partition('=')
+            axes[k] = [value(x) for x in v.split(',')]
+        elif arg == '-b':
+            lo, hi = (float(x) for x in args.pop(0).split(','))
+        elif arg == '-n':
+            n = int(args.pop(0))
+        elif arg == '-k':
+            rounds = int(args.pop(0))
+        elif arg == '-m':
+            metric = args.pop(0)
+        elif arg == '-w':
+            weight = float(args.pop(0))
+        elif arg == '-r':
+            suffix = args.pop(0)
+        elif arg == '-c':
+            cachefile = args.pop(0) or None
+        elif arg.startswith('-'):
+            print(usage)
+            return
+        else:
+            captures.append(arg)
+    if not captures or metric not in (SMOOTH, REFERENCE) or fixed['engine'] not in engines() or n < 2:
+        print(usage)
+        return
+    tuner = Tuner(captures, metric, weight, suffix, jobs, Cache(cachefile))
+    if axes:
+        res = tuner.grid(axes, fixed)
+        best = res[0]
+    else:
+        best, res = tuner.search(lo, hi, n, rounds, fixed)
+    names = sorted(k for k in res[0][1] if k != 'engine')
+    print('{:>10s} '.format('score') + ' '.join('{:>12s}'.format(k) for k in names))
+    for s, p in res:
+        print('{:10.4f} '.format(s) + ' '.join('{:>12s}'.format(str(p[k])) for k in names))
+    print('Best: {} score {:.4f} ({} runs, {} cached)'.format(
+        ' '.join('{}={}'.format(k, best[1][k]) for k in names), best[0], tuner.runs, tuner.cache.hits))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])